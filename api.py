@@ -0,0 +1,363 @@
+import datetime
+import decimal
+import gzip
+import json
+import os
+from operator import itemgetter
+
+from flask import Blueprint, Response, request, abort, url_for
+from werkzeug.exceptions import HTTPException
+
+import db_service
+import rows
+from http_cache import LISTING_TURNOVER, conditional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 200))
+API_BATCH_MAX_IDS = int(os.getenv('API_BATCH_MAX_IDS', 500))
+API_COMPRESS_MIN_BYTES = int(os.getenv('API_COMPRESS_MIN_BYTES', 1024))
+
+GAME_FILTERS = {
+    'min_release_date': datetime.date.fromisoformat,
+    'max_release_date': datetime.date.fromisoformat,
+    'min_rating': decimal.Decimal,
+    'max_rating': decimal.Decimal,
+    'id_developer': int,
+    'id_publisher': int,
+    'search_text': str,
+}
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def _default(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'),
+                      default=_default).encode('utf-8')
+
+
+def json_response(value, status=200):
+    return Response(_dumps(value), status=status, mimetype='application/json')
+
+
+def _requested_fields(row_class):
+    fields = request.args.get('fields')
+    if not fields:
+        return row_class._fields
+
+    fields = tuple(field.strip() for field in fields.split(',') if field.strip())
+    unknown = [field for field in fields if field not in row_class._fields]
+    if unknown:
+        abort(400, f'Unknown fields: {", ".join(unknown)}')
+
+    return fields
+
+
+def serialize(row_class, items, fields=None):
+    # Rows are tuples, so a sparse fieldset is just an itemgetter over the
+    # selected positions.
+    if fields is None:
+        fields = _requested_fields(row_class)
+    if items is None:
+        return []
+
+    if fields == row_class._fields:
+        return [row._asdict() for row in items]
+
+    getter = itemgetter(*[row_class._fields.index(field) for field in fields])
+    if len(fields) == 1:
+        return [{fields[0]: getter(row)} for row in items]
+    return [dict(zip(fields, getter(row))) for row in items]
+
+
+def serialize_one(row_class, item):
+    if item is None:
+        abort(404)
+    return serialize(row_class, [item])[0]
+
+
+def _int_arg(name, default=None, minimum=None, maximum=None):
+    value = request.args.get(name)
+    if value is None:
+        return default
+
+    try:
+        value = int(value)
+    except ValueError:
+        abort(400, f'{name} must be an integer')
+
+    if minimum is not None:
+        value = max(value, minimum)
+    if maximum is not None:
+        value = min(value, maximum)
+    return value
+
+
+def _game_filters():
+    filters = {}
+    for name, convert in GAME_FILTERS.items():
+        value = request.args.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            filters[name] = convert(value)
+        except (ValueError, decimal.InvalidOperation):
+            abort(400, f'Invalid value for {name}')
+
+    return filters
+
+
+@api.errorhandler(HTTPException)
+def http_error(error):
+    return json_response(
+        {'error': {'code': error.code, 'message': error.description}},
+        error.code
+    )
+
+
+@api.after_request
+def compress(response):
+    response.vary.add('Accept-Encoding')
+
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    body = response.get_data()
+    if len(body) < API_COMPRESS_MIN_BYTES:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(body, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+
+    return response
+
+
+@api.route('/games')
+@conditional('games', 'developers', 'publishers', turnover=LISTING_TURNOVER)
+def games():
+    order_by = request.args.get('order_by', 'id_game')
+    order_direction = request.args.get('order_direction', 'asc')
+    if order_direction not in ('asc', 'desc'):
+        abort(400, 'order_direction must be asc or desc')
+
+    filters = _game_filters()
+    page_size = _int_arg('page_size', db_service.GAMES_PAGE_SIZE, 1,
+                         API_MAX_PAGE_SIZE)
+
+    if order_by == 'relevance':
+        search_text = filters.pop('search_text', None)
+        if search_text is None:
+            abort(400, 'order_by=relevance requires search_text')
+
+        fields = _requested_fields(rows.GameSearchResult)
+        found = db_service.search_games(search_text, limit=page_size,
+                                        **filters)
+        return json_response({
+            'data': serialize(rows.GameSearchResult, found, fields),
+            'meta': {'page_size': page_size},
+        })
+
+    if order_by not in db_service.GAMES_ORDER_BY:
+        abort(400, f'Unknown order_by: {order_by}')
+
+    fields = _requested_fields(rows.Game)
+    try:
+        games_page = db_service.get_games_page(
+            order_by, order_direction, cursor=request.args.get('cursor'),
+            page=_int_arg('page', minimum=1), page_size=page_size,
+            with_total=request.args.get('total') == '1', **filters
+        )
+    except ValueError as error:
+        abort(400, str(error))
+
+    links = {}
+    query = {key: value for key, value in request.args.items()
+             if key not in ('cursor', 'page')}
+    if games_page.next_cursor:
+        links['next'] = url_for('.games', cursor=games_page.next_cursor,
+                                **query)
+    if games_page.prev_cursor:
+        links['prev'] = url_for('.games', cursor=games_page.prev_cursor,
+                                **query)
+
+    meta = {'page_size': games_page.page_size,
+            'next_cursor': games_page.next_cursor,
+            'prev_cursor': games_page.prev_cursor}
+    if games_page.page is not None:
+        meta['page'] = games_page.page
+    if games_page.total is not None:
+        meta['total'] = games_page.total
+
+    return json_response({
+        'data': serialize(rows.Game, games_page.games, fields),
+        'meta': meta,
+        'links': links,
+    })
+
+
+def _batch_ids():
+    if request.method == 'POST':
+        payload = request.get_json(silent=True) or {}
+        ids = payload.get('ids')
+    else:
+        ids = request.args.get('ids', '').split(',')
+
+    if not isinstance(ids, list):
+        abort(400, 'ids must be a list')
+
+    try:
+        ids = list(dict.fromkeys(int(id_game) for id_game in ids
+                                 if str(id_game).strip()))
+    except ValueError:
+        abort(400, 'ids must be integers')
+
+    if not ids:
+        abort(400, 'ids is required')
+    if len(ids) > API_BATCH_MAX_IDS:
+        abort(400, f'At most {API_BATCH_MAX_IDS} ids per request')
+
+    return ids
+
+
+@api.route('/games/batch', methods=['GET', 'POST'])
+@conditional('games', 'developers', 'publishers', turnover=LISTING_TURNOVER)
+def games_batch():
+    ids = _batch_ids()
+    fields = _requested_fields(rows.Game)
+
+    found = {game.id_game: game
+             for game in db_service.get_games_by_ids(ids)}
+    ordered = [found[id_game] for id_game in ids if id_game in found]
+
+    return json_response({
+        'data': serialize(rows.Game, ordered, fields),
+        'meta': {'missing': [id_game for id_game in ids
+                             if id_game not in found]},
+    })
+
+
+@api.route('/games/<int:id_game>')
+@conditional('game:{id_game}', 'genres', 'users', 'developers', 'publishers')
+def game(id_game):
+    game_detail = db_service.get_game_detail(id_game)
+    if game_detail is None:
+        abort(404)
+
+    data = serialize_one(rows.GameDetail, game_detail['game'])
+    data['genres'] = game_detail['genres']
+    data['comments'] = game_detail['comments']
+    return json_response({'data': data})
+
+
+@api.route('/games/<int:id_game>/comments')
+@conditional('game:{id_game}', 'users')
+def game_comments(id_game):
+    return json_response({
+        'data': serialize(rows.Comment, db_service.get_comments(id_game=id_game))
+    })
+
+
+@api.route('/games/<int:id_game>/genres')
+@conditional('game:{id_game}', 'genres')
+def game_genres(id_game):
+    return json_response({
+        'data': serialize(rows.GameGenre,
+                          db_service.get_genre_of_game(id_game=id_game))
+    })
+
+
+@api.route('/developers')
+@conditional('developers')
+def developers():
+    return json_response({
+        'data': serialize(rows.Developer, db_service.get_all_developers())
+    })
+
+
+@api.route('/developers/<int:id_developer>')
+@conditional('developer:{id_developer}')
+def developer(id_developer):
+    return json_response({
+        'data': serialize_one(rows.Developer,
+                              db_service.get_developer(id_developer))
+    })
+
+
+@api.route('/publishers')
+@conditional('publishers')
+def publishers():
+    return json_response({
+        'data': serialize(rows.Publisher, db_service.get_all_publishers())
+    })
+
+
+@api.route('/publishers/<int:id_publisher>')
+@conditional('publisher:{id_publisher}')
+def publisher(id_publisher):
+    return json_response({
+        'data': serialize_one(rows.Publisher,
+                              db_service.get_publisher(id_publisher))
+    })
+
+
+@api.route('/genres')
+@conditional('genres')
+def genres():
+    return json_response({
+        'data': serialize(rows.Genre, db_service.get_all_genres())
+    })
+
+
+@api.route('/genres/<int:id_genre>')
+@conditional('genre:{id_genre}')
+def genre(id_genre):
+    return json_response({
+        'data': serialize_one(rows.Genre, db_service.get_genre(id_genre))
+    })
+
+
+@api.route('/genres/<int:id_genre>/games')
+@conditional('genre:{id_genre}', 'games', 'game_genres')
+def genre_games(id_genre):
+    return json_response({
+        'data': serialize(rows.GameGenre,
+                          db_service.get_genre_of_game(id_genre=id_genre))
+    })
+
+
+@api.route('/users/<int:id_user>/comments')
+def user_comments(id_user):
+    return json_response({
+        'data': serialize(rows.Comment, db_service.get_comments(id_user=id_user))
+    })
+
+
+@api.route('/users/<int:id_user>/lists')
+def user_lists(id_user):
+    return json_response({
+        'data': serialize(rows.ListEntry, db_service.get_list(id_user=id_user))
+    })
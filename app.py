@@ -1,70 +1,168 @@
-import hashlib
+import io
+import os
+from functools import partial
 
-from flask import Flask, request, render_template, session, redirect, url_for, flash
+from flask import Flask, request, render_template, session, redirect, url_for, flash, jsonify, abort, Response, send_file
 from flask.sessions import SessionMixin
 
+import api
+import bulk_import
 import db_service
+import export
+import fragments
+import passwords
+import profiling
+import sessions
+from http_cache import LISTING_TURNOVER, conditional
 
 app = Flask(__name__)
 app.secret_key = 'myMegaSecretKey'
+app.session_interface = sessions.ServerSessionInterface(sessions.make_store())
+app.register_blueprint(api.api)
+profiling.init_app(app)
+app.jinja_env.add_extension(fragments.FragmentCacheExtension)
+app.jinja_env.fragment_versions = db_service.request_versions
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+BUSY_MESSAGE = 'Сервер перегружен, попробуйте позже'
+GAMES_VIEW_ARGS = tuple(api.GAME_FILTERS) + ('order_by', 'order_direction')
 
 
 def get_session_user(_session: SessionMixin):
-    if not _session.get('user'):
-        _session['user'] = {}
+    return _session.get('user') or {}
+
+
+@app.before_request
+def begin_unit_of_work():
+    db_service.begin_unit_of_work()
+
+
+@app.after_request
+def commit_unit_of_work(response):
+    db_service.commit_unit_of_work(success=response.status_code < 500)
+    return response
 
-    return _session['user']
+
+@app.teardown_request
+def end_unit_of_work(exception):
+    db_service.end_unit_of_work()
 
 @app.route('/')
+@conditional('games', 'developers', 'publishers', turnover=LISTING_TURNOVER)
 def games():
     user = get_session_user(session)
 
-    parameters = dict(request.args)
-    if 'id_developer' in parameters and parameters['id_developer'] == 'none':
+    # Only known filters reach the data layer; other query args (the
+    # profiling flag, tracking parameters) are ignored.
+    parameters = {key: request.args[key] for key in GAMES_VIEW_ARGS
+                  if request.args.get(key) not in (None, '')}
+    if parameters.get('id_developer') == 'none':
         parameters.pop('id_developer')
 
-    if 'id_publisher' in parameters and parameters['id_publisher'] == 'none':
+    if parameters.get('id_publisher') == 'none':
         parameters.pop('id_publisher')
 
-    if 'search_text' in parameters and parameters['search_text'] == '':
-        parameters.pop('search_text')
+    cursor = request.args.get('cursor')
+    page = request.args.get('page')
+
+    if parameters.get('order_by') == 'relevance':
+        parameters.pop('order_by')
+        if 'search_text' in parameters:
+            parameters.pop('order_direction', None)
+            search_text = parameters.pop('search_text')
+            all_games, all_developers, all_publishers = db_service.run_in_parallel(
+                partial(db_service.search_games, search_text, **parameters),
+                db_service.get_all_developers,
+                db_service.get_all_publishers
+            )
 
-    if not parameters:
-        all_games = db_service.get_all_games()
-    else:
-        all_games = db_service.get_all_games(**parameters)
+            return render_template(
+                'games/games.html',
+                games=all_games, user=user,
+                developers=all_developers, publishers=all_publishers
+            )
 
-    all_developers = db_service.get_all_developers()
-    all_publishers = db_service.get_all_publishers()
+    try:
+        if page is not None:
+            page = int(page)
+        games_page, all_developers, all_publishers = db_service.run_in_parallel(
+            partial(db_service.get_games_page,
+                    cursor=cursor, page=page, **parameters),
+            db_service.get_all_developers,
+            db_service.get_all_publishers
+        )
+    except ValueError:
+        abort(400)
+
+    next_url = None
+    if games_page.next_cursor:
+        next_url = url_for('games', cursor=games_page.next_cursor,
+                           **parameters)
+
+    prev_url = None
+    if games_page.prev_cursor:
+        prev_url = url_for('games', cursor=games_page.prev_cursor,
+                           **parameters)
 
     return render_template(
         'games/games.html',
-        games=all_games, user=user,
-        developers=all_developers, publishers=all_publishers
+        games=games_page.games, user=user,
+        developers=all_developers, publishers=all_publishers,
+        next_url=next_url, prev_url=prev_url
     )
 
 
-@app.route('/games/<int:id_game>', methods=['GET', 'POST'])
-def game_detail(id_game):
+@app.route('/leaderboards')
+def leaderboards():
     session_user = get_session_user(session)
 
-    game = db_service.get_game(id_game)
-    games_genres = db_service.get_genre_of_game(id_game=id_game)
-    comments = db_service.get_comments(id_game=id_game)
+    board = request.args.get('board', 'top_rated')
+    scope, scope_id = 'all', None
+    for scope_name in ('genre', 'developer', 'publisher'):
+        value = request.args.get(f'id_{scope_name}', 'none')
+        if value != 'none':
+            scope, scope_id = scope_name, value
+            break
+
+    try:
+        leaders, all_genres, all_developers, all_publishers = db_service.run_in_parallel(
+            partial(db_service.get_leaderboard, board, scope, scope_id,
+                    limit=request.args.get('limit', 10)),
+            db_service.get_all_genres,
+            db_service.get_all_developers,
+            db_service.get_all_publishers
+        )
+    except ValueError:
+        abort(404)
+
+    return render_template(
+        'leaderboards/leaderboards.html',
+        user=session_user, leaders=leaders, board=board, scope=scope,
+        scope_id=int(scope_id) if scope_id is not None else None,
+        genres=all_genres, developers=all_developers,
+        publishers=all_publishers
+    )
 
-    user_game_list = None
 
+@app.route('/games/<int:id_game>', methods=['GET', 'POST'])
+@conditional('game:{id_game}', 'genres', 'users', 'developers',
+             'publishers')
+def game_detail(id_game):
+    session_user = get_session_user(session)
+
+    id_user = None
     if session_user and session_user['role'] != 'admin':
-        user_game_list = db_service.get_list(id_game, session_user['id_user'])
-        if user_game_list:
-            user_game_list = user_game_list[0]
-        else:
-            user_game_list = None
+        id_user = session_user['id_user']
+
+    game_detail = db_service.get_game_detail(id_game, id_user)
+    if game_detail is None:
+        abort(404)
 
     return render_template(
         'games/game.html',
-        game=game, user_game_list=user_game_list,
-        user=session_user, genres=games_genres, comments=comments
+        game=game_detail['game'], user_game_list=game_detail['user_list'],
+        user=session_user, genres=game_detail['genres'],
+        comments=game_detail['comments']
     )
 
 
@@ -116,19 +214,8 @@ def update_game(id_game):
         if game_publisher_id == 'none':
             game_publisher_id = None
 
-        current_game_genres = db_service.get_genre_of_game(id_game=id_game)
-        current_game_genres_ids = [genre['id_genre'] for genre in current_game_genres]
-
-        genres_to_add = list(set(new_game_genres_ids) - set(current_game_genres_ids))
-        genres_to_remove = list(set(current_game_genres_ids) - set(new_game_genres_ids))
-
-        for to_add in genres_to_add:
-            db_service.add_genre_of_game(id_game, to_add)
-
-        for to_remove in genres_to_remove:
-            db_service.delete_genre_of_game(id_game, to_remove)
-
         try:
+            db_service.set_genres_of_game(id_game, new_game_genres_ids)
             db_service.update_game(
                 id_game, game_name, game_description, game_release_date,
                 game_publisher_id, game_developer_id
@@ -140,11 +227,14 @@ def update_game(id_game):
             flash('Информация об игре успешно обновлена', 'success')
             return redirect(url_for('game_detail', id_game=id_game))
 
-    game = db_service.get_game(id_game)
-    all_publishers = db_service.get_all_publishers()
-    all_developers = db_service.get_all_developers()
-    games_genres = db_service.get_genre_of_game(id_game=id_game)
-    all_genres = db_service.get_all_genres()
+    (game, all_publishers, all_developers,
+     games_genres, all_genres) = db_service.run_in_parallel(
+        partial(db_service.get_game, id_game),
+        db_service.get_all_publishers,
+        db_service.get_all_developers,
+        partial(db_service.get_genre_of_game, id_game=id_game),
+        db_service.get_all_genres
+    )
     games_genres_ids = [genre['id_genre'] for genre in games_genres]
 
     return render_template(
@@ -192,8 +282,10 @@ def create_game():
             flash('Игра успешно создана', 'success')
             return redirect(url_for('games'))
 
-    all_publishers = db_service.get_all_publishers()
-    all_developers = db_service.get_all_developers()
+    all_publishers, all_developers = db_service.run_in_parallel(
+        db_service.get_all_publishers,
+        db_service.get_all_developers
+    )
 
     return render_template(
         'games/create_update_game.html',
@@ -225,9 +317,10 @@ def users():
 @app.route('/users/<int:id_user>')
 def user_detail(id_user):
     session_user = session.get('user')
-    user_info = db_service.get_user(id_user)
-
-    user_lists = db_service.get_list(id_user=id_user)
+    user_info, user_lists = db_service.run_in_parallel(
+        partial(db_service.get_user, id_user),
+        partial(db_service.get_list, id_user=id_user)
+    )
 
     if user_lists is not None:
 
@@ -268,13 +361,22 @@ def update_user(id_user):
                 return redirect(url_for('update_user', id_user=id_user))
             else:
                 session['user']['username'] = new_username
+                # Nested changes are not seen by the session itself.
+                session.modified = True
                 flash('Данные успешно обновлены', 'success')
                 return redirect(url_for('user_detail', id_user=id_user))
         else:
-            old_password_hash = (hashlib.sha256(old_password.encode('utf-8'))
-                                 .hexdigest().upper())
+            # No pooled connection is held while the KDF runs.
+            db_service.release_unit_of_work()
+            try:
+                verified, _ = passwords.verify_password(
+                    old_password, user_info['password']
+                )
+            except passwords.HashingBusy:
+                flash(BUSY_MESSAGE, 'error')
+                return redirect(url_for('update_user', id_user=id_user))
 
-            if old_password_hash != user_info['password']:
+            if not verified:
                 flash('Вы ввели неверный пароль', 'error')
                 return redirect(url_for('update_user',
                                         id_user=id_user))
@@ -298,6 +400,7 @@ def update_user(id_user):
                                         id_user=id_user))
             else:
                 session['user']['username'] = new_username
+                session.modified = True
                 flash('Данные успешно обновлены', 'success')
                 return redirect(url_for('user_detail',
                                         id_user=id_user))
@@ -332,16 +435,18 @@ def delete_user(id_user):
         flash('Что-то пошло не так', 'error')
         return redirect(url_for('user_detail', id_user=id_user))
     else:
+        app.session_interface.revoke('user', id_user)
         flash('Пользователь успешно удалён', 'success')
 
         if session_user['role'] == 'admin':
             return redirect(url_for('users'))
         else:
-            session['user'] = {}
+            session.pop('user', None)
             return redirect(url_for('games'))
 
 
 @app.route('/developers')
+@conditional('developers')
 def developers():
     session_user = get_session_user(session)
     all_developers = db_service.get_all_developers()
@@ -353,10 +458,13 @@ def developers():
 
 
 @app.route('/developers/<int:id_developer>')
+@conditional('developer:{id_developer}', 'games', turnover=LISTING_TURNOVER)
 def developer_detail(id_developer):
     session_user = get_session_user(session)
-    developer = db_service.get_developer(id_developer)
-    developer_games = db_service.get_all_games(id_developer=id_developer)
+    developer, developer_games = db_service.run_in_parallel(
+        partial(db_service.get_developer, id_developer),
+        partial(db_service.get_all_games, id_developer=id_developer)
+    )
 
     return render_template(
         'developers/developer.html',
@@ -452,6 +560,7 @@ def create_developer():
 
 
 @app.route('/publishers')
+@conditional('publishers')
 def publishers():
     session_user = get_session_user(session)
     all_publishers = db_service.get_all_publishers()
@@ -463,10 +572,13 @@ def publishers():
 
 
 @app.route('/publishers/<int:id_publisher>')
+@conditional('publisher:{id_publisher}', 'games', turnover=LISTING_TURNOVER)
 def publisher_detail(id_publisher):
     session_user = get_session_user(session)
-    publisher = db_service.get_publisher(id_publisher)
-    publisher_games = db_service.get_all_games(id_publisher=id_publisher)
+    publisher, publisher_games = db_service.run_in_parallel(
+        partial(db_service.get_publisher, id_publisher),
+        partial(db_service.get_all_games, id_publisher=id_publisher)
+    )
 
     return render_template(
         'publishers/publisher.html',
@@ -561,6 +673,7 @@ def create_publisher():
 
 
 @app.route('/genres')
+@conditional('genres')
 def genres():
     all_genres = db_service.get_all_genres()
     return render_template(
@@ -571,10 +684,13 @@ def genres():
 
 
 @app.route('/genres/<int:id_genre>')
+@conditional('genre:{id_genre}', 'games', 'game_genres')
 def genre_detail(id_genre):
     session_user = get_session_user(session)
-    genre = db_service.get_genre(id_genre)
-    games_with_genre = db_service.get_genre_of_game(id_genre=id_genre)
+    genre, games_with_genre = db_service.run_in_parallel(
+        partial(db_service.get_genre, id_genre),
+        partial(db_service.get_genre_of_game, id_genre=id_genre)
+    )
 
     return render_template(
         'genres/genre.html',
@@ -763,7 +879,11 @@ def login():
         username = request.form['username']
         password = request.form['password']
 
-        db_user = db_service.validate_user(username, password)
+        try:
+            db_user = db_service.validate_user(username, password)
+        except passwords.HashingBusy:
+            flash(BUSY_MESSAGE, 'error')
+            return redirect(url_for('login'))
 
         if db_user:
             session['user'] = {}
@@ -781,7 +901,7 @@ def login():
 
 @app.route('/logout')
 def logout():
-    session['user'] = {}
+    session.pop('user', None)
     flash('Вы успешно вышли из аккаунта', 'success')
     return redirect(url_for('games'))
 
@@ -800,6 +920,9 @@ def register():
 
         try:
             db_service.add_user(username, password, email)
+        except passwords.HashingBusy:
+            flash(BUSY_MESSAGE, 'error')
+            return redirect(url_for('register'))
         except Exception as e:
             flash('Аккаунт уже существует', 'error')
             return redirect(url_for('register'))
@@ -816,7 +939,11 @@ def admin_login():
         username = request.form['username']
         password = request.form['password']
 
-        db_admin = db_service.validate_admin(username, password)
+        try:
+            db_admin = db_service.validate_admin(username, password)
+        except passwords.HashingBusy:
+            flash(BUSY_MESSAGE, 'error')
+            return redirect(url_for('admin_login'))
 
         if db_admin:
             session['user'] = {}
@@ -834,5 +961,186 @@ def admin_login():
 
     return render_template('auth/login.html')
 
+
+@app.route('/admin/import', methods=['GET', 'POST'])
+def bulk_import_view():
+    session_user = get_session_user(session)
+
+    if not session_user or session_user['role'] != 'admin':
+        flash('Вам недоступна эта операция', 'error')
+        return redirect(url_for('games'))
+
+    if request.method == 'POST':
+        entity = request.form['entity']
+        upload = request.files['file']
+        file_format = bulk_import.detect_format(upload.filename or '')
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+
+        try:
+            report = bulk_import.import_file(entity, stream, file_format)
+        except Exception as e:
+            flash('Что-то пошло не так', 'error')
+            return redirect(url_for('bulk_import_view'))
+        else:
+            flash(
+                f'Импортировано записей: {report.rows} '
+                f'({report.rows_per_second:.0f} в секунду)',
+                'success'
+            )
+            return redirect(url_for('bulk_import_view'))
+
+    return render_template('admin/import.html', user=session_user)
+
+
+def export_response(name, file_format, filename, params=None):
+    if file_format not in export.FORMATS:
+        abort(404)
+
+    try:
+        body = export.export(name, file_format, params)
+    except RuntimeError:
+        abort(501)
+
+    return Response(
+        body,
+        mimetype=export.FORMATS[file_format],
+        headers={
+            'Content-Disposition':
+                f'attachment; filename={filename}.{file_format}'
+        }
+    )
+
+
+@app.route('/export/games.<file_format>')
+def export_games(file_format):
+    session_user = get_session_user(session)
+
+    if not session_user or session_user['role'] != 'admin':
+        abort(403)
+
+    return export_response('games', file_format, 'games')
+
+
+@app.route('/export/comments.<file_format>')
+def export_comments(file_format):
+    session_user = get_session_user(session)
+
+    if not session_user or session_user['role'] != 'admin':
+        abort(403)
+
+    return export_response('comments', file_format, 'comments')
+
+
+@app.route('/users/<int:id_user>/lists/export.<file_format>')
+def export_user_lists(id_user, file_format):
+    session_user = get_session_user(session)
+
+    if not session_user:
+        abort(403)
+
+    if session_user['role'] != 'admin' and session_user['id_user'] != id_user:
+        abort(403)
+
+    return export_response('lists', file_format, f'lists_{id_user}',
+                           (id_user,))
+
+
+@app.route('/admin/pool')
+def pool_stats():
+    session_user = get_session_user(session)
+
+    if not session_user or session_user['role'] != 'admin':
+        abort(403)
+
+    return jsonify(db_service.get_pool_stats() or {})
+
+
+@app.route('/admin/cache')
+def cache_stats():
+    session_user = get_session_user(session)
+
+    if not session_user or session_user['role'] != 'admin':
+        abort(403)
+
+    return jsonify(dict(db_service.get_cache_stats(),
+                        fragments=fragments.fragment_cache.stats(),
+                        passwords=db_service.get_password_stats(),
+                        sessions=app.session_interface.stats()))
+
+
+@app.route('/admin/statements')
+def statement_stats():
+    session_user = get_session_user(session)
+
+    if not session_user or session_user['role'] != 'admin':
+        abort(403)
+
+    return jsonify(db_service.get_statement_stats())
+
+
+@app.route('/admin/slow-queries')
+def slow_queries():
+    session_user = get_session_user(session)
+
+    if not session_user or session_user['role'] != 'admin':
+        abort(403)
+
+    return jsonify(db_service.get_slow_queries())
+
+
+@app.route('/admin/profile')
+def profile_requests():
+    session_user = get_session_user(session)
+
+    if not session_user or session_user['role'] != 'admin':
+        abort(403)
+
+    # /admin/profile?endpoint=game_detail&count=5 captures the next five
+    # requests to game_detail from anyone; endpoint=* matches every route.
+    endpoint = request.args.get('endpoint')
+    if endpoint:
+        try:
+            count = int(request.args.get('count', 1))
+        except ValueError:
+            abort(400)
+        profiling.profile_requests.arm(endpoint, count)
+
+    return jsonify({
+        'armed': profiling.profile_requests.armed(),
+        'profiles': [url_for('download_profile', name=name)
+                     for name in profiling.list_profiles()],
+    })
+
+
+@app.route('/admin/profiles/<name>')
+def download_profile(name):
+    session_user = get_session_user(session)
+
+    if not session_user or session_user['role'] != 'admin':
+        abort(403)
+
+    path = profiling.profile_path(name)
+    if path is None or not os.path.exists(path):
+        abort(404)
+
+    return send_file(path, mimetype='text/plain', as_attachment=True)
+
+
+@app.route('/metrics')
+def metrics():
+    # Scrapers have no session, they authenticate with METRICS_TOKEN.
+    session_user = get_session_user(session)
+    authorized = session_user and session_user['role'] == 'admin'
+    if METRICS_TOKEN:
+        token = request.headers.get('Authorization', '')
+        authorized = authorized or token == f'Bearer {METRICS_TOKEN}'
+
+    if not authorized:
+        abort(403)
+
+    return Response(db_service.get_query_metrics(),
+                    mimetype='text/plain; version=0.0.4')
+
+
 if __name__ == '__main__':
     app.run(debug=False)
@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_service
+import db_service_async
+
+
+def run_sync(game_ids, concurrency):
+    def fetch(id_game):
+        return db_service.get_game_detail(id_game)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(fetch, game_ids))
+    return time.perf_counter() - started
+
+
+async def run_async(game_ids, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(id_game):
+        async with semaphore:
+            return await db_service_async.get_game_detail(id_game)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch(id_game) for id_game in game_ids))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare get_game_detail throughput of the sync and '
+                    'async data-access layers'
+    )
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--max-id', type=int, default=100)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    game_ids = [index % args.max_id + 1 for index in range(args.requests)]
+
+    # Warm both pools so connection setup is not measured.
+    run_sync(game_ids[:args.concurrency], args.concurrency)
+    asyncio.run(run_async(game_ids[:args.concurrency], args.concurrency))
+
+    sync_seconds = run_sync(game_ids, args.concurrency)
+    async_seconds = asyncio.run(run_async(game_ids, args.concurrency))
+
+    results = {
+        'benchmark': 'async_vs_sync',
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'sync_requests_per_second': args.requests / sync_seconds,
+        'async_requests_per_second': args.requests / async_seconds,
+    }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import argparse
+import fnmatch
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_service
+from common import summarize, write_results
+from seed import SEED_PASSWORD
+
+
+def _table_size(table, column):
+    with db_service.connection_scope() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT coalesce(max({column}), 0) FROM {table}')
+            return cursor.fetchone()[0]
+
+
+def read_cases(rng, games, users, developers, publishers, genres):
+    game = lambda: rng.randint(1, games)
+    user = lambda: rng.randint(1, users)
+
+    return {
+        'get_all_games': lambda: db_service.get_all_games(),
+        'get_all_games_by_developer': lambda: db_service.get_all_games(
+            id_developer=rng.randint(1, developers)
+        ),
+        'get_games_page': lambda: db_service.get_games_page(),
+        'get_games_page_by_rating': lambda: db_service.get_games_page(
+            'rating', 'desc', page=rng.randint(1, 20)
+        ),
+        'get_games_page_filtered': lambda: db_service.get_games_page(
+            'release_date', min_release_date='2010-01-01',
+            id_publisher=rng.randint(1, publishers)
+        ),
+        'search_games': lambda: db_service.search_games(
+            rng.choice(['dark', 'star', 'dragon quest', 'witcher', 'souls'])
+        ),
+        'get_game': lambda: db_service.get_game(game()),
+        'get_game_detail': lambda: db_service.get_game_detail(game(), user()),
+        'get_games_by_ids': lambda: db_service.get_games_by_ids(
+            [game() for _ in range(50)]
+        ),
+        'get_leaderboard': lambda: db_service.get_leaderboard('top_rated'),
+        'get_leaderboard_by_genre': lambda: db_service.get_leaderboard(
+            'most_completed', 'genre', rng.randint(1, genres)
+        ),
+        'get_all_users': lambda: db_service.get_all_users(),
+        'get_user': lambda: db_service.get_user(user()),
+        'validate_user': lambda: db_service.validate_user(
+            f'bench_user_{user()}', SEED_PASSWORD
+        ),
+        'get_all_developers': lambda: db_service.get_all_developers(),
+        'get_developer': lambda: db_service.get_developer(
+            rng.randint(1, developers)
+        ),
+        'get_all_publishers': lambda: db_service.get_all_publishers(),
+        'get_publisher': lambda: db_service.get_publisher(
+            rng.randint(1, publishers)
+        ),
+        'get_all_genres': lambda: db_service.get_all_genres(),
+        'get_genre': lambda: db_service.get_genre(rng.randint(1, genres)),
+        'get_comments_by_game': lambda: db_service.get_comments(id_game=game()),
+        'get_comments_by_user': lambda: db_service.get_comments(id_user=user()),
+        'get_list_by_user': lambda: db_service.get_list(id_user=user()),
+        'get_genre_of_game': lambda: db_service.get_genre_of_game(
+            id_game=game()
+        ),
+    }
+
+
+def write_cases(rng, games, id_user):
+    # Every write is undone by the call that follows it, so a run leaves
+    # the seeded data as it found it.
+    def list_round_trip():
+        id_game = rng.randint(1, games)
+        db_service.add_list(id_game, id_user, 'completed', rng.randint(1, 10))
+        db_service.update_list(id_game, id_user, 'playing', rng.randint(1, 10))
+        db_service.delete_list(id_game, id_user)
+
+    def comment_round_trip():
+        id_game = rng.randint(1, games)
+        db_service.add_comment(id_game, id_user, 'benchmark comment')
+        db_service.update_comment(id_game, id_user, 'edited comment')
+        db_service.delete_comment(id_game, id_user)
+
+    return {
+        'list_add_update_delete': list_round_trip,
+        'comment_add_update_delete': comment_round_trip,
+    }
+
+
+def clear_caches():
+    db_service.reference_cache.backend.clear()
+    db_service._reset_listing_cache()
+
+
+def measure(call, iterations, warmup, cold):
+    for _ in range(warmup):
+        call()
+
+    timings = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        if cold:
+            clear_caches()
+        call_started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - call_started)
+
+    return summarize(timings, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time each db_service function against a seeded database'
+    )
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--cold', action='store_true',
+                        help='clear the reference and listing caches before '
+                             'every call')
+    parser.add_argument('--only', action='append', default=[],
+                        help='glob of case names to run, may be repeated')
+    parser.add_argument('--skip-writes', action='store_true')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sizes = {
+        'games': _table_size('game', 'id_game'),
+        'users': _table_size('users', 'id_user'),
+        'developers': _table_size('developer', 'id_developer'),
+        'publishers': _table_size('publisher', 'id_publisher'),
+        'genres': _table_size('genre', 'id_genre'),
+    }
+    if not all(sizes.values()):
+        parser.error('the database is empty, run benchmarks/seed.py first')
+
+    cases = read_cases(rng, **sizes)
+
+    writer = None
+    if not args.skip_writes:
+        writer = f'bench_writer_{uuid.uuid4().hex[:8]}'
+        db_service.add_user(writer, SEED_PASSWORD, f'{writer}@example.com')
+        id_user = db_service.validate_user(writer, SEED_PASSWORD)['id_user']
+        cases.update(write_cases(rng, sizes['games'], id_user))
+
+    if args.only:
+        cases = {name: case for name, case in cases.items()
+                 if any(fnmatch.fnmatch(name, pattern) for pattern in args.only)}
+
+    results = {
+        'benchmark': 'db_service',
+        'iterations': args.iterations,
+        'cold': args.cold,
+        'sizes': sizes,
+        'cases': {},
+    }
+    try:
+        for name, case in cases.items():
+            summary = measure(case, args.iterations, args.warmup, args.cold)
+            results['cases'][name] = summary
+            print(f'{name:32} p50 {summary["p50_seconds"] * 1000:8.2f} ms',
+                  file=sys.stderr)
+    finally:
+        if writer is not None:
+            db_service.delete_user(id_user)
+        db_service.close_pool()
+
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import argparse
+import datetime
+import decimal
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rows
+
+COLUMN_NAMES = ['id_game', 'game_name', 'description', 'release_date',
+                'rating', 'developer', 'publisher', 'avg_rating', 'popularity']
+
+
+def make_rows(count):
+    release_date = datetime.date(2020, 1, 1)
+    return [
+        (index, f'Game {index}', f'Description of game {index}',
+         release_date, decimal.Decimal('7.5'), f'Studio {index % 500}',
+         f'Publisher {index % 200}', decimal.Decimal('8.25'), index % 1000)
+        for index in range(count)
+    ]
+
+
+def temp_dicts(fetched):
+    games_dict = []
+    for game in fetched:
+        temp_dict = {}
+        for key, value in zip(COLUMN_NAMES, game):
+            temp_dict[key] = value
+        games_dict.append(temp_dict)
+    return games_dict
+
+
+def zipped_dicts(fetched):
+    return [dict(zip(COLUMN_NAMES, game)) for game in fetched]
+
+
+def row_objects(fetched):
+    return rows.build_rows(rows.Game, fetched)
+
+
+MAPPERS = {
+    'temp_dict': temp_dicts,
+    'dict_zip': zipped_dicts,
+    'row_class': row_objects,
+}
+
+
+def measure(mapper, fetched, repeat):
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        mapper(fetched)
+        timings.append(time.perf_counter() - started)
+
+    # Only the mapped objects are counted; the source tuples already exist.
+    gc.collect()
+    tracemalloc.start()
+    mapped = mapper(fetched)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del mapped
+
+    return {
+        'best_seconds': min(timings),
+        'mean_seconds': sum(timings) / len(timings),
+        'bytes': allocated,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare time and memory of mapping game rows to dicts '
+                    'and to row objects'
+    )
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    fetched = make_rows(args.rows)
+    results = {
+        'benchmark': 'row_mapping',
+        'rows': args.rows,
+        'repeat': args.repeat,
+    }
+    for name, mapper in MAPPERS.items():
+        results[name] = measure(mapper, fetched, args.repeat)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
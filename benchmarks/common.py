@@ -0,0 +1,62 @@
+import datetime
+import json
+import math
+import platform
+import subprocess
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+
+    position = (len(sorted_values) - 1) * fraction
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    if lower == upper:
+        return sorted_values[lower]
+
+    weight = position - lower
+    return sorted_values[lower] * (1 - weight) + sorted_values[upper] * weight
+
+
+def summarize(timings, elapsed=None):
+    ordered = sorted(timings)
+    summary = {
+        'count': len(ordered),
+        'mean_seconds': sum(ordered) / len(ordered) if ordered else None,
+        'p50_seconds': percentile(ordered, 0.50),
+        'p95_seconds': percentile(ordered, 0.95),
+        'p99_seconds': percentile(ordered, 0.99),
+        'max_seconds': ordered[-1] if ordered else None,
+    }
+    if elapsed:
+        summary['per_second'] = len(ordered) / elapsed
+    return summary
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'recorded_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+    }
+
+
+def write_results(results, path=None):
+    results = dict(results, environment=environment())
+
+    print(json.dumps(results, indent=2))
+    if path:
+        with open(path, 'w') as output:
+            json.dump(results, output, indent=2)
@@ -0,0 +1,76 @@
+import argparse
+import json
+import sys
+
+# Metrics where a bigger number is an improvement; for the rest (seconds,
+# bytes) a bigger number is a regression.
+HIGHER_IS_BETTER = ('per_second',)
+IGNORED = ('environment', 'count', 'statuses', 'iterations', 'repeat',
+           'concurrency', 'duration', 'sizes', 'rows', 'requests',
+           'settings', 'target_ms', 'workers', 'queue')
+
+
+def flatten(value, prefix=''):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key in IGNORED:
+                continue
+            yield from flatten(item, f'{prefix}{key}.')
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix.rstrip('.'), value
+
+
+def compare(baseline, current, threshold):
+    old = dict(flatten(baseline))
+    new = dict(flatten(current))
+    rows = []
+
+    for name in sorted(old.keys() & new.keys()):
+        before, after = old[name], new[name]
+        if before == 0:
+            continue
+
+        change = (after - before) / before
+        higher_is_better = any(part in name for part in HIGHER_IS_BETTER)
+        regressed = (change < -threshold if higher_is_better
+                     else change > threshold)
+        rows.append((name, before, after, change, regressed))
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare two benchmark result files'
+    )
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=10,
+                        help='percent change that counts as a regression')
+    parser.add_argument('--all', action='store_true',
+                        help='also list metrics within the threshold')
+    args = parser.parse_args()
+
+    with open(args.baseline) as baseline, open(args.current) as current:
+        baseline, current = json.load(baseline), json.load(current)
+
+    if baseline.get('benchmark') != current.get('benchmark'):
+        parser.error('the files hold results of different benchmarks')
+
+    rows = compare(baseline, current, args.threshold / 100)
+    regressions = 0
+    for name, before, after, change, regressed in rows:
+        regressions += regressed
+        if not (args.all or regressed or abs(change) > args.threshold / 100):
+            continue
+
+        marker = 'REGRESSION' if regressed else ''
+        print(f'{name:60} {before:14.6g} {after:14.6g} {change:+8.1%} {marker}')
+
+    print(f'{len(rows)} metrics compared, {regressions} regressions')
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+import argparse
+import http.cookiejar
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import summarize, write_results
+from seed import SEED_PASSWORD
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # The routes answer POSTs with a redirect; only the route itself is timed.
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Client:
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            NoRedirect()
+        )
+
+    def request(self, path, form=None):
+        data = None
+        if form is not None:
+            data = urllib.parse.urlencode(form).encode('utf-8')
+
+        try:
+            with self.opener.open(self.base_url + path, data,
+                                  timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            error.read()
+            return error.code
+
+
+class Worker:
+    def __init__(self, client, rng, games, users):
+        self.client = client
+        self.rng = rng
+        self.games = games
+        self.users = users
+        self.id_user = None
+
+    def login(self):
+        self.id_user = self.rng.randint(1, self.users)
+        return self.client.request('/login', {
+            'username': f'bench_user_{self.id_user}',
+            'password': SEED_PASSWORD,
+        })
+
+    def home(self):
+        return self.client.request('/')
+
+    def home_filtered(self):
+        return self.client.request(
+            '/?order_by=rating&order_direction=desc'
+            f'&page={self.rng.randint(1, 10)}'
+        )
+
+    def game(self):
+        return self.client.request(f'/games/{self.rng.randint(1, self.games)}')
+
+    def user(self):
+        return self.client.request(f'/users/{self.rng.randint(1, self.users)}')
+
+    def list_update(self):
+        if self.id_user is None:
+            self.login()
+
+        id_game = self.rng.randint(1, self.games)
+        return self.client.request(
+            f'/lists/{id_game}_{self.id_user}/update',
+            {'list_type': self.rng.choice(['planned', 'playing', 'postponed',
+                                           'completed']),
+             'rated': str(self.rng.randint(1, 10))}
+        )
+
+
+SCENARIOS = {
+    'browse': {'home': 4, 'home_filtered': 2, 'game': 6, 'user': 2},
+    'home': {'home': 1},
+    'game': {'game': 1},
+    'user': {'user': 1},
+    'login': {'login': 1},
+    'list_update': {'list_update': 1},
+    'mixed': {'home': 3, 'home_filtered': 1, 'game': 5, 'user': 2,
+              'login': 1, 'list_update': 2},
+}
+
+# Redirects are the expected answer to the form posts.
+OK_STATUSES = {200, 302, 303, 304}
+
+
+def run(base_url, scenario, concurrency, duration, games, users, timeout,
+        random_seed):
+    actions, weights = zip(*SCENARIOS[scenario].items())
+    timings = defaultdict(list)
+    statuses = defaultdict(Counter)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def work(index):
+        rng = random.Random(random_seed + index)
+        worker = Worker(Client(base_url, timeout), rng, games, users)
+        local_timings = defaultdict(list)
+        local_statuses = defaultdict(Counter)
+
+        while time.perf_counter() < deadline:
+            action = rng.choices(actions, weights)[0]
+            started = time.perf_counter()
+            try:
+                status = getattr(worker, action)()
+            except OSError as error:
+                status = type(error).__name__
+            local_timings[action].append(time.perf_counter() - started)
+            local_statuses[action][status] += 1
+
+        with lock:
+            for action, values in local_timings.items():
+                timings[action].extend(values)
+            for action, counter in local_statuses.items():
+                statuses[action].update(counter)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=work, args=(index,))
+               for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {'actions': {}}
+    for action in actions:
+        summary = summarize(timings[action], elapsed)
+        summary['statuses'] = {str(status): count for status, count
+                               in statuses[action].items()}
+        summary['errors'] = sum(count for status, count
+                                in statuses[action].items()
+                                if status not in OK_STATUSES)
+        results['actions'][action] = summary
+
+    results['total'] = summarize(
+        [value for values in timings.values() for value in values], elapsed
+    )
+    results['total']['errors'] = sum(summary['errors'] for summary
+                                     in results['actions'].values())
+    results['elapsed_seconds'] = elapsed
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Drive a running instance of app.py with scripted '
+                    'scenarios and report latency percentiles'
+    )
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--scenario', choices=SCENARIOS, default='mixed')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--games', type=int, default=10000,
+                        help='number of seeded games')
+    parser.add_argument('--users', type=int, default=2000,
+                        help='number of seeded users')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    results = {
+        'benchmark': 'load',
+        'scenario': args.scenario,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+    }
+    results.update(run(args.url, args.scenario, args.concurrency,
+                       args.duration, args.games, args.users, args.timeout,
+                       args.seed))
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
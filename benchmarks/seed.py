@@ -0,0 +1,181 @@
+import argparse
+import csv
+import datetime
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_service
+import passwords
+
+SEED_PASSWORD = 'benchmark'
+
+TABLES = ('list', 'comment', 'genre_of_game', 'game', 'genre', 'users',
+          'developer', 'publisher')
+
+WORDS = ['dark', 'star', 'legend', 'shadow', 'knight', 'quest', 'city',
+         'space', 'dragon', 'racer', 'tactics', 'souls', 'witcher', 'empire',
+         'frontier', 'island', 'zero', 'ghost', 'kingdom', 'storm', 'iron',
+         'last', 'world', 'night', 'blade', 'arena', 'forge', 'hollow']
+COUNTRIES = ['Japan', 'USA', 'Poland', 'France', 'Germany', 'Canada',
+             'United Kingdom', 'Sweden', 'Finland', 'South Korea', None]
+GENRES = ['RPG', 'Action', 'Adventure', 'Strategy', 'Shooter', 'Puzzle',
+          'Racing', 'Simulation', 'Sports', 'Horror', 'Platformer',
+          'Fighting', 'Roguelike', 'Survival', 'Stealth', 'Sandbox']
+FIRST_RELEASE = datetime.date(1990, 1, 1)
+RELEASE_DAYS = (datetime.date(2025, 1, 1) - FIRST_RELEASE).days
+
+
+def _words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+def _copy(cursor, table, columns, records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for record in records:
+        writer.writerow(['' if value is None else value for value in record])
+        count += 1
+    buffer.seek(0)
+
+    # In CSV format an unquoted empty field is NULL.
+    cursor.copy_expert(
+        f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)',
+        buffer
+    )
+    return count
+
+
+def _pairs(rng, users, games, per_user):
+    # Distinct (game, user) pairs. Half of the picks are skewed towards low
+    # game ids so that some games are much more popular than others.
+    for id_user in range(1, users + 1):
+        count = min(games, int(rng.expovariate(1 / per_user)))
+        chosen = set()
+        while len(chosen) < count:
+            if rng.random() < 0.5:
+                chosen.add(min(games, int(rng.paretovariate(1.2))))
+            else:
+                chosen.add(rng.randint(1, games))
+        for id_game in sorted(chosen):
+            yield id_game, id_user
+
+
+def seed(connection, games, users, developers, publishers, genres,
+         lists_per_user, comments_per_user, random_seed, log=print):
+    rng = random.Random(random_seed)
+    genres = min(genres, len(GENRES))
+    # One hash shared by all seeded users; hashing thousands would dominate
+    # the seed time.
+    password = passwords.hash_password(SEED_PASSWORD)
+    counts = {}
+
+    with connection.cursor() as cursor:
+        # Identities restart so ids are 1..N and the load scenarios can
+        # address rows without looking them up.
+        cursor.execute(f'TRUNCATE {", ".join(TABLES)} RESTART IDENTITY CASCADE')
+
+        counts['developer'] = _copy(
+            cursor, 'developer', ('studio_name', 'country'),
+            ((f'{_words(rng, 2).title()} Studio {index}',
+              rng.choice(COUNTRIES)) for index in range(developers))
+        )
+        counts['publisher'] = _copy(
+            cursor, 'publisher', ('publisher_name', 'country'),
+            ((f'{_words(rng, 1).title()} Publishing {index}',
+              rng.choice(COUNTRIES)) for index in range(publishers))
+        )
+        counts['genre'] = _copy(cursor, 'genre', ('genre_name',),
+                                ((name,) for name in GENRES[:genres]))
+        counts['game'] = _copy(
+            cursor, 'game',
+            ('game_name', 'description', 'release_date', 'rating',
+             'id_developer', 'id_publisher'),
+            ((f'{_words(rng, rng.randint(1, 3)).title()} {index}',
+              _words(rng, rng.randint(5, 40)).capitalize(),
+              FIRST_RELEASE + datetime.timedelta(rng.randrange(RELEASE_DAYS)),
+              f'{rng.uniform(1, 10):.2f}',
+              rng.randint(1, developers),
+              rng.randint(1, publishers) if rng.random() > 0.1 else None)
+             for index in range(1, games + 1))
+        )
+        counts['users'] = _copy(
+            cursor, 'users', ('username', 'password', 'email'),
+            ((f'bench_user_{index}', password,
+              f'bench_user_{index}@example.com')
+             for index in range(1, users + 1))
+        )
+        counts['genre_of_game'] = _copy(
+            cursor, 'genre_of_game', ('id_game', 'id_genre'),
+            ((id_game, id_genre) for id_game in range(1, games + 1)
+             for id_genre in sorted(rng.sample(range(1, genres + 1),
+                                               rng.randint(1, min(3, genres)))))
+        )
+        list_types = db_service.LIST_TYPES
+        counts['list'] = _copy(
+            cursor, 'list', ('id_game', 'id_user', 'list_type', 'rated'),
+            ((id_game, id_user, list_type,
+              rng.randint(1, 10) if list_type != 'planned' else None)
+             for id_game, id_user in _pairs(rng, users, games, lists_per_user)
+             for list_type in [rng.choice(list_types)])
+        )
+        counts['comment'] = _copy(
+            cursor, 'comment', ('id_game', 'id_user', 'text'),
+            ((id_game, id_user, _words(rng, rng.randint(3, 30)).capitalize())
+             for id_game, id_user in _pairs(rng, users, games,
+                                            comments_per_user))
+        )
+
+        for table in TABLES:
+            cursor.execute(f'ANALYZE {table}')
+
+    connection.commit()
+    for table, count in counts.items():
+        log(f'{table}: {count} rows')
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replace the contents of a local database with generated '
+                    'benchmark data'
+    )
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--developers', type=int, default=500)
+    parser.add_argument('--publishers', type=int, default=200)
+    parser.add_argument('--genres', type=int, default=len(GENRES))
+    parser.add_argument('--lists-per-user', type=float, default=20)
+    parser.add_argument('--comments-per-user', type=float, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--yes', action='store_true',
+                        help='confirm that existing data may be deleted')
+    args = parser.parse_args()
+
+    if not args.yes:
+        parser.error(f'seeding truncates {", ".join(TABLES)}; '
+                     f'pass --yes to continue')
+
+    connection = db_service.connect()
+    try:
+        started = time.perf_counter()
+        seed(connection, args.games, args.users, args.developers,
+             args.publishers, args.genres, args.lists_per_user,
+             args.comments_per_user, args.seed)
+    finally:
+        connection.close()
+
+    db_service.refresh_game_stats()
+    db_service.refresh_leaderboards()
+    print(f'Seeded in {time.perf_counter() - started:.1f}s, '
+          f'users log in with password "{SEED_PASSWORD}"')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import time
+from dataclasses import dataclass
+
+import db_service
+
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 5000))
+
+ENTITIES = {
+    'developers': {
+        'staging': '''CREATE TEMP TABLE IF NOT EXISTS staging_developer (
+            studio_name text, country text
+        )''',
+        'columns': ['studio_name', 'country'],
+        'upsert': '''UPDATE developer SET country = staging.country
+        FROM staging_developer AS staging
+        WHERE developer.studio_name = staging.studio_name;
+        INSERT INTO developer (studio_name, country)
+        SELECT DISTINCT ON (staging.studio_name)
+        staging.studio_name, staging.country
+        FROM staging_developer AS staging
+        WHERE NOT EXISTS (
+            SELECT 1 FROM developer
+            WHERE developer.studio_name = staging.studio_name
+        );
+        TRUNCATE staging_developer''',
+    },
+    'publishers': {
+        'staging': '''CREATE TEMP TABLE IF NOT EXISTS staging_publisher (
+            publisher_name text, country text
+        )''',
+        'columns': ['publisher_name', 'country'],
+        'upsert': '''UPDATE publisher SET country = staging.country
+        FROM staging_publisher AS staging
+        WHERE publisher.publisher_name = staging.publisher_name;
+        INSERT INTO publisher (publisher_name, country)
+        SELECT DISTINCT ON (staging.publisher_name)
+        staging.publisher_name, staging.country
+        FROM staging_publisher AS staging
+        WHERE NOT EXISTS (
+            SELECT 1 FROM publisher
+            WHERE publisher.publisher_name = staging.publisher_name
+        );
+        TRUNCATE staging_publisher''',
+    },
+    'games': {
+        'staging': '''CREATE TEMP TABLE IF NOT EXISTS staging_game (
+            game_name text, description text, release_date date,
+            rating numeric, id_developer integer, id_publisher integer
+        )''',
+        'columns': ['game_name', 'description', 'release_date', 'rating',
+                    'id_developer', 'id_publisher'],
+        'upsert': '''UPDATE game SET description = staging.description,
+        release_date = staging.release_date,
+        rating = coalesce(staging.rating, game.rating),
+        id_publisher = staging.id_publisher
+        FROM staging_game AS staging
+        WHERE game.game_name = staging.game_name
+        AND game.id_developer = staging.id_developer;
+        INSERT INTO game (game_name, description, release_date, rating,
+        id_developer, id_publisher)
+        SELECT DISTINCT ON (staging.game_name, staging.id_developer)
+        staging.game_name, staging.description, staging.release_date,
+        coalesce(staging.rating, 0), staging.id_developer, staging.id_publisher
+        FROM staging_game AS staging
+        WHERE NOT EXISTS (
+            SELECT 1 FROM game
+            WHERE game.game_name = staging.game_name
+            AND game.id_developer = staging.id_developer
+        );
+        INSERT INTO game_stats (id_game)
+        SELECT game.id_game FROM game
+        JOIN staging_game AS staging
+        ON game.game_name = staging.game_name
+        AND game.id_developer = staging.id_developer
+        ON CONFLICT DO NOTHING;
+        TRUNCATE staging_game''',
+    },
+}
+
+LOOKUPS = {
+    'developer': ('developer', 'id_developer', 'studio_name'),
+    'publisher': ('publisher', 'id_publisher', 'publisher_name'),
+}
+
+
+@dataclass
+class ImportReport:
+    entity: str
+    rows: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        if self.seconds == 0:
+            return 0.0
+        return self.rows / self.seconds
+
+
+def read_records(stream, file_format):
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+    elif file_format == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        raise ValueError(f'Unsupported import format: {file_format}')
+
+
+def detect_format(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    return 'csv'
+
+
+def chunked(records, size):
+    iterator = iter(records)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class NameLookup:
+    def __init__(self, cursor, table, id_column, name_column):
+        self.table = table
+        self.id_column = id_column
+        self.name_column = name_column
+
+        cursor.execute(f'SELECT {name_column}, {id_column} FROM {table}')
+        self.ids = dict(cursor.fetchall())
+
+    def resolve(self, cursor, names):
+        missing = sorted({name for name in names
+                          if name and name not in self.ids})
+        if missing:
+            cursor.execute(
+                f'''INSERT INTO {self.table} ({self.name_column})
+                SELECT unnest(%s::text[])
+                RETURNING {self.name_column}, {self.id_column}''',
+                (missing,)
+            )
+            self.ids.update(cursor.fetchall())
+
+        return self.ids
+
+
+def _empty_to_none(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _game_rows(cursor, chunk, lookups):
+    developer_ids = lookups['developer'].resolve(
+        cursor, [_empty_to_none(record.get('developer')) for record in chunk]
+    )
+    publisher_ids = lookups['publisher'].resolve(
+        cursor, [_empty_to_none(record.get('publisher')) for record in chunk]
+    )
+
+    for record in chunk:
+        developer = _empty_to_none(record.get('developer'))
+        publisher = _empty_to_none(record.get('publisher'))
+        yield [
+            _empty_to_none(record.get('game_name')),
+            _empty_to_none(record.get('description')),
+            _empty_to_none(record.get('release_date')),
+            _empty_to_none(record.get('rating')),
+            developer_ids.get(developer),
+            publisher_ids.get(publisher) if publisher else None,
+        ]
+
+
+def _copy_chunk(cursor, entity, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['' if value is None else value for value in row])
+    buffer.seek(0)
+
+    columns = ', '.join(ENTITIES[entity]['columns'])
+    table = 'staging_' + entity[:-1]
+    cursor.copy_expert(
+        f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer
+    )
+
+
+def import_records(entity, records, chunk_size=IMPORT_CHUNK_SIZE,
+                   on_progress=None):
+    if entity not in ENTITIES:
+        raise ValueError(f'Unknown import entity: {entity}')
+
+    report = ImportReport(entity)
+    started = time.perf_counter()
+    connection = db_service.get_connection()
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(ENTITIES[entity]['staging'])
+
+            lookups = {}
+            if entity == 'games':
+                lookups = {name: NameLookup(cursor, *lookup)
+                           for name, lookup in LOOKUPS.items()}
+
+            for chunk in chunked(records, chunk_size):
+                if entity == 'games':
+                    rows = _game_rows(cursor, chunk, lookups)
+                else:
+                    columns = ENTITIES[entity]['columns']
+                    rows = ([_empty_to_none(record.get(column))
+                             for column in columns] for record in chunk)
+
+                _copy_chunk(cursor, entity, rows)
+                cursor.execute(ENTITIES[entity]['upsert'])
+                connection.commit()
+
+                report.rows += len(chunk)
+                report.chunks += 1
+                report.seconds = time.perf_counter() - started
+                if on_progress is not None:
+                    on_progress(report)
+    finally:
+        db_service.release_connection(connection)
+
+        db_service.invalidate_reference_cache('developers', 'publishers')
+        db_service.invalidate_listing_cache()
+        db_service.touch_entities('games', 'developers', 'publishers')
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def import_file(entity, stream, file_format, chunk_size=IMPORT_CHUNK_SIZE,
+                on_progress=None):
+    return import_records(
+        entity, read_records(stream, file_format),
+        chunk_size=chunk_size, on_progress=on_progress
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Bulk import games, developers or publishers'
+    )
+    parser.add_argument('entity', choices=sorted(ENTITIES))
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['csv', 'jsonl'])
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    file_format = args.format or detect_format(args.path)
+
+    def print_progress(report):
+        print(f'{report.rows} rows, {report.rows_per_second:.0f} rows/sec',
+              flush=True)
+
+    with open(args.path, encoding='utf-8', newline='') as stream:
+        report = import_file(args.entity, stream, file_format,
+                             chunk_size=args.chunk_size,
+                             on_progress=print_progress)
+
+    print(f'Imported {report.rows} {report.entity} in {report.seconds:.2f}s '
+          f'({report.rows_per_second:.0f} rows/sec)')
+
+
+if __name__ == '__main__':
+    main()
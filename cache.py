@@ -0,0 +1,237 @@
+import functools
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+def estimate_size(value):
+    size = sys.getsizeof(value)
+
+    if isinstance(value, dict):
+        size += sum(estimate_size(key) + estimate_size(item)
+                    for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    elif hasattr(value, '__dict__'):
+        size += estimate_size(vars(value))
+    elif hasattr(value, '__slots__'):
+        size += sum(estimate_size(getattr(value, name, None))
+                    for name in value.__slots__)
+
+    return size
+
+
+class CacheBackend:
+    def get(self, key, default=MISSING):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+class MemoryCache(CacheBackend):
+    def __init__(self, max_entries=128, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0,
+                       'expirations': 0, 'invalidations': 0}
+
+    def get(self, key, default=MISSING):
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= now:
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def delete_matching(self, predicate):
+        with self._lock:
+            keys = [key for key, (value, _) in self._entries.items()
+                    if predicate(value)]
+        for key in keys:
+            self.delete(key)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+        return stats
+
+
+class SizedMemoryCache(MemoryCache):
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=60.0,
+                 max_entry_bytes=None, sizeof=estimate_size):
+        super().__init__(max_entries=sys.maxsize, ttl=ttl)
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 8
+        self.sizeof = sizeof
+        self.current_bytes = 0
+        self._sizes = {}
+        self._stats['oversized'] = 0
+
+    def get(self, key, default=MISSING):
+        value = super().get(key, default)
+
+        # MemoryCache drops expired entries without knowing their size.
+        if value is default:
+            with self._lock:
+                if key not in self._entries and key in self._sizes:
+                    self.current_bytes -= self._sizes.pop(key)
+
+        return value
+
+    def set(self, key, value, ttl=None):
+        size = self.sizeof(value)
+        if size > self.max_entry_bytes:
+            with self._lock:
+                self._stats['oversized'] += 1
+            return
+
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._sizes.pop(key, 0)
+
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes and self._entries:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self.current_bytes -= self._sizes.pop(evicted_key, 0)
+                self._stats['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._stats['invalidations'] += 1
+            self.current_bytes -= self._sizes.pop(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+            self._sizes.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.pop('max_entries', None)
+            stats['bytes'] = self.current_bytes
+            stats['max_bytes'] = self.max_bytes
+        return stats
+
+
+class Generation:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self.value += 1
+            return self.value
+
+
+class ReadThroughCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, key):
+        return self._generations.get(key, 0)
+
+    def set_if_current(self, key, value, generation):
+        # A load that overlapped an invalidation of its key may have read
+        # the old data, so it is returned but not stored.
+        with self._lock:
+            if self._generations.get(key, 0) == generation:
+                self.backend.set(key, value)
+
+    def get_or_load(self, key, loader):
+        value = self.backend.get(key)
+        if value is MISSING:
+            generation = self.generation(key)
+            value = loader()
+            self.set_if_current(key, value, generation)
+
+        return value
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._generations[key] = self._generations.get(key, 0) + 1
+                self.backend.delete(key)
+
+    def stats(self):
+        return self.backend.stats()
+
+    def cached(self, key):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                cache_key = key
+                if args or kwargs:
+                    cache_key = (key, args, tuple(sorted(kwargs.items())))
+                return self.get_or_load(
+                    cache_key, lambda: func(*args, **kwargs)
+                )
+
+            return wrapper
+
+        return decorator
@@ -0,0 +1,218 @@
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolError(psycopg2.Error):
+    pass
+
+
+class PoolTimeout(PoolError):
+    pass
+
+
+class ConnectionPool:
+    def __init__(
+            self,
+            connect,
+            min_size=1,
+            max_size=10,
+            max_lifetime=3600.0,
+            check_idle_after=30.0,
+            timeout=30.0
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError('Pool requires 0 <= min_size <= max_size, max_size >= 1')
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.check_idle_after = check_idle_after
+        self.timeout = timeout
+
+        self._condition = threading.Condition()
+        self._idle = deque()
+        self._created_at = {}
+        self._last_used = {}
+        self._in_use = set()
+        self._opening = 0
+        self._closed = False
+
+        self._stats = {
+            'connections_opened': 0,
+            'connections_closed': 0,
+            'connections_recycled': 0,
+            'connections_failed_check': 0,
+            'checkouts': 0,
+            'checkout_timeouts': 0,
+            'checkout_wait_seconds': 0.0,
+        }
+
+        for _ in range(min_size):
+            connection = self._connect()
+            self._register(connection)
+            self._idle.append(connection)
+
+    @property
+    def size(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _register(self, connection):
+        now = time.monotonic()
+        self._created_at[id(connection)] = now
+        self._last_used[id(connection)] = now
+        self._stats['connections_opened'] += 1
+
+    def _discard(self, connection):
+        self._created_at.pop(id(connection), None)
+        self._last_used.pop(id(connection), None)
+        self._stats['connections_closed'] += 1
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def _is_expired(self, connection, now):
+        created_at = self._created_at.get(id(connection), now)
+        return self.max_lifetime is not None and now - created_at >= self.max_lifetime
+
+    def _is_healthy(self, connection, now):
+        if connection.closed:
+            return False
+
+        last_used = self._last_used.get(id(connection), now)
+        if self.check_idle_after is None or now - last_used < self.check_idle_after:
+            return True
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+        except psycopg2.Error:
+            return False
+
+        return True
+
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise PoolError('Connection pool is closed')
+
+                if self._idle:
+                    connection = self._idle.pop()
+                    self._in_use.add(connection)
+                    break
+
+                if self.size < self.max_size:
+                    self._opening += 1
+                    connection = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['checkout_timeouts'] += 1
+                    raise PoolTimeout(
+                        f'No connection available within {timeout} seconds'
+                    )
+                self._condition.wait(remaining)
+
+        if connection is None:
+            connection = self._open_in_use()
+        else:
+            connection = self._checked(connection)
+
+        with self._condition:
+            self._stats['checkouts'] += 1
+            self._stats['checkout_wait_seconds'] += time.monotonic() - started
+
+        return connection
+
+    def _checked(self, connection):
+        now = time.monotonic()
+        expired = self._is_expired(connection, now)
+        healthy = not expired and self._is_healthy(connection, now)
+
+        if healthy:
+            return connection
+
+        with self._condition:
+            self._in_use.discard(connection)
+            if expired:
+                self._stats['connections_recycled'] += 1
+            else:
+                self._stats['connections_failed_check'] += 1
+            self._discard(connection)
+            self._opening += 1
+
+        return self._open_in_use()
+
+    def _open_in_use(self):
+        connection = None
+        try:
+            connection = self._connect()
+        finally:
+            with self._condition:
+                self._opening -= 1
+                if connection is not None:
+                    self._register(connection)
+                    self._in_use.add(connection)
+                else:
+                    self._condition.notify()
+
+        return connection
+
+    def putconn(self, connection, discard=False):
+        if not connection.closed and not discard:
+            status = connection.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        with self._condition:
+            if connection not in self._in_use:
+                raise PoolError('Connection does not belong to this pool')
+            self._in_use.discard(connection)
+
+            now = time.monotonic()
+            if (discard or self._closed or connection.closed
+                    or self._is_expired(connection, now)):
+                if not discard and not connection.closed and not self._closed:
+                    self._stats['connections_recycled'] += 1
+                self._discard(connection)
+            else:
+                self._last_used[id(connection)] = now
+                self._idle.append(connection)
+
+            self._condition.notify()
+
+    def closeall(self):
+        with self._condition:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update({
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+            })
+        return stats
@@ -1,103 +1,764 @@
+import base64
+import datetime
+import decimal
+import functools
 import hashlib
+import json
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from typing import Literal
 
 import psycopg2
 from dotenv import load_dotenv
+from flask import g, has_app_context
 
-load_dotenv()
+import passwords
+import rows
+from cache import Generation, MemoryCache, ReadThroughCache, SizedMemoryCache
+from db_pool import ConnectionPool
+from query_log import (InstrumentedCursor, carry, labelled, query_log,
+                       record_wait)
+from statements import PreparingConnection, StatementRegistry
+from versions import EntityVersions, MemoryVersionStore
 
+load_dotenv()
 
-def get_connection():
+_pool = None
+_pool_lock = threading.Lock()
+_query_executor = None
+_query_executor_lock = threading.Lock()
+QUERY_THREAD_PREFIX = 'db-query'
+
+reference_cache = ReadThroughCache(MemoryCache(
+    max_entries=int(os.getenv('REFERENCE_CACHE_SIZE', 128)),
+    ttl=float(os.getenv('REFERENCE_CACHE_TTL', 300)),
+))
+
+listing_cache = ReadThroughCache(SizedMemoryCache(
+    max_bytes=int(os.getenv('LISTING_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+    ttl=float(os.getenv('LISTING_CACHE_TTL', 60)),
+))
+listing_generation = Generation()
+
+statements = StatementRegistry()
+entity_versions = EntityVersions(MemoryVersionStore())
+PREPARE_STATEMENTS = os.getenv('POSTGRES_PREPARE_STATEMENTS', '1') == '1'
+
+GAMES_PAGE_SIZE = int(os.getenv('GAMES_PAGE_SIZE', 50))
+GAMES_ORDER_BY = {'id_game': 'game.id_game',
+                  'rating': 'game.rating',
+                  'release_date': 'game.release_date',
+                  'avg_rating': 'game_stats.avg_rating',
+                  'popularity': 'game_stats.list_count'}
+GAMES_ORDER_DIRECTIONS = ('asc', 'desc')
+LIST_TYPES = ('planned', 'playing', 'postponed', 'completed')
+LEADERBOARDS = ('top_rated', 'most_planned', 'most_completed')
+LEADERBOARD_SCOPES = ('all', 'genre', 'developer', 'publisher')
+LEADERBOARD_DEPTH = 100
+
+# Must stay identical to the expression of game_search_vector_idx
+# (migrations/0003_game_search.up.sql), otherwise the GIN index is not used.
+GAME_SEARCH_VECTOR = '''(setweight(to_tsvector('simple', coalesce(game.game_name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(game.description, '')), 'B'))'''
+GAME_SEARCH_FILTER = f'''({GAME_SEARCH_VECTOR} @@ to_tsquery('simple', %s)
+    OR %s <%% game.game_name)'''
+
+
+def connect():
+    # Transaction-mode poolers such as pgbouncer do not keep PREPAREd
+    # statements across transactions, so preparing can be turned off.
+    connection_factory = PreparingConnection if PREPARE_STATEMENTS else None
     connection = psycopg2.connect(
         host=os.getenv('POSTGRES_HOST'),
         port=os.getenv('POSTGRES_PORT'),
         dbname=os.getenv('POSTGRES_DB'),
         user=os.getenv('POSTGRES_USER'),
         password=os.getenv('POSTGRES_PASSWORD'),
+        connection_factory=connection_factory,
     )
+    connection.cursor_factory = InstrumentedCursor
+
+    return connection
+
+
+def get_pool():
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    connect,
+                    min_size=int(os.getenv('POSTGRES_POOL_MIN_SIZE', 1)),
+                    max_size=int(os.getenv('POSTGRES_POOL_MAX_SIZE', 10)),
+                    max_lifetime=float(
+                        os.getenv('POSTGRES_POOL_MAX_LIFETIME', 3600)
+                    ),
+                    check_idle_after=float(
+                        os.getenv('POSTGRES_POOL_CHECK_IDLE_AFTER', 30)
+                    ),
+                    timeout=float(os.getenv('POSTGRES_POOL_TIMEOUT', 30)),
+                )
+
+    return _pool
+
+
+def get_pool_stats():
+    if _pool is None:
+        return None
+
+    return _pool.stats()
+
+
+def close_pool():
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
 
+def get_connection():
+    started = time.perf_counter()
+    connection = get_pool().getconn()
+    record_wait(time.perf_counter() - started)
     return connection
 
 
+def release_connection(connection, discard=False):
+    get_pool().putconn(connection, discard=discard)
+
+
+class UnitOfWork:
+    def __init__(self):
+        self.connection = None
+        self.failed = False
+        self.on_close = []
+        # Taken before the request reads anything, so content rendered from
+        # its reads is never keyed on a newer version than it shows.
+        self.versions = entity_versions.snapshot()
+
+    def get_connection(self):
+        if self.connection is None:
+            self.connection = get_connection()
+
+        return self.connection
+
+    @contextmanager
+    def scope(self):
+        connection = self.get_connection()
+
+        try:
+            yield connection
+        except Exception:
+            self.failed = True
+            connection.rollback()
+            raise
+
+    def commit(self):
+        if self.connection is None:
+            return
+
+        if self.failed:
+            self.connection.rollback()
+        else:
+            self.connection.commit()
+
+    def release(self):
+        # Ends the transaction and hands the connection back to the pool; the
+        # next scope acquires a fresh one.
+        if self.connection is None:
+            return
+
+        self.commit()
+        connection, self.connection = self.connection, None
+        release_connection(connection)
+
+    def close(self):
+        try:
+            if self.connection is not None:
+                connection, self.connection = self.connection, None
+                release_connection(connection)
+        finally:
+            callbacks, self.on_close = self.on_close, []
+            for callback in callbacks:
+                callback()
+
+
+def begin_unit_of_work():
+    g.unit_of_work = UnitOfWork()
+    return g.unit_of_work
+
+
+def get_unit_of_work():
+    if not has_app_context():
+        return None
+
+    return g.get('unit_of_work')
+
+
+def request_versions():
+    unit_of_work = get_unit_of_work()
+    if unit_of_work is None:
+        return entity_versions
+
+    return unit_of_work.versions
+
+
+def commit_unit_of_work(success=True):
+    unit_of_work = get_unit_of_work()
+    if unit_of_work is None:
+        return
+
+    if not success:
+        unit_of_work.failed = True
+
+    unit_of_work.commit()
+
+
+def release_unit_of_work():
+    unit_of_work = get_unit_of_work()
+    if unit_of_work is not None:
+        unit_of_work.release()
+
+
+def end_unit_of_work():
+    if not has_app_context():
+        return
+
+    unit_of_work = g.pop('unit_of_work', None)
+    if unit_of_work is not None:
+        unit_of_work.close()
+
+
+def get_query_executor():
+    global _query_executor
+
+    if _query_executor is None:
+        with _query_executor_lock:
+            if _query_executor is None:
+                _query_executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv('QUERY_EXECUTOR_WORKERS', 8)),
+                    thread_name_prefix=QUERY_THREAD_PREFIX,
+                )
+
+    return _query_executor
+
+
+def run_in_parallel(*queries):
+    # Workers run outside the request context, so every read borrows its own
+    # pooled connection instead of the request's unit of work.
+    in_worker = threading.current_thread().name.startswith(QUERY_THREAD_PREFIX)
+    if len(queries) <= 1 or in_worker:
+        return [query() for query in queries]
+
+    executor = get_query_executor()
+    futures = [executor.submit(carry(query)) for query in queries]
+
+    return [future.result() for future in futures]
+
+
+def invalidate_reference_cache(*keys):
+    reference_cache.invalidate(*keys)
+
+    # Entries read inside the still open transaction must not outlive it.
+    unit_of_work = get_unit_of_work()
+    if unit_of_work is not None:
+        unit_of_work.on_close.append(
+            lambda: reference_cache.invalidate(*keys)
+        )
+
+
+def listing_cache_key(name, **parameters):
+    normalized = []
+    for key, value in parameters.items():
+        if value is None:
+            continue
+        value = str(value).strip()
+        if key == 'search_text':
+            value = value.lower()
+        normalized.append((key, value))
+
+    return listing_generation.value, name, tuple(sorted(normalized))
+
+
+def _reset_listing_cache():
+    listing_generation.bump()
+    listing_cache.backend.clear()
+
+
+def invalidate_listing_cache():
+    _reset_listing_cache()
+
+    unit_of_work = get_unit_of_work()
+    if unit_of_work is not None:
+        unit_of_work.on_close.append(_reset_listing_cache)
+
+
+def touch_entities(*keys):
+    entity_versions.bump(*keys)
+
+    # Bumped again after commit, otherwise a page rendered from the old rows
+    # in between would be stamped with the new version.
+    unit_of_work = get_unit_of_work()
+    if unit_of_work is not None:
+        unit_of_work.on_close.append(lambda: entity_versions.bump(*keys))
+
+
+class LeaderboardRefresher:
+    def __init__(self, interval):
+        self.interval = interval
+        self._stale = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def mark_stale(self):
+        self._stale.set()
+
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name='leaderboard-refresher',
+                        daemon=True
+                    )
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._stale.wait()
+            # Coalesce bursts of writes into one refresh per interval.
+            time.sleep(self.interval)
+            self._stale.clear()
+
+            try:
+                refresh_leaderboards()
+            except psycopg2.Error:
+                self._stale.set()
+
+
+leaderboard_refresher = LeaderboardRefresher(
+    float(os.getenv('LEADERBOARD_REFRESH_INTERVAL', 30))
+)
+
+
+def mark_leaderboards_stale():
+    unit_of_work = get_unit_of_work()
+    if unit_of_work is not None:
+        unit_of_work.on_close.append(leaderboard_refresher.mark_stale)
+    else:
+        leaderboard_refresher.mark_stale()
+
+
+def get_password_stats():
+    return passwords.get_context().stats()
+
+
+def get_statement_stats():
+    return statements.stats()
+
+
+def get_slow_queries():
+    return query_log.slow_queries()
+
+
+def get_query_metrics():
+    return query_log.render_metrics()
+
+
+def get_cache_stats():
+    return {
+        'reference': reference_cache.stats(),
+        'listing': dict(listing_cache.stats(),
+                        generation=listing_generation.value),
+    }
+
+
+@contextmanager
+def connection_scope():
+    # Queries are attributed to the function marked with @labelled that
+    # opened the scope.
+    unit_of_work = get_unit_of_work()
+
+    if unit_of_work is not None:
+        with unit_of_work.scope() as connection:
+            yield connection
+        return
+
+    connection = get_connection()
+    try:
+        yield connection
+        connection.commit()
+    finally:
+        release_connection(connection)
+
+
+def games_order_sql(order_by, order_direction):
+    # Both end up in the query text, so only known values get there.
+    if order_by not in GAMES_ORDER_BY:
+        raise ValueError(f'Unknown games ordering: {order_by}')
+    if order_direction not in GAMES_ORDER_DIRECTIONS:
+        raise ValueError(f'Unknown order direction: {order_direction}')
+
+    return f'{GAMES_ORDER_BY[order_by]} {order_direction.upper()}'
+
+
+def _games_filter(kwargs):
+    filter_mapping = {
+        'min_release_date': 'game.release_date >= %s',
+        'max_release_date': 'game.release_date <= %s',
+        'min_rating': 'game.rating >= %s',
+        'max_rating': 'game.rating <= %s',
+        'id_developer': 'developer.id_developer =%s',
+        'id_publisher': 'publisher.id_publisher =%s',
+        'search_text': GAME_SEARCH_FILTER
+    }
+
+    query_filter_list = []
+    query_filter_args = []
+
+    for key, value in kwargs.items():
+        query_filter_list.append(filter_mapping[key])
+        if key == 'search_text':
+            query_filter_args.extend([to_search_query(value), value])
+        else:
+            query_filter_args.append(value)
+
+    return query_filter_list, query_filter_args
+
+
+def to_search_query(search_text):
+    words = re.findall(r'\w+', search_text.lower())
+    return ' & '.join(f'{word}:*' for word in words)
+
+
 def get_all_games(
-        order_by: Literal['id_game', 'rating', 'release_date'] = 'id_game',
+        order_by: Literal['id_game', 'rating', 'release_date',
+                          'avg_rating', 'popularity'] = 'id_game',
         order_direction: Literal['asc', 'desc'] = 'asc',
         **kwargs: dict[Literal[
             'min_release_date', 'max_release_date', 'min_rating',
             'max_rating', 'id_developer', 'id_publisher', 'search_text'
         ], str]
 ):
-    connection = get_connection()
+    cache_key = listing_cache_key(
+        'get_all_games', order_by=order_by, order_direction=order_direction,
+        **kwargs
+    )
+    return listing_cache.get_or_load(
+        cache_key, lambda: _get_all_games(order_by, order_direction, **kwargs)
+    )
+
+
+@functools.lru_cache(maxsize=256)
+def _all_games_statement(order_by, order_direction, filter_keys):
     query = '''SELECT game.id_game, game.game_name, game.description, 
     game.release_date, game.rating, developer.studio_name, 
-    publisher.publisher_name 
+    publisher.publisher_name, game_stats.avg_rating, game_stats.list_count 
     FROM game 
     LEFT JOIN developer 
     ON game.id_developer = developer.id_developer 
     LEFT JOIN publisher 
     ON game.id_publisher = publisher.id_publisher
+    LEFT JOIN game_stats 
+    ON game.id_game = game_stats.id_game
     '''
 
-    query_filter_args = []
-    if len(kwargs) > 0:
-        filter_mapping = {
-            'min_release_date': 'game.release_date >= %s',
-            'max_release_date': 'game.release_date <= %s',
-            'min_rating': 'game.rating >= %s',
-            'max_rating': 'game.rating <= %s',
-            'id_developer': 'developer.id_developer =%s',
-            'id_publisher': 'publisher.id_publisher =%s',
-            'search_text': "game.game_name LIKE %s "
-        }
-
-        query_filter_list = []
-
-        for key, value in kwargs.items():
-            query_filter_list.append(filter_mapping[key])
-            if key == 'search_text':
-                query_filter_args.append(f'%{value}%')
-            else:
-                query_filter_args.append(value)
-
+    query_filter_list, _ = _games_filter(dict.fromkeys(filter_keys, ''))
+    if query_filter_list:
         query += '\nWHERE ' + '\nAND '.join(query_filter_list)
 
-    order_by_mapping = {'id_game': 'game.id_game',
-                        'rating': 'game.rating',
-                        'release_date': 'game.release_date'}
+    query += f'\nORDER BY {games_order_sql(order_by, order_direction)}'
 
-    query += f'\nORDER BY {order_by_mapping[order_by]} {order_direction.upper()}'
+    # One prepared statement per query shape; the shape is fully described
+    # by the ordering and the filter names.
+    shape = hashlib.md5(query.encode('utf-8')).hexdigest()[:12]
+    return statements.register(f'get_all_games_{shape}', query).name
 
-    try:
-        with connection.cursor() as cursor:
-            if query_filter_args:
-                print(query)
-                cursor.execute(query, query_filter_args)
-            else:
-                cursor.execute(query)
+
+@labelled
+def _get_all_games(order_by, order_direction, **kwargs):
+    statement = _all_games_statement(order_by, order_direction,
+                                     tuple(kwargs))
+    _, query_filter_args = _games_filter(kwargs)
+
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.Game.cursor) as cursor:
+            statements.execute(cursor, statement, query_filter_args)
             games = cursor.fetchall()
 
         if len(games) == 0:
             return None
 
-        column_names = ['id_game', 'game_name', 'description', 'release_date',
-                        'rating', 'developer', 'publisher']
-        games_dict = []
+        return games
 
-        for game in games:
-            temp_dict = {}
-            for key, value in zip(column_names, game):
-                temp_dict[key] = value
-            games_dict.append(temp_dict)
 
-        return games_dict
-    finally:
-        connection.close()
+@dataclass
+class GamesPage:
+    games: list
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
+    page: int | None = None
+    page_size: int = GAMES_PAGE_SIZE
+    total: int | None = None
 
 
-def get_game(game_id):
-    connection = get_connection()
-    query = '''SELECT game.id_game, game.game_name, game.description, 
+def encode_games_cursor(direction, order_by, game):
+    key_value = game[order_by]
+    if isinstance(key_value, (datetime.date, decimal.Decimal)):
+        key_value = str(key_value)
+
+    payload = json.dumps([direction, order_by, key_value, game['id_game']])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_games_cursor(cursor, order_by):
+    try:
+        payload = base64.urlsafe_b64decode(cursor.encode('ascii'))
+        direction, cursor_order_by, key_value, id_game = json.loads(payload)
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError('Invalid games cursor')
+
+    if direction not in ('next', 'prev') or cursor_order_by != order_by:
+        raise ValueError('Cursor does not match the requested ordering')
+
+    return direction, key_value, int(id_game)
+
+
+def get_games_page(
+        order_by: Literal['id_game', 'rating', 'release_date',
+                          'avg_rating', 'popularity'] = 'id_game',
+        order_direction: Literal['asc', 'desc'] = 'asc',
+        cursor=None,
+        page=None,
+        page_size=GAMES_PAGE_SIZE,
+        with_total=False,
+        **kwargs
+):
+    # Raises ValueError for unknown values, which the views answer with 400.
+    games_order_sql(order_by, order_direction)
+
+    cache_key = listing_cache_key(
+        'get_games_page', order_by=order_by, order_direction=order_direction,
+        cursor=cursor, page=page, page_size=page_size, with_total=with_total,
+        **kwargs
+    )
+    return listing_cache.get_or_load(
+        cache_key,
+        lambda: _get_games_page(order_by, order_direction, cursor, page,
+                                page_size, with_total, **kwargs)
+    )
+
+
+GAMES_PAGE_COLUMNS = '''game.id_game, game.game_name, game.description,
+    game.release_date, game.rating, developer.studio_name,
+    publisher.publisher_name, game_stats.avg_rating, game_stats.list_count'''
+GAMES_PAGE_FROM = '''FROM game
+    LEFT JOIN developer
+    ON game.id_developer = developer.id_developer
+    LEFT JOIN publisher
+    ON game.id_publisher = publisher.id_publisher
+    LEFT JOIN game_stats
+    ON game.id_game = game_stats.id_game'''
+
+
+def games_page_query(order_by, order_direction, filters=None, segment='keys',
+                     after=None, backwards=False, limit=GAMES_PAGE_SIZE + 1,
+                     offset=0, count=False):
+    # One segment of a games listing. Games with a sort key ('keys') come
+    # before the games without one ('nulls') in either direction. Each
+    # segment is read on its own, so the keyset predicate is a plain range
+    # and the ORDER BY matches a scan of the (column, id_game) index.
+    order_sql = games_order_sql(order_by, order_direction)
+    order_column = GAMES_ORDER_BY[order_by]
+    if segment not in ('keys', 'nulls'):
+        raise ValueError(f'Unknown games segment: {segment}')
+
+    descending = (order_direction == 'desc') != backwards
+    sort_direction = 'DESC' if descending else 'ASC'
+    operator = '<' if descending else '>'
+
+    query_filter_list, query_filter_args = _games_filter(filters or {})
+
+    if order_by == 'id_game':
+        sort_columns = ['game.id_game']
+    elif segment == 'keys':
+        # game_stats columns are tie-broken on game_stats.id_game so the row
+        # comparison stays within one index; the rows hold a stats row here.
+        sort_columns = [order_column,
+                        order_column.split('.')[0] + '.id_game']
+        query_filter_list.append(f'{order_column} IS NOT NULL')
+    else:
+        sort_columns = ['game.id_game']
+        query_filter_list.append(f'{order_column} IS NULL')
+
+    if after is not None:
+        if len(sort_columns) == 1:
+            query_filter_list.append(f'{sort_columns[0]} {operator} %s')
+        else:
+            query_filter_list.append(
+                f'({", ".join(sort_columns)}) {operator} (%s, %s)'
+            )
+        query_filter_args.extend(after)
+
+    columns = 'count(*)' if count else GAMES_PAGE_COLUMNS
+    query = f'SELECT {columns}\n{GAMES_PAGE_FROM}'
+    if query_filter_list:
+        query += '\nWHERE ' + '\nAND '.join(query_filter_list)
+    if count:
+        return query, query_filter_args
+
+    query += '\nORDER BY ' + ', '.join(f'{column} {sort_direction}'
+                                       for column in sort_columns)
+    query += '\nLIMIT %s OFFSET %s'
+    query_filter_args.extend([limit, offset])
+    return query, query_filter_args
+
+
+def _games_page_segments(order_by, direction, key_value, id_game):
+    # (segment, after) pairs to read in order, starting at the cursor.
+    if order_by == 'id_game':
+        return [('keys', None if id_game is None else (id_game,))]
+
+    if id_game is None:
+        return [('keys', None), ('nulls', None)]
+    if key_value is None and direction == 'next':
+        return [('nulls', (id_game,))]
+    if key_value is None:
+        return [('nulls', (id_game,)), ('keys', None)]
+    if direction == 'next':
+        return [('keys', (key_value, id_game)), ('nulls', None)]
+    return [('keys', (key_value, id_game))]
+
+
+@labelled
+def _get_games_page(order_by, order_direction, cursor, page, page_size,
+                    with_total, **kwargs):
+    direction, key_value, id_game = 'next', None, None
+    offset = 0
+    if cursor:
+        direction, key_value, id_game = decode_games_cursor(cursor, order_by)
+        page = None
+    elif page is not None:
+        page = max(int(page), 1)
+        offset = (page - 1) * page_size
+
+    segments = _games_page_segments(order_by, direction, key_value, id_game)
+    backwards = direction == 'prev'
+    has_prev = cursor is not None or offset > 0
+
+    games = []
+    total = None
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.Game.cursor) as db_cursor:
+            for segment, after in segments:
+                needed = page_size + 1 - len(games)
+                query, args = games_page_query(
+                    order_by, order_direction, kwargs, segment, after,
+                    backwards, limit=needed, offset=offset
+                )
+                db_cursor.execute(query, args)
+                found = db_cursor.fetchall()
+                games.extend(found)
+                if len(games) > page_size:
+                    break
+
+                # The next segment starts where this one ran out; the offset
+                # left over is what this segment could not absorb.
+                if found or not offset:
+                    offset = 0
+                    continue
+                query, args = games_page_query(
+                    order_by, order_direction, kwargs, segment, after,
+                    count=True
+                )
+                db_cursor.execute(query, args)
+                offset -= db_cursor.fetchone()[0]
+
+        if with_total:
+            count_query = '''SELECT count(*) FROM game
+            LEFT JOIN developer ON game.id_developer = developer.id_developer
+            LEFT JOIN publisher ON game.id_publisher = publisher.id_publisher'''
+            query_filter_list, count_args = _games_filter(kwargs)
+            if query_filter_list:
+                count_query += '\nWHERE ' + '\nAND '.join(query_filter_list)
+            with connection.cursor() as db_cursor:
+                db_cursor.execute(count_query, count_args)
+                total = db_cursor.fetchone()[0]
+
+    has_more = len(games) > page_size
+    games = games[:page_size]
+    if backwards:
+        games.reverse()
+
+    if backwards:
+        has_next, has_prev = True, has_more
+    else:
+        has_next = has_more
+
+    games_page = GamesPage(
+        games=games, page=page, page_size=page_size, total=total
+    )
+    if games and has_next:
+        games_page.next_cursor = encode_games_cursor(
+            'next', order_by, games[-1]
+        )
+    if games and has_prev:
+        games_page.prev_cursor = encode_games_cursor(
+            'prev', order_by, games[0]
+        )
+
+    return games_page
+
+
+def search_games(search_text, limit=GAMES_PAGE_SIZE, **kwargs):
+    kwargs.pop('order_by', None)
+    kwargs.pop('order_direction', None)
+
+    cache_key = listing_cache_key(
+        'search_games', search_text=search_text, limit=limit, **kwargs
+    )
+    return listing_cache.get_or_load(
+        cache_key, lambda: _search_games(search_text, limit, **kwargs)
+    )
+
+
+def search_games_query(search_text, limit=GAMES_PAGE_SIZE, filters=None):
+    query = f'''SELECT {GAMES_PAGE_COLUMNS},
+    ts_rank({GAME_SEARCH_VECTOR}, to_tsquery('simple', %s))
+    + word_similarity(%s, game.game_name) AS search_rank
+    {GAMES_PAGE_FROM}'''
+
+    filters = dict(filters or {}, search_text=search_text)
+    query_filter_list, query_filter_args = _games_filter(filters)
+    query += '\nWHERE ' + '\nAND '.join(query_filter_list)
+    query += '\nORDER BY search_rank DESC, game.id_game\nLIMIT %s'
+
+    return query, ([to_search_query(search_text), search_text]
+                   + query_filter_args + [limit])
+
+
+@labelled
+def _search_games(search_text, limit, **kwargs):
+    query, args = search_games_query(search_text, limit, kwargs)
+
+    with connection_scope() as connection:
+        with connection.cursor(
+                cursor_factory=rows.GameSearchResult.cursor
+        ) as cursor:
+            cursor.execute(query, args)
+            return cursor.fetchall()
+
+
+statements.register(
+    'get_game',
+    '''SELECT game.id_game, game.game_name, game.description, 
     game.release_date, game.rating, 
     developer.studio_name, 
     publisher.publisher_name
@@ -107,21 +768,296 @@ def get_game(game_id):
     LEFT JOIN publisher 
     ON game.id_publisher = publisher.id_publisher
     WHERE game.id_game = %s'''
+)
 
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(query, (game_id,))
+
+@labelled
+def get_game(game_id):
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.Game.cursor) as cursor:
+            statements.execute(cursor, 'get_game', (game_id,))
             game = cursor.fetchone()
 
-        column_names = ['id_game', 'game_name', 'description', 'release_date',
-                        'rating', 'developer', 'publisher']
-        game_dict = dict(zip(column_names, game))
+        return game
+
+
+statements.register(
+    'get_games_by_ids',
+    '''SELECT game.id_game, game.game_name, game.description, 
+    game.release_date, game.rating, developer.studio_name, 
+    publisher.publisher_name, game_stats.avg_rating, game_stats.list_count 
+    FROM game 
+    LEFT JOIN developer 
+    ON game.id_developer = developer.id_developer 
+    LEFT JOIN publisher 
+    ON game.id_publisher = publisher.id_publisher
+    LEFT JOIN game_stats 
+    ON game.id_game = game_stats.id_game
+    WHERE game.id_game = ANY(%s::integer[])'''
+)
+
+
+@labelled
+def get_games_by_ids(ids):
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.Game.cursor) as cursor:
+            statements.execute(cursor, 'get_games_by_ids',
+                               ([int(id_game) for id_game in ids],))
+            return cursor.fetchall()
+
+
+statements.register(
+    'get_game_detail',
+    '''SELECT game.id_game, game.game_name, game.description, 
+    game.release_date, game.rating, 
+    developer.studio_name, 
+    publisher.publisher_name,
+    game_stats.avg_rating, game_stats.list_count, game_stats.rating_count,
+    (SELECT coalesce(json_agg(json_build_object(
+        'id_game', genre_of_game.id_game,
+        'id_genre', genre_of_game.id_genre,
+        'game_name', game.game_name,
+        'genre_name', genre.genre_name
+     )), '[]')
+     FROM genre_of_game
+     JOIN genre ON genre_of_game.id_genre = genre.id_genre
+     WHERE genre_of_game.id_game = game.id_game) AS genres,
+    (SELECT coalesce(json_agg(json_build_object(
+        'id_game', comment.id_game,
+        'id_user', comment.id_user,
+        'text', comment.text,
+        'game_name', game.game_name,
+        'username', users.username
+     )), '[]')
+     FROM comment
+     JOIN users ON comment.id_user = users.id_user
+     WHERE comment.id_game = game.id_game) AS comments,
+    (SELECT json_build_object(
+        'id_game', list.id_game,
+        'id_user', list.id_user,
+        'list_type', list.list_type,
+        'rated', list.rated::integer,
+        'game_name', game.game_name,
+        'username', users.username
+     )
+     FROM list
+     JOIN users ON list.id_user = users.id_user
+     WHERE list.id_game = game.id_game AND list.id_user = %s) AS user_list
+    FROM game 
+    LEFT JOIN developer 
+    ON game.id_developer = developer.id_developer 
+    LEFT JOIN publisher 
+    ON game.id_publisher = publisher.id_publisher
+    LEFT JOIN game_stats 
+    ON game.id_game = game_stats.id_game
+    WHERE game.id_game = %s'''
+)
+
+
+@labelled
+def get_game_detail(id_game, id_user=None):
+    with connection_scope() as connection:
+        with connection.cursor() as cursor:
+            statements.execute(cursor, 'get_game_detail', (id_user, id_game))
+            row = cursor.fetchone()
+
+    if row is None:
+        return None
+
+    genres, comments, user_list = row[10:]
+
+    return {
+        'game': rows.GameDetail._make(row[:10]),
+        'genres': genres,
+        'comments': comments,
+        'user_list': user_list,
+    }
+
+
+GAME_STATS_REFRESH_QUERY = '''INSERT INTO game_stats (id_game, rating_sum, 
+rating_count, planned_count, playing_count, postponed_count, completed_count, 
+comment_count)
+SELECT game.id_game, coalesce(lists.rating_sum, 0), 
+coalesce(lists.rating_count, 0), coalesce(lists.planned_count, 0), 
+coalesce(lists.playing_count, 0), coalesce(lists.postponed_count, 0), 
+coalesce(lists.completed_count, 0), coalesce(comments.comment_count, 0)
+FROM game
+LEFT JOIN (
+    SELECT id_game, sum(rated) AS rating_sum, count(rated) AS rating_count,
+    count(*) FILTER (WHERE list_type = 'planned') AS planned_count,
+    count(*) FILTER (WHERE list_type = 'playing') AS playing_count,
+    count(*) FILTER (WHERE list_type = 'postponed') AS postponed_count,
+    count(*) FILTER (WHERE list_type = 'completed') AS completed_count
+    FROM list GROUP BY id_game
+) AS lists ON game.id_game = lists.id_game
+LEFT JOIN (
+    SELECT id_game, count(*) AS comment_count FROM comment GROUP BY id_game
+) AS comments ON game.id_game = comments.id_game
+ON CONFLICT (id_game) DO UPDATE SET rating_sum = excluded.rating_sum,
+rating_count = excluded.rating_count, planned_count = excluded.planned_count,
+playing_count = excluded.playing_count, 
+postponed_count = excluded.postponed_count,
+completed_count = excluded.completed_count, 
+comment_count = excluded.comment_count'''
+
+
+GAME_STATS_DELTA_QUERY = '''INSERT INTO game_stats (id_game, rating_sum, 
+rating_count, planned_count, playing_count, postponed_count, completed_count, 
+comment_count)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+ON CONFLICT (id_game) DO UPDATE SET 
+rating_sum = game_stats.rating_sum + excluded.rating_sum,
+rating_count = game_stats.rating_count + excluded.rating_count,
+planned_count = game_stats.planned_count + excluded.planned_count,
+playing_count = game_stats.playing_count + excluded.playing_count,
+postponed_count = game_stats.postponed_count + excluded.postponed_count,
+completed_count = game_stats.completed_count + excluded.completed_count,
+comment_count = game_stats.comment_count + excluded.comment_count'''
+
+GAME_STATS_REMOVE_USER_QUERY = '''WITH removed AS (
+    SELECT id_game, sum(rated) AS rating_sum, count(rated) AS rating_count,
+    count(*) FILTER (WHERE list_type = 'planned') AS planned_count,
+    count(*) FILTER (WHERE list_type = 'playing') AS playing_count,
+    count(*) FILTER (WHERE list_type = 'postponed') AS postponed_count,
+    count(*) FILTER (WHERE list_type = 'completed') AS completed_count,
+    0 AS comment_count
+    FROM list WHERE id_user = %s GROUP BY id_game
+    UNION ALL
+    SELECT id_game, 0, 0, 0, 0, 0, 0, count(*)
+    FROM comment WHERE id_user = %s GROUP BY id_game
+), totals AS (
+    SELECT id_game, coalesce(sum(rating_sum), 0) AS rating_sum,
+    sum(rating_count) AS rating_count, sum(planned_count) AS planned_count,
+    sum(playing_count) AS playing_count,
+    sum(postponed_count) AS postponed_count,
+    sum(completed_count) AS completed_count,
+    sum(comment_count) AS comment_count
+    FROM removed GROUP BY id_game
+)
+UPDATE game_stats SET rating_sum = game_stats.rating_sum - totals.rating_sum,
+rating_count = game_stats.rating_count - totals.rating_count,
+planned_count = game_stats.planned_count - totals.planned_count,
+playing_count = game_stats.playing_count - totals.playing_count,
+postponed_count = game_stats.postponed_count - totals.postponed_count,
+completed_count = game_stats.completed_count - totals.completed_count,
+comment_count = game_stats.comment_count - totals.comment_count
+FROM totals WHERE game_stats.id_game = totals.id_game'''
+
+statements.register('apply_game_stats_delta', GAME_STATS_DELTA_QUERY)
+statements.register('remove_user_game_stats', GAME_STATS_REMOVE_USER_QUERY)
+
+
+@labelled
+def refresh_game_stats():
+    with connection_scope() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(GAME_STATS_REFRESH_QUERY)
+
+    invalidate_listing_cache()
+    touch_entities('games')
+
 
-        return game_dict
+def _game_stats_delta(list_type=None, rated=None, comments=0, sign=1):
+    delta = {'rating_sum': 0, 'rating_count': 0, 'comment_count': sign * comments}
+    for known_list_type in LIST_TYPES:
+        delta[f'{known_list_type}_count'] = 0
+
+    if list_type in LIST_TYPES:
+        delta[f'{list_type}_count'] = sign
+    if rated is not None:
+        delta['rating_sum'] = sign * decimal.Decimal(rated)
+        delta['rating_count'] = sign
+
+    return delta
+
+
+def game_stats_delta_args(id_game, *deltas):
+    total = {}
+    for delta in deltas:
+        for key, value in delta.items():
+            total[key] = total.get(key, 0) + value
+
+    if not any(total.values()):
+        return None
+
+    return (id_game, total['rating_sum'], total['rating_count'],
+            total['planned_count'], total['playing_count'],
+            total['postponed_count'], total['completed_count'],
+            total['comment_count'])
+
+
+def _apply_game_stats_delta(cursor, id_game, *deltas):
+    args = game_stats_delta_args(id_game, *deltas)
+    if args is not None:
+        statements.execute(cursor, 'apply_game_stats_delta', args)
+
+
+def refresh_leaderboards():
+    connection = get_connection()
+
+    try:
+        # REFRESH ... CONCURRENTLY cannot run inside a transaction block.
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'REFRESH MATERIALIZED VIEW CONCURRENTLY game_leaderboard'
+            )
     finally:
-        connection.close()
+        connection.autocommit = False
+        release_connection(connection)
 
 
+statements.register(
+    'get_leaderboard',
+    '''SELECT game_leaderboard.rank, game_leaderboard.score, 
+    game.id_game, game.game_name, developer.studio_name, 
+    publisher.publisher_name
+    FROM game_leaderboard
+    JOIN game ON game_leaderboard.id_game = game.id_game
+    LEFT JOIN developer 
+    ON game.id_developer = developer.id_developer 
+    LEFT JOIN publisher 
+    ON game.id_publisher = publisher.id_publisher
+    WHERE game_leaderboard.board = %s AND game_leaderboard.scope = %s 
+    AND game_leaderboard.scope_id = %s AND game_leaderboard.rank <= %s
+    ORDER BY game_leaderboard.rank'''
+)
+
+
+@labelled
+def get_leaderboard(board, scope='all', scope_id=None, limit=10):
+    if board not in LEADERBOARDS or scope not in LEADERBOARD_SCOPES:
+        raise ValueError('Unknown leaderboard')
+
+    if scope == 'all':
+        scope_id = 0
+    elif scope_id is None:
+        raise ValueError('Scoped leaderboards need a scope_id')
+
+    limit = min(int(limit), LEADERBOARD_DEPTH)
+
+    with connection_scope() as connection:
+        with connection.cursor(
+                cursor_factory=rows.LeaderboardEntry.cursor
+        ) as cursor:
+            statements.execute(cursor, 'get_leaderboard',
+                               (board, scope, int(scope_id), limit))
+            return cursor.fetchall()
+
+
+statements.register(
+    'add_game',
+    '''WITH new_game AS (
+        INSERT INTO game (game_name, description, release_date, 
+        rating, id_developer, id_publisher)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING id_game
+    )
+    INSERT INTO game_stats (id_game) SELECT id_game FROM new_game'''
+)
+
+
+@labelled
 def add_game(
         game_name,
         description,
@@ -130,27 +1066,31 @@ def add_game(
         rating=0,
         id_publisher=None
 ):
-    connection = get_connection()
-    query = '''INSERT INTO game (game_name, description, release_date, 
-    rating, id_developer, id_publisher)
-    VALUES (%s, %s, %s, %s, %s, %s)'''
-
     id_developer = int(id_developer)
     if id_publisher is not None:
         id_publisher = int(id_publisher)
 
-    try:
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(
-                query,
+            statements.execute(
+                cursor, 'add_game',
                 (game_name, description, release_date,
                  rating, id_developer, id_publisher)
             )
-        connection.commit()
-    finally:
-        connection.close()
 
+    invalidate_listing_cache()
+    touch_entities('games')
 
+
+statements.register(
+    'update_game',
+    '''UPDATE game SET game_name = %s, description = %s, 
+    release_date = %s, id_developer = %s, id_publisher = %s 
+    WHERE id_game = %s'''
+)
+
+
+@labelled
 def update_game(
         id_game,
         game_name,
@@ -159,114 +1099,137 @@ def update_game(
         id_publisher,
         id_developer
 ):
-    connection = get_connection()
-    query = '''UPDATE game SET game_name = %s, description = %s, 
-    release_date = %s, id_developer = %s, id_publisher = %s 
-    WHERE id_game = %s'''
-
-    try:
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (game_name, description, release_date,
-                                   id_developer, id_publisher, id_game))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'update_game',
+                               (game_name, description, release_date,
+                                id_developer, id_publisher, id_game))
 
+    invalidate_listing_cache()
+    mark_leaderboards_stale()
+    touch_entities('games', f'game:{id_game}')
 
-def delete_game(id_game):
-    connection = get_connection()
-    query = "DELETE FROM game WHERE id_game = %s"
 
-    try:
+statements.register(
+    'delete_game',
+    "DELETE FROM game WHERE id_game = %s"
+)
+
+
+@labelled
+def delete_game(id_game):
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (id_game,))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'delete_game', (id_game,))
 
+    invalidate_listing_cache()
+    mark_leaderboards_stale()
+    touch_entities('games', f'game:{id_game}')
 
-def get_all_users():
-    connection = get_connection()
-    query = '''SELECT id_user, username, password, email 
+
+statements.register(
+    'get_all_users',
+    '''SELECT id_user, username, password, email 
     FROM users 
     ORDER BY id_user'''
+)
 
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(query)
+
+@labelled
+def get_all_users():
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.User.cursor) as cursor:
+            statements.execute(cursor, 'get_all_users')
             users = cursor.fetchall()
 
-        column_names = ['id_user', 'username', 'password', 'email']
-        users_dict = []
+        return users
 
-        for user in users:
-            temp_dict = {}
-            for key, value in zip(column_names, user):
-                temp_dict[key] = value
-            users_dict.append(temp_dict)
 
-        return users_dict
-    finally:
-        connection.close()
+statements.register(
+    'get_user',
+    '''SELECT id_user, username, password, email FROM users 
+    WHERE id_user = %s'''
+)
 
 
+@labelled
 def get_user(id_user):
-    connection = get_connection()
-    query = '''SELECT id_user, username, password, email FROM users 
-    WHERE id_user = %s'''
-
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(query, (id_user,))
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.User.cursor) as cursor:
+            statements.execute(cursor, 'get_user', (id_user,))
             user = cursor.fetchone()
 
-        column_names = ['id_user', 'username', 'password', 'email']
-        user_dict = dict(zip(column_names, user))
-        return user_dict
-    finally:
-        connection.close()
+        return user
 
 
-def validate_user(username, password):
-    connection = get_connection()
-    password_hash = hashlib.sha256(password.encode('utf-8')).hexdigest().upper()
-    query = '''SELECT id_user, username, password, email
+statements.register(
+    'validate_user',
+    '''SELECT id_user, username, password, email
     FROM users 
     WHERE username = %s'''
+)
 
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(query, (username,))
+
+def _hash_password(password):
+    release_unit_of_work()
+    return passwords.hash_password(password)
+
+
+statements.register(
+    'rehash_user_password',
+    "UPDATE users SET password = %s WHERE id_user = %s AND password = %s"
+)
+
+
+@labelled
+def validate_user(username, password):
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.User.cursor) as cursor:
+            statements.execute(cursor, 'validate_user', (username,))
             user = cursor.fetchone()
 
-        if user is None or password_hash != user[2]:
-            return None
+    if user is None:
+        return None
 
-        column_names = ['id_user', 'username', 'password', 'email']
-        user_dict = dict(zip(column_names, user))
+    # The KDF check is slow on purpose; the request's connection must not sit
+    # idle in transaction while it runs.
+    release_unit_of_work()
 
-        return user_dict
-    finally:
-        connection.close()
+    verified, new_hash = passwords.verify_password(password, user.password)
+    if not verified:
+        return None
+
+    if new_hash is not None:
+        # Only replaces the hash that was verified, in case the password
+        # changed in the meantime.
+        with connection_scope() as connection:
+            with connection.cursor() as cursor:
+                statements.execute(cursor, 'rehash_user_password',
+                                   (new_hash, user.id_user, user.password))
+        release_unit_of_work()
+        user = user._replace(password=new_hash)
+
+    return user
 
 
+statements.register(
+    'add_user',
+    "INSERT INTO users (username, password, email) VALUES (%s, %s, %s)"
+)
+
+
+@labelled
 def add_user(username, password, email):
-    connection = get_connection()
-    password_hash = hashlib.sha256(password.encode('utf-8')).hexdigest().upper()
-    query = "INSERT INTO users (username, password, email) VALUES (%s, %s, %s)"
+    password_hash = _hash_password(password)
 
-    try:
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query,
-                           (username, password_hash, email)
-                           )
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'add_user',
+                               (username, password_hash, email))
 
 
+@labelled
 def update_user(id_user, username=None, password=None, email=None):
-    connection = get_connection()
 
     to_update_list = []
     to_update_args = []
@@ -278,533 +1241,609 @@ def update_user(id_user, username=None, password=None, email=None):
         to_update_args.append(username)
     if password is not None:
         to_update_list.append('password=%s')
-        password_hash = (hashlib.sha256(password.encode('utf-8'))
-                         .hexdigest().upper())
-        to_update_args.append(password_hash)
+        to_update_args.append(_hash_password(password))
     if email is not None:
         to_update_list.append('email=%s')
         to_update_args.append(email)
 
     if not to_update_list:
-        connection.close()
         return
 
     query += ', '.join(to_update_list)
     query += ' WHERE id_user = %s'
     to_update_args.append(id_user)
 
-    try:
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
             cursor.execute(query, tuple(to_update_args))
-        connection.commit()
-    finally:
-        connection.close()
 
+    touch_entities('users')
 
-def delete_user(id_user):
-    connection = get_connection()
-    query = "DELETE FROM users WHERE id_user = %s"
 
-    try:
+statements.register(
+    'delete_user',
+    "DELETE FROM users WHERE id_user = %s"
+)
+
+
+@labelled
+def delete_user(id_user):
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (id_user,))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'remove_user_game_stats',
+                               (id_user, id_user))
+            statements.execute(cursor, 'delete_user', (id_user,))
 
+    invalidate_listing_cache()
+    mark_leaderboards_stale()
+    touch_entities('users', 'games')
 
-def get_all_developers():
-    connection = get_connection()
-    query = "SELECT id_developer, studio_name, country FROM developer ORDER BY id_developer"
 
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(query)
-            developers = cursor.fetchall()
+statements.register(
+    'get_all_developers',
+    "SELECT id_developer, studio_name, country FROM developer ORDER BY id_developer"
+)
 
-        column_names = ['id_developer', 'studio_name', 'country']
-        developers_dict = []
 
-        for developer in developers:
-            temp_dict = {}
-            for key, value in zip(column_names, developer):
-                temp_dict[key] = value
-            developers_dict.append(temp_dict)
+@reference_cache.cached('developers')
+@labelled
+def get_all_developers():
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.Developer.cursor) as cursor:
+            statements.execute(cursor, 'get_all_developers')
+            developers = cursor.fetchall()
 
-        return developers_dict
-    finally:
-        connection.close()
+        return developers
 
 
-def get_developer(id_developer):
-    connection = get_connection()
-    query = '''SELECT id_developer, studio_name, country
+statements.register(
+    'get_developer',
+    '''SELECT id_developer, studio_name, country
     FROM developer
     WHERE id_developer = %s'''
+)
 
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(query, (id_developer,))
+
+@labelled
+def get_developer(id_developer):
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.Developer.cursor) as cursor:
+            statements.execute(cursor, 'get_developer', (id_developer,))
             developer = cursor.fetchone()
 
-        column_names = ['id_developer', 'studio_name', 'country']
-        developer_dict = dict(zip(column_names, developer))
+        return developer
 
-        return developer_dict
-    finally:
-        connection.close()
 
+statements.register(
+    'add_developer',
+    '''INSERT INTO developer (studio_name, country) VALUES (%s, %s)'''
+)
 
-def add_developer(studio_name, country=None):
-    connection = get_connection()
-    query = '''INSERT INTO developer (studio_name, country) VALUES (%s, %s)'''
 
-    try:
+@labelled
+def add_developer(studio_name, country=None):
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (studio_name, country))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'add_developer', (studio_name, country))
 
+    invalidate_reference_cache('developers')
+    invalidate_listing_cache()
+    touch_entities('developers')
 
-def update_developer(id_developer, studio_name, country=None):
-    connection = get_connection()
-    query = '''UPDATE developer SET studio_name = %s, country = %s 
+
+statements.register(
+    'update_developer',
+    '''UPDATE developer SET studio_name = %s, country = %s 
     WHERE id_developer = %s'''
+)
 
-    try:
+
+@labelled
+def update_developer(id_developer, studio_name, country=None):
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (studio_name, country, id_developer))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'update_developer',
+                               (studio_name, country, id_developer))
 
+    invalidate_reference_cache('developers')
+    invalidate_listing_cache()
+    touch_entities('developers', f'developer:{id_developer}')
 
-def delete_developer(id_developer):
-    connection = get_connection()
-    query = "DELETE FROM developer WHERE id_developer = %s"
 
-    try:
+statements.register(
+    'delete_developer',
+    "DELETE FROM developer WHERE id_developer = %s"
+)
+
+
+@labelled
+def delete_developer(id_developer):
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (id_developer,))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'delete_developer', (id_developer,))
 
+    invalidate_reference_cache('developers')
+    invalidate_listing_cache()
+    touch_entities('developers', f'developer:{id_developer}')
 
-def get_all_publishers():
-    connection = get_connection()
-    query = '''SELECT id_publisher, publisher_name, country
-    FROM publisher'''
 
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(query)
-            publishers = cursor.fetchall()
+statements.register(
+    'get_all_publishers',
+    '''SELECT id_publisher, publisher_name, country
+    FROM publisher'''
+)
 
-        column_names = ['id_publisher', 'publisher_name', 'country']
-        publishers_dict = []
 
-        for publisher in publishers:
-            temp_dict = {}
-            for key, value in zip(column_names, publisher):
-                temp_dict[key] = value
-            publishers_dict.append(temp_dict)
+@reference_cache.cached('publishers')
+@labelled
+def get_all_publishers():
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.Publisher.cursor) as cursor:
+            statements.execute(cursor, 'get_all_publishers')
+            publishers = cursor.fetchall()
 
-        return publishers_dict
-    finally:
-        connection.close()
+        return publishers
 
 
-def get_publisher(id_publisher):
-    connection = get_connection()
-    query = '''SELECT id_publisher, publisher_name, country
+statements.register(
+    'get_publisher',
+    '''SELECT id_publisher, publisher_name, country
     FROM publisher
     WHERE id_publisher = %s'''
+)
 
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(query, (id_publisher,))
+
+@labelled
+def get_publisher(id_publisher):
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.Publisher.cursor) as cursor:
+            statements.execute(cursor, 'get_publisher', (id_publisher,))
             publisher = cursor.fetchone()
-        column_names = ['id_publisher', 'publisher_name', 'country']
-        publisher_dict = dict(zip(column_names, publisher))
 
-        return publisher_dict
-    finally:
-        connection.close()
+        return publisher
 
 
-def add_publisher(publisher_name, country=None):
-    connection = get_connection()
-    query = "INSERT INTO publisher (publisher_name, country) VALUES (%s, %s)"
+statements.register(
+    'add_publisher',
+    "INSERT INTO publisher (publisher_name, country) VALUES (%s, %s)"
+)
 
-    try:
+
+@labelled
+def add_publisher(publisher_name, country=None):
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (publisher_name, country))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'add_publisher', (publisher_name, country))
 
+    invalidate_reference_cache('publishers')
+    invalidate_listing_cache()
+    touch_entities('publishers')
 
-def update_publisher(id_publisher, publisher_name, country=None):
-    connection = get_connection()
-    query = '''UPDATE publisher SET publisher_name = %s, country = %s
+
+statements.register(
+    'update_publisher',
+    '''UPDATE publisher SET publisher_name = %s, country = %s
     WHERE id_publisher = %s'''
+)
 
-    try:
+
+@labelled
+def update_publisher(id_publisher, publisher_name, country=None):
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (publisher_name, country, id_publisher))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'update_publisher',
+                               (publisher_name, country, id_publisher))
 
+    invalidate_reference_cache('publishers')
+    invalidate_listing_cache()
+    touch_entities('publishers', f'publisher:{id_publisher}')
 
-def delete_publisher(id_publisher):
-    connection = get_connection()
-    query = "DELETE FROM publisher WHERE id_publisher = %s"
 
-    try:
+statements.register(
+    'delete_publisher',
+    "DELETE FROM publisher WHERE id_publisher = %s"
+)
+
+
+@labelled
+def delete_publisher(id_publisher):
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (id_publisher,))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'delete_publisher', (id_publisher,))
 
+    invalidate_reference_cache('publishers')
+    invalidate_listing_cache()
+    touch_entities('publishers', f'publisher:{id_publisher}')
 
-def get_comments(id_game=None, id_user=None):
-    connection = get_connection()
-    query = '''SELECT comment.id_game, comment.id_user, comment.text, 
+
+statements.register_filtered(
+    'get_comments',
+    '''SELECT comment.id_game, comment.id_user, comment.text, 
     game.game_name, users.username
     FROM comment
     JOIN game ON comment.id_game = game.id_game
-    JOIN users ON comment.id_user = users.id_user'''
-
-    filter_list = []
-    filter_args = []
-
-    if id_game is not None:
-        filter_list.append('comment.id_game=%s')
-        filter_args.append(id_game)
+    JOIN users ON comment.id_user = users.id_user''',
+    {'id_game': 'comment.id_game', 'id_user': 'comment.id_user'}
+)
 
-    if id_user is not None:
-        filter_list.append('comment.id_user=%s')
-        filter_args.append(id_user)
 
-    if filter_list:
-        query += ' WHERE ' + ' AND '.join(filter_list)
+@labelled
+def get_comments(id_game=None, id_user=None):
+    statement, args = statements.filtered('get_comments', id_game=id_game,
+                                          id_user=id_user)
 
-    try:
-        with connection.cursor() as cursor:
-            if filter_list:
-                cursor.execute(query, tuple(filter_args))
-            else:
-                cursor.execute(query)
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.Comment.cursor) as cursor:
+            statements.execute(cursor, statement, args)
             comments = cursor.fetchall()
 
-        column_names = ['id_game', 'id_user', 'text', 'game_name', 'username']
-        comments_dict = []
+        return comments
 
-        for comment in comments:
-            temp_dict = {}
-            for key, value in zip(column_names, comment):
-                temp_dict[key] = value
-            comments_dict.append(temp_dict)
 
-        return comments_dict
-    finally:
-        connection.close()
+statements.register(
+    'add_comment',
+    "INSERT INTO comment (id_game, id_user, text) VALUES (%s, %s, %s)"
+)
 
 
+@labelled
 def add_comment(id_game, id_user, comment):
-    connection = get_connection()
-    query = "INSERT INTO comment (id_game, id_user, text) VALUES (%s, %s, %s)"
-
-    try:
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (id_game, id_user, comment))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'add_comment', (id_game, id_user, comment))
+            _apply_game_stats_delta(cursor, id_game, _game_stats_delta(comments=1))
 
+    touch_entities(f'game:{id_game}')
 
-def update_comment(id_game, id_user, text):
-    connection = get_connection()
-    query = "UPDATE comment SET text = %s WHERE id_game = %s AND id_user = %s"
 
-    try:
+statements.register(
+    'update_comment',
+    "UPDATE comment SET text = %s WHERE id_game = %s AND id_user = %s"
+)
+
+
+@labelled
+def update_comment(id_game, id_user, text):
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (text, id_game, id_user))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'update_comment', (text, id_game, id_user))
 
+    touch_entities(f'game:{id_game}')
 
-def delete_comment(id_game, id_user):
-    connection = get_connection()
-    query = "DELETE FROM comment WHERE id_game = %s AND id_user = %s"
 
-    try:
+statements.register(
+    'delete_comment',
+    '''DELETE FROM comment WHERE id_game = %s AND id_user = %s 
+    RETURNING id_game'''
+)
+
+
+@labelled
+def delete_comment(id_game, id_user):
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (id_game, id_user))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'delete_comment', (id_game, id_user))
+            if cursor.fetchone() is not None:
+                _apply_game_stats_delta(
+                    cursor, id_game, _game_stats_delta(comments=1, sign=-1)
+                )
 
+    touch_entities(f'game:{id_game}')
 
-def get_all_genres():
-    connection = get_connection()
-    query = "SELECT id_genre, genre_name FROM genre"
 
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(query)
+statements.register(
+    'get_all_genres',
+    "SELECT id_genre, genre_name FROM genre"
+)
+
+
+@reference_cache.cached('genres')
+@labelled
+def get_all_genres():
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.Genre.cursor) as cursor:
+            statements.execute(cursor, 'get_all_genres')
             genres = cursor.fetchall()
 
-        column_names = ['id_genre', 'genre_name']
-        genres_dict = []
+        return genres
 
-        for genre in genres:
-            temp_dict = {}
-            for key, value in zip(column_names, genre):
-                temp_dict[key] = value
-            genres_dict.append(temp_dict)
 
-        return genres_dict
-    finally:
-        connection.close()
+statements.register(
+    'get_genre',
+    "SELECT id_genre, genre_name FROM genre WHERE id_genre = %s"
+)
 
 
+@labelled
 def get_genre(id_genre):
-    connection = get_connection()
-    query = "SELECT id_genre, genre_name FROM genre WHERE id_genre = %s"
-
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(query, (id_genre,))
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.Genre.cursor) as cursor:
+            statements.execute(cursor, 'get_genre', (id_genre,))
             genre = cursor.fetchone()
 
-        column_names = ['id_genre', 'genre_name']
-        genre_dict = dict(zip(column_names, genre))
+        return genre
 
-        return genre_dict
-    finally:
-        connection.close()
 
+statements.register(
+    'add_genre',
+    "INSERT INTO genre (genre_name) VALUES (%s)"
+)
 
-def add_genre(genre_name):
-    connection = get_connection()
-    query = "INSERT INTO genre (genre_name) VALUES (%s)"
 
-    try:
+@labelled
+def add_genre(genre_name):
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (genre_name,))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'add_genre', (genre_name,))
 
+    invalidate_reference_cache('genres')
+    touch_entities('genres')
 
-def update_genre(id_genre, genre_name):
-    connection = get_connection()
-    query = "UPDATE genre SET genre_name = %s WHERE id_genre = %s"
 
-    try:
+statements.register(
+    'update_genre',
+    "UPDATE genre SET genre_name = %s WHERE id_genre = %s"
+)
+
+
+@labelled
+def update_genre(id_genre, genre_name):
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (genre_name, id_genre))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'update_genre', (genre_name, id_genre))
 
+    invalidate_reference_cache('genres')
+    touch_entities('genres', f'genre:{id_genre}')
 
-def delete_genre(id_genre):
-    connection = get_connection()
-    query = "DELETE FROM genre WHERE id_genre = %s"
 
-    try:
+statements.register(
+    'delete_genre',
+    "DELETE FROM genre WHERE id_genre = %s"
+)
+
+
+@labelled
+def delete_genre(id_genre):
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (id_genre,))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'delete_genre', (id_genre,))
 
+    # The genre's genre_of_game rows go with it.
+    mark_leaderboards_stale()
+    invalidate_reference_cache('genres')
+    touch_entities('genres', f'genre:{id_genre}', 'game_genres')
 
-def validate_admin(login, password):
-    connection = get_connection()
-    password_hash = hashlib.sha256(password.encode('utf-8')).hexdigest().upper()
-    query = "SELECT id, login, password FROM admin WHERE login = %s"
 
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(query, (login, ))
+statements.register(
+    'validate_admin',
+    "SELECT id, login, password FROM admin WHERE login = %s"
+)
+
+
+statements.register(
+    'rehash_admin_password',
+    "UPDATE admin SET password = %s WHERE id = %s AND password = %s"
+)
+
+
+@labelled
+def validate_admin(login, password):
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.Admin.cursor) as cursor:
+            statements.execute(cursor, 'validate_admin', (login, ))
             admin = cursor.fetchone()
 
-        if admin is None or password_hash != admin[2]:
-            return None
+    if admin is None:
+        return None
 
-        column_names = ['id', 'login', 'password']
-        admin_dict = dict(zip(column_names, admin))
-        return admin_dict
-    finally:
-        connection.close()
+    # The KDF check is slow on purpose; the request's connection must not sit
+    # idle in transaction while it runs.
+    release_unit_of_work()
+
+    verified, new_hash = passwords.verify_password(password, admin.password)
+    if not verified:
+        return None
+
+    if new_hash is not None:
+        with connection_scope() as connection:
+            with connection.cursor() as cursor:
+                statements.execute(cursor, 'rehash_admin_password',
+                                   (new_hash, admin.id, admin.password))
+        release_unit_of_work()
+        admin = admin._replace(password=new_hash)
+
+    return admin
 
 
+statements.register(
+    'add_admin',
+    "INSERT INTO admin (login, password) VALUES (%s, %s)"
+)
+
+
+@labelled
 def add_admin(login, password):
-    connection = get_connection()
-    password_hash = hashlib.sha256(password.encode('utf-8')).hexdigest()
-    query = "INSERT INTO admin (login, password) VALUES (%s, %s)"
+    password_hash = _hash_password(password)
 
-    try:
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (login, password_hash))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'add_admin', (login, password_hash))
 
 
-def get_genre_of_game(id_game=None, id_genre=None):
-    connection = get_connection()
-    query = '''SELECT genre_of_game.id_game, genre_of_game.id_genre,
+statements.register_filtered(
+    'get_genre_of_game',
+    '''SELECT genre_of_game.id_game, genre_of_game.id_genre,
     game.game_name, genre.genre_name
     FROM genre_of_game
     JOIN genre ON genre_of_game.id_genre = genre.id_genre
-    JOIN game ON genre_of_game.id_game = game.id_game'''
+    JOIN game ON genre_of_game.id_game = game.id_game''',
+    {'id_game': 'genre_of_game.id_game', 'id_genre': 'genre_of_game.id_genre'}
+)
 
-    filter_list = []
-    filter_args = []
 
-    if id_game is not None:
-        filter_list.append('genre_of_game.id_game=%s')
-        filter_args.append(id_game)
-
-    if id_genre is not None:
-        filter_list.append('genre_of_game.id_genre=%s')
-        filter_args.append(id_genre)
-
-    if filter_list:
-        query += ' WHERE ' + ' AND '.join(filter_list)
+@labelled
+def get_genre_of_game(id_game=None, id_genre=None):
+    statement, args = statements.filtered('get_genre_of_game',
+                                          id_game=id_game, id_genre=id_genre)
 
-    try:
-        with connection.cursor() as cursor:
-            if filter_list:
-                cursor.execute(query, tuple(filter_args))
-            else:
-                cursor.execute(query)
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.GameGenre.cursor) as cursor:
+            statements.execute(cursor, statement, args)
             genres_of_games = cursor.fetchall()
 
-        column_names = ['id_game', 'id_genre', 'game_name', 'genre_name']
-        genres_of_games_dict = []
+        return genres_of_games
 
-        for genre_of_game in genres_of_games:
-            temp_dict = {}
-            for key, value in zip(column_names, genre_of_game):
-                temp_dict[key] = value
-            genres_of_games_dict.append(temp_dict)
 
-        return genres_of_games_dict
-    finally:
-        connection.close()
+statements.register(
+    'add_genre_of_game',
+    "INSERT INTO genre_of_game (id_game, id_genre) VALUES (%s, %s)"
+)
 
 
+@labelled
 def add_genre_of_game(id_game, id_genre):
-    connection = get_connection()
-    query = "INSERT INTO genre_of_game (id_game, id_genre) VALUES (%s, %s)"
-
-    try:
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (id_game, id_genre))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'add_genre_of_game', (id_game, id_genre))
+
+    touch_entities(f'game:{id_game}', 'game_genres')
 
 
+statements.register(
+    'delete_genre_of_game',
+    "DELETE FROM genre_of_game WHERE id_game = %s AND id_genre = %s"
+)
+
+
+@labelled
 def delete_genre_of_game(id_game, id_genre):
-    connection = get_connection()
-    query = "DELETE FROM genre_of_game WHERE id_game = %s AND id_genre = %s"
+    with connection_scope() as connection:
+        with connection.cursor() as cursor:
+            statements.execute(cursor, 'delete_genre_of_game', (id_game, id_genre))
 
-    try:
+    touch_entities(f'game:{id_game}', 'game_genres')
+
+
+@labelled
+def set_genres_of_game(id_game, id_genres):
+    query = '''DELETE FROM genre_of_game
+    WHERE id_game = %(id_game)s AND NOT (id_genre = ANY(%(id_genres)s::integer[]));
+    INSERT INTO genre_of_game (id_game, id_genre)
+    SELECT %(id_game)s, new_genre.id_genre
+    FROM unnest(%(id_genres)s::integer[]) AS new_genre(id_genre)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM genre_of_game
+        WHERE genre_of_game.id_game = %(id_game)s
+        AND genre_of_game.id_genre = new_genre.id_genre
+    )'''
+
+    id_genres = sorted({int(id_genre) for id_genre in id_genres})
+
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (id_game, id_genre))
-        connection.commit()
-    finally:
-        connection.close()
+            cursor.execute(query, {'id_game': id_game, 'id_genres': id_genres})
 
+    mark_leaderboards_stale()
+    touch_entities(f'game:{id_game}', 'game_genres')
 
-def get_list(id_game=None, id_user=None):
-    connection = get_connection()
-    query = '''SELECT list.id_game, list.id_user, list.list_type, list.rated, game.game_name, users.username
+
+statements.register_filtered(
+    'get_list',
+    '''SELECT list.id_game, list.id_user, list.list_type, list.rated::integer, game.game_name, users.username
     FROM list
     JOIN users ON list.id_user = users.id_user
-    JOIN game ON list.id_game = game.id_game'''
+    JOIN game ON list.id_game = game.id_game''',
+    {'id_game': 'list.id_game', 'id_user': 'list.id_user'}
+)
 
-    filter_list = []
-    filter_args = []
 
-    if id_game is not None:
-        filter_list.append("list.id_game = %s")
-        filter_args.append(id_game)
+@labelled
+def get_list(id_game=None, id_user=None):
+    statement, args = statements.filtered('get_list', id_game=id_game,
+                                          id_user=id_user)
 
-    if id_user is not None:
-        filter_list.append("list.id_user = %s")
-        filter_args.append(id_user)
+    with connection_scope() as connection:
+        with connection.cursor(cursor_factory=rows.ListEntry.cursor) as cursor:
+            statements.execute(cursor, statement, args)
+            return cursor.fetchall()
 
-    if filter_list:
-        query += ' WHERE ' + ' AND '.join(filter_list)
 
-    try:
-        with connection.cursor() as cursor:
-            if filter_list:
-                cursor.execute(query, tuple(filter_args))
-            else:
-                cursor.execute(query)
-            user_lists = cursor.fetchall()
-
-        column_names = ['id_game', 'id_user', 'list_type', 'rated', 'game_name', 'username']
-        lists_dict = []
-
-        for user_list in user_lists:
-            temp_dict = {}
-            for key, value in zip(column_names, user_list):
-                temp_dict[key] = value
-                if key == 'rated' and value is not None:
-                    temp_dict[key] = int(value)
-            lists_dict.append(temp_dict)
-
-        return lists_dict
-    finally:
-        connection.close()
+statements.register(
+    'add_list',
+    '''INSERT INTO list (id_game, id_user, list_type, rated) 
+    VALUES (%s, %s, %s, %s)'''
+)
 
 
+@labelled
 def add_list(id_game, id_user, list_type, rated=None):
-    connection = get_connection()
-    query = '''INSERT INTO list (id_game, id_user, list_type, rated) 
-    VALUES (%s, %s, %s, %s)'''
-
-    try:
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (id_game, id_user, list_type, rated))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'add_list',
+                               (id_game, id_user, list_type, rated))
+            _apply_game_stats_delta(
+                cursor, id_game, _game_stats_delta(list_type, rated)
+            )
 
+    invalidate_listing_cache()
+    mark_leaderboards_stale()
+    touch_entities('games', f'game:{id_game}')
 
-def update_list(id_game, id_user, list_type, rated=None):
-    connection = get_connection()
-    query = "UPDATE list SET list_type=%s, rated=%s WHERE id_game=%s AND id_user=%s"
 
-    try:
+statements.register(
+    'lock_list_entry',
+    '''SELECT list_type, rated FROM list 
+    WHERE id_game=%s AND id_user=%s FOR UPDATE'''
+)
+statements.register(
+    'update_list',
+    "UPDATE list SET list_type=%s, rated=%s WHERE id_game=%s AND id_user=%s"
+)
+
+
+@labelled
+def update_list(id_game, id_user, list_type, rated=None):
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (list_type, rated, id_game, id_user))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'lock_list_entry', (id_game, id_user))
+            old_entry = cursor.fetchone()
+            statements.execute(cursor, 'update_list',
+                               (list_type, rated, id_game, id_user))
 
+            if old_entry is not None:
+                old_list_type, old_rated = old_entry
+                _apply_game_stats_delta(
+                    cursor, id_game,
+                    _game_stats_delta(old_list_type, old_rated, sign=-1),
+                    _game_stats_delta(list_type, rated)
+                )
 
-def delete_list(id_game, id_user):
-    connection = get_connection()
-    query = "DELETE FROM list WHERE id_game=%s AND id_user=%s"
+    invalidate_listing_cache()
+    mark_leaderboards_stale()
+    touch_entities('games', f'game:{id_game}')
 
-    try:
+
+statements.register(
+    'delete_list',
+    '''DELETE FROM list WHERE id_game=%s AND id_user=%s 
+    RETURNING list_type, rated'''
+)
+
+
+@labelled
+def delete_list(id_game, id_user):
+    with connection_scope() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (id_game, id_user))
-        connection.commit()
-    finally:
-        connection.close()
+            statements.execute(cursor, 'delete_list', (id_game, id_user))
+            old_entry = cursor.fetchone()
+
+            if old_entry is not None:
+                old_list_type, old_rated = old_entry
+                _apply_game_stats_delta(
+                    cursor, id_game,
+                    _game_stats_delta(old_list_type, old_rated, sign=-1)
+                )
+
+    invalidate_listing_cache()
+    mark_leaderboards_stale()
+    touch_entities('games', f'game:{id_game}')
@@ -0,0 +1,834 @@
+import asyncio
+import datetime
+import decimal
+import os
+import threading
+from contextlib import asynccontextmanager
+
+import asyncpg
+
+import db_service
+import passwords
+import rows
+from cache import MISSING
+from statements import numbered
+
+_loop = None
+_pool = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop():
+    global _loop
+
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name='db-service-async',
+                    daemon=True
+                ).start()
+                _loop = loop
+
+    return _loop
+
+
+async def _create_pool():
+    global _pool
+
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            host=os.getenv('POSTGRES_HOST'),
+            port=os.getenv('POSTGRES_PORT'),
+            database=os.getenv('POSTGRES_DB'),
+            user=os.getenv('POSTGRES_USER'),
+            password=os.getenv('POSTGRES_PASSWORD'),
+            min_size=int(os.getenv('POSTGRES_POOL_MIN_SIZE', 1)),
+            max_size=int(os.getenv('POSTGRES_POOL_MAX_SIZE', 10)),
+            # An idle timeout; asyncpg has no limit on connection age like
+            # POSTGRES_POOL_MAX_LIFETIME of the sync pool.
+            max_inactive_connection_lifetime=float(
+                os.getenv('POSTGRES_ASYNC_POOL_MAX_INACTIVE_LIFETIME', 300)
+            ),
+        )
+
+    return _pool
+
+
+async def _on_owner_loop(coroutine):
+    # The pool belongs to one background loop; Flask runs every async view
+    # on a loop of its own, so work is handed over to the owner loop.
+    loop = _get_loop()
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+
+    if running_loop is loop:
+        return await coroutine
+
+    future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+    return await asyncio.wrap_future(future)
+
+
+async def close_pool():
+    global _pool
+
+    async def close():
+        global _pool
+        if _pool is not None:
+            await _pool.close()
+            _pool = None
+
+    await _on_owner_loop(close())
+
+
+@asynccontextmanager
+async def _transaction():
+    pool = await _create_pool()
+    async with pool.acquire() as connection:
+        async with connection.transaction():
+            yield connection
+
+
+async def _fetch(query, *args):
+    async def run():
+        async with _transaction() as connection:
+            return await connection.fetch(numbered(query), *args)
+
+    return [dict(record) for record in await _on_owner_loop(run())]
+
+
+async def _fetchrow(query, *args):
+    async def run():
+        async with _transaction() as connection:
+            return await connection.fetchrow(numbered(query), *args)
+
+    record = await _on_owner_loop(run())
+    return None if record is None else dict(record)
+
+
+async def _execute(query, *args):
+    async def run():
+        async with _transaction() as connection:
+            return await connection.execute(numbered(query), *args)
+
+    return await _on_owner_loop(run())
+
+
+def _to_date(value):
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value)
+    return value
+
+
+def _to_int(value):
+    return None if value is None else int(value)
+
+
+# asyncpg checks parameter types strictly, while the routes pass form and
+# query string values as text.
+FILTER_TYPES = {
+    'min_release_date': _to_date,
+    'max_release_date': _to_date,
+    'min_rating': decimal.Decimal,
+    'max_rating': decimal.Decimal,
+    'id_developer': int,
+    'id_publisher': int,
+    'search_text': str,
+}
+
+
+async def _cached_reference(key, row_class, loader):
+    # The entries are shared with db_service, so they hold the same row
+    # classes as the sync readers put there, not the dicts used elsewhere here.
+    cache = db_service.reference_cache
+    value = cache.backend.get(key)
+    if value is MISSING:
+        generation = cache.generation(key)
+        value = [row_class(**record) for record in await loader()]
+        cache.set_if_current(key, value, generation)
+
+    return value
+
+
+GAME_COLUMNS = '''game.id_game, game.game_name, game.description,
+    game.release_date, game.rating, developer.studio_name AS developer,
+    publisher.publisher_name AS publisher, game_stats.avg_rating,
+    game_stats.list_count AS popularity'''
+
+GAME_JOINS = '''FROM game
+    LEFT JOIN developer
+    ON game.id_developer = developer.id_developer
+    LEFT JOIN publisher
+    ON game.id_publisher = publisher.id_publisher
+    LEFT JOIN game_stats
+    ON game.id_game = game_stats.id_game'''
+
+
+async def get_all_games(order_by='id_game', order_direction='asc', **kwargs):
+    query = f'SELECT {GAME_COLUMNS}\n{GAME_JOINS}'
+
+    kwargs = {key: FILTER_TYPES[key](value) for key, value in kwargs.items()}
+    query_filter_list, query_filter_args = db_service._games_filter(kwargs)
+    if query_filter_list:
+        query += '\nWHERE ' + '\nAND '.join(query_filter_list)
+
+    order = db_service.games_order_sql(order_by, order_direction)
+    query += f'\nORDER BY {order}'
+
+    games = await _fetch(query, *query_filter_args)
+    if len(games) == 0:
+        return None
+
+    return games
+
+
+async def get_game(game_id):
+    return await _fetchrow(
+        f'SELECT {GAME_COLUMNS}\n{GAME_JOINS}\nWHERE game.id_game = %s',
+        game_id
+    )
+
+
+async def get_games_by_ids(ids):
+    return await _fetch(
+        f'SELECT {GAME_COLUMNS}\n{GAME_JOINS}\n'
+        'WHERE game.id_game = ANY(%s::integer[])',
+        [int(id_game) for id_game in ids]
+    )
+
+
+# Cursor keys come back from JSON as text or numbers.
+CURSOR_KEY_TYPES = {
+    'id_game': int,
+    'rating': decimal.Decimal,
+    'release_date': _to_date,
+    'avg_rating': decimal.Decimal,
+    'popularity': int,
+}
+
+
+def _as_row(record, fields):
+    # The page and search queries are shared with db_service and name the
+    # columns as the tables do; the rows are keyed like the sync rows.
+    return dict(zip(fields, record.values()))
+
+
+async def get_games_page(order_by='id_game', order_direction='asc',
+                         cursor=None, page=None,
+                         page_size=db_service.GAMES_PAGE_SIZE,
+                         with_total=False, **kwargs):
+    # Raises ValueError for unknown values, which the views answer with 400.
+    db_service.games_order_sql(order_by, order_direction)
+    kwargs = {key: FILTER_TYPES[key](value) for key, value in kwargs.items()}
+
+    direction, key_value, id_game = 'next', None, None
+    offset = 0
+    if cursor:
+        direction, key_value, id_game = db_service.decode_games_cursor(
+            cursor, order_by
+        )
+        if key_value is not None:
+            key_value = CURSOR_KEY_TYPES[order_by](key_value)
+        page = None
+    elif page is not None:
+        page = max(int(page), 1)
+        offset = (page - 1) * page_size
+
+    segments = db_service._games_page_segments(order_by, direction,
+                                               key_value, id_game)
+    backwards = direction == 'prev'
+    has_prev = cursor is not None or offset > 0
+
+    async def run():
+        nonlocal offset
+        games = []
+        total = None
+        async with _transaction() as connection:
+            for segment, after in segments:
+                needed = page_size + 1 - len(games)
+                query, args = db_service.games_page_query(
+                    order_by, order_direction, kwargs, segment, after,
+                    backwards, limit=needed, offset=offset
+                )
+                found = await connection.fetch(numbered(query), *args)
+                games.extend(found)
+                if len(games) > page_size:
+                    break
+
+                if found or not offset:
+                    offset = 0
+                    continue
+                query, args = db_service.games_page_query(
+                    order_by, order_direction, kwargs, segment, after,
+                    count=True
+                )
+                offset -= await connection.fetchval(numbered(query), *args)
+
+            if with_total:
+                query_filter_list, count_args = db_service._games_filter(
+                    kwargs
+                )
+                count_query = f'SELECT count(*) {GAME_JOINS}'
+                if query_filter_list:
+                    count_query += '\nWHERE ' + '\nAND '.join(
+                        query_filter_list
+                    )
+                total = await connection.fetchval(numbered(count_query),
+                                                  *count_args)
+
+        return games, total
+
+    games, total = await _on_owner_loop(run())
+    games = [_as_row(record, rows.GAME_FIELDS) for record in games]
+
+    has_more = len(games) > page_size
+    games = games[:page_size]
+    if backwards:
+        games.reverse()
+
+    if backwards:
+        has_next, has_prev = True, has_more
+    else:
+        has_next = has_more
+
+    games_page = db_service.GamesPage(
+        games=games, page=page, page_size=page_size, total=total
+    )
+    if games and has_next:
+        games_page.next_cursor = db_service.encode_games_cursor(
+            'next', order_by, games[-1]
+        )
+    if games and has_prev:
+        games_page.prev_cursor = db_service.encode_games_cursor(
+            'prev', order_by, games[0]
+        )
+
+    return games_page
+
+
+async def search_games(search_text, limit=db_service.GAMES_PAGE_SIZE,
+                       **kwargs):
+    kwargs.pop('order_by', None)
+    kwargs.pop('order_direction', None)
+    kwargs = {key: FILTER_TYPES[key](value) for key, value in kwargs.items()}
+
+    query, args = db_service.search_games_query(search_text, int(limit),
+                                                kwargs)
+    return [_as_row(record, rows.GameSearchResult._fields)
+            for record in await _fetch(query, *args)]
+
+
+async def get_leaderboard(board, scope='all', scope_id=None, limit=10):
+    if (board not in db_service.LEADERBOARDS
+            or scope not in db_service.LEADERBOARD_SCOPES):
+        raise ValueError('Unknown leaderboard')
+
+    if scope == 'all':
+        scope_id = 0
+    elif scope_id is None:
+        raise ValueError('Scoped leaderboards need a scope_id')
+
+    limit = min(int(limit), db_service.LEADERBOARD_DEPTH)
+
+    query = db_service.statements.get('get_leaderboard').query
+    return [_as_row(record, rows.LeaderboardEntry._fields)
+            for record in await _fetch(query, board, scope, int(scope_id),
+                                       limit)]
+
+
+async def get_game_detail(id_game, id_user=None):
+    queries = [get_game(id_game), get_genre_of_game(id_game=id_game),
+               get_comments(id_game=id_game)]
+    if id_user is not None:
+        queries.append(get_list(id_game, id_user))
+
+    game, genres, comments, *user_list = await asyncio.gather(*queries)
+    if game is None:
+        return None
+
+    return {
+        'game': game,
+        'genres': genres,
+        'comments': comments,
+        'user_list': user_list[0][0] if user_list and user_list[0] else None,
+    }
+
+
+async def add_game(game_name, description, release_date, id_developer,
+                   rating=0, id_publisher=None):
+    query = '''WITH new_game AS (
+        INSERT INTO game (game_name, description, release_date,
+        rating, id_developer, id_publisher)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING id_game
+    )
+    INSERT INTO game_stats (id_game) SELECT id_game FROM new_game'''
+
+    await _execute(query, game_name, description, _to_date(release_date),
+                   rating, int(id_developer), _to_int(id_publisher))
+    db_service.invalidate_listing_cache()
+    db_service.touch_entities('games')
+
+
+async def update_game(id_game, game_name, description, release_date,
+                      id_publisher, id_developer):
+    query = '''UPDATE game SET game_name = %s, description = %s,
+    release_date = %s, id_developer = %s, id_publisher = %s
+    WHERE id_game = %s'''
+
+    await _execute(query, game_name, description, _to_date(release_date),
+                   int(id_developer), _to_int(id_publisher), id_game)
+    db_service.invalidate_listing_cache()
+    db_service.mark_leaderboards_stale()
+    db_service.touch_entities('games', f'game:{id_game}')
+
+
+async def delete_game(id_game):
+    await _execute("DELETE FROM game WHERE id_game = %s", id_game)
+    db_service.invalidate_listing_cache()
+    db_service.mark_leaderboards_stale()
+    db_service.touch_entities('games', f'game:{id_game}')
+
+
+async def get_all_users():
+    return await _fetch('''SELECT id_user, username, password, email
+    FROM users
+    ORDER BY id_user''')
+
+
+async def get_user(id_user):
+    return await _fetchrow('''SELECT id_user, username, password, email
+    FROM users
+    WHERE id_user = %s''', id_user)
+
+
+async def validate_user(username, password):
+    user = await _fetchrow('''SELECT id_user, username, password, email
+    FROM users
+    WHERE username = %s''', username)
+
+    if user is None:
+        return None
+
+    context = passwords.get_context()
+    verified, new_hash = await context.verify_async(password, user['password'])
+    if not verified:
+        return None
+
+    if new_hash is not None:
+        await _execute('''UPDATE users SET password = %s
+        WHERE id_user = %s AND password = %s''',
+                       new_hash, user['id_user'], user['password'])
+        user['password'] = new_hash
+
+    return user
+
+
+async def add_user(username, password, email):
+    password_hash = await passwords.get_context().hash_async(password)
+    await _execute(
+        "INSERT INTO users (username, password, email) VALUES (%s, %s, %s)",
+        username, password_hash, email
+    )
+
+
+async def validate_admin(login, password):
+    admin = await _fetchrow(
+        "SELECT id, login, password FROM admin WHERE login = %s", login
+    )
+
+    if admin is None:
+        return None
+
+    context = passwords.get_context()
+    verified, new_hash = await context.verify_async(password,
+                                                    admin['password'])
+    if not verified:
+        return None
+
+    if new_hash is not None:
+        await _execute('''UPDATE admin SET password = %s
+        WHERE id = %s AND password = %s''',
+                       new_hash, admin['id'], admin['password'])
+        admin['password'] = new_hash
+
+    return admin
+
+
+async def add_admin(login, password):
+    password_hash = await passwords.get_context().hash_async(password)
+    await _execute("INSERT INTO admin (login, password) VALUES (%s, %s)",
+                   login, password_hash)
+
+
+async def update_user(id_user, username=None, password=None, email=None):
+    to_update_list = []
+    to_update_args = []
+
+    if username is not None:
+        to_update_list.append('username=%s')
+        to_update_args.append(username)
+    if password is not None:
+        to_update_list.append('password=%s')
+        to_update_args.append(
+            await passwords.get_context().hash_async(password)
+        )
+    if email is not None:
+        to_update_list.append('email=%s')
+        to_update_args.append(email)
+
+    if not to_update_list:
+        return
+
+    query = ('UPDATE users SET ' + ', '.join(to_update_list)
+             + ' WHERE id_user = %s')
+    await _execute(query, *to_update_args, id_user)
+    db_service.touch_entities('users')
+
+
+async def delete_user(id_user):
+    async def run():
+        async with _transaction() as connection:
+            await connection.execute(
+                numbered(db_service.GAME_STATS_REMOVE_USER_QUERY),
+                id_user, id_user
+            )
+            await connection.execute(
+                "DELETE FROM users WHERE id_user = $1", id_user
+            )
+
+    await _on_owner_loop(run())
+    db_service.invalidate_listing_cache()
+    db_service.mark_leaderboards_stale()
+    db_service.touch_entities('users', 'games')
+
+
+async def get_all_developers():
+    return await _cached_reference('developers', rows.Developer, lambda: _fetch(
+        '''SELECT id_developer, studio_name, country FROM developer
+        ORDER BY id_developer'''
+    ))
+
+
+async def get_developer(id_developer):
+    return await _fetchrow('''SELECT id_developer, studio_name, country
+    FROM developer
+    WHERE id_developer = %s''', id_developer)
+
+
+async def add_developer(studio_name, country=None):
+    await _execute(
+        "INSERT INTO developer (studio_name, country) VALUES (%s, %s)",
+        studio_name, country
+    )
+    db_service.invalidate_reference_cache('developers')
+    db_service.invalidate_listing_cache()
+    db_service.touch_entities('developers')
+
+
+async def update_developer(id_developer, studio_name, country=None):
+    await _execute('''UPDATE developer SET studio_name = %s, country = %s
+    WHERE id_developer = %s''', studio_name, country, id_developer)
+    db_service.invalidate_reference_cache('developers')
+    db_service.invalidate_listing_cache()
+    db_service.touch_entities('developers', f'developer:{id_developer}')
+
+
+async def delete_developer(id_developer):
+    await _execute("DELETE FROM developer WHERE id_developer = %s",
+                   id_developer)
+    db_service.invalidate_reference_cache('developers')
+    db_service.invalidate_listing_cache()
+    db_service.touch_entities('developers', f'developer:{id_developer}')
+
+
+async def get_all_publishers():
+    return await _cached_reference('publishers', rows.Publisher, lambda: _fetch(
+        '''SELECT id_publisher, publisher_name, country
+        FROM publisher'''
+    ))
+
+
+async def get_publisher(id_publisher):
+    return await _fetchrow('''SELECT id_publisher, publisher_name, country
+    FROM publisher
+    WHERE id_publisher = %s''', id_publisher)
+
+
+async def add_publisher(publisher_name, country=None):
+    await _execute(
+        "INSERT INTO publisher (publisher_name, country) VALUES (%s, %s)",
+        publisher_name, country
+    )
+    db_service.invalidate_reference_cache('publishers')
+    db_service.invalidate_listing_cache()
+    db_service.touch_entities('publishers')
+
+
+async def update_publisher(id_publisher, publisher_name, country=None):
+    await _execute('''UPDATE publisher SET publisher_name = %s, country = %s
+    WHERE id_publisher = %s''', publisher_name, country, id_publisher)
+    db_service.invalidate_reference_cache('publishers')
+    db_service.invalidate_listing_cache()
+    db_service.touch_entities('publishers', f'publisher:{id_publisher}')
+
+
+async def delete_publisher(id_publisher):
+    await _execute("DELETE FROM publisher WHERE id_publisher = %s",
+                   id_publisher)
+    db_service.invalidate_reference_cache('publishers')
+    db_service.invalidate_listing_cache()
+    db_service.touch_entities('publishers', f'publisher:{id_publisher}')
+
+
+def _optional_filters(query, filters):
+    filter_list = []
+    filter_args = []
+
+    for column, value in filters:
+        if value is not None:
+            filter_list.append(f'{column}=%s')
+            filter_args.append(value)
+
+    if filter_list:
+        query += ' WHERE ' + ' AND '.join(filter_list)
+
+    return query, filter_args
+
+
+async def get_comments(id_game=None, id_user=None):
+    query, args = _optional_filters(
+        '''SELECT comment.id_game, comment.id_user, comment.text,
+        game.game_name, users.username
+        FROM comment
+        JOIN game ON comment.id_game = game.id_game
+        JOIN users ON comment.id_user = users.id_user''',
+        [('comment.id_game', id_game), ('comment.id_user', id_user)]
+    )
+    return await _fetch(query, *args)
+
+
+async def _apply_game_stats_delta(connection, id_game, *deltas):
+    args = db_service.game_stats_delta_args(id_game, *deltas)
+    if args is not None:
+        await connection.execute(
+            numbered(db_service.GAME_STATS_DELTA_QUERY), *args
+        )
+
+
+async def add_comment(id_game, id_user, comment):
+    async def run():
+        async with _transaction() as connection:
+            await connection.execute(
+                "INSERT INTO comment (id_game, id_user, text) VALUES ($1, $2, $3)",
+                id_game, id_user, comment
+            )
+            await _apply_game_stats_delta(
+                connection, id_game, db_service._game_stats_delta(comments=1)
+            )
+
+    await _on_owner_loop(run())
+    db_service.touch_entities(f'game:{id_game}')
+
+
+async def update_comment(id_game, id_user, text):
+    await _execute(
+        "UPDATE comment SET text = %s WHERE id_game = %s AND id_user = %s",
+        text, id_game, id_user
+    )
+    db_service.touch_entities(f'game:{id_game}')
+
+
+async def delete_comment(id_game, id_user):
+    async def run():
+        async with _transaction() as connection:
+            deleted = await connection.fetchrow(
+                '''DELETE FROM comment WHERE id_game = $1 AND id_user = $2
+                RETURNING id_game''',
+                id_game, id_user
+            )
+            if deleted is not None:
+                await _apply_game_stats_delta(
+                    connection, id_game,
+                    db_service._game_stats_delta(comments=1, sign=-1)
+                )
+
+    await _on_owner_loop(run())
+    db_service.touch_entities(f'game:{id_game}')
+
+
+async def get_all_genres():
+    return await _cached_reference('genres', rows.Genre, lambda: _fetch(
+        "SELECT id_genre, genre_name FROM genre"
+    ))
+
+
+async def get_genre(id_genre):
+    return await _fetchrow(
+        "SELECT id_genre, genre_name FROM genre WHERE id_genre = %s", id_genre
+    )
+
+
+async def add_genre(genre_name):
+    await _execute("INSERT INTO genre (genre_name) VALUES (%s)", genre_name)
+    db_service.invalidate_reference_cache('genres')
+    db_service.touch_entities('genres')
+
+
+async def update_genre(id_genre, genre_name):
+    await _execute("UPDATE genre SET genre_name = %s WHERE id_genre = %s",
+                   genre_name, id_genre)
+    db_service.invalidate_reference_cache('genres')
+    db_service.touch_entities('genres', f'genre:{id_genre}')
+
+
+async def delete_genre(id_genre):
+    await _execute("DELETE FROM genre WHERE id_genre = %s", id_genre)
+    # The genre's genre_of_game rows go with it.
+    db_service.mark_leaderboards_stale()
+    db_service.invalidate_reference_cache('genres')
+    db_service.touch_entities('genres', f'genre:{id_genre}', 'game_genres')
+
+
+async def get_genre_of_game(id_game=None, id_genre=None):
+    query, args = _optional_filters(
+        '''SELECT genre_of_game.id_game, genre_of_game.id_genre,
+        game.game_name, genre.genre_name
+        FROM genre_of_game
+        JOIN genre ON genre_of_game.id_genre = genre.id_genre
+        JOIN game ON genre_of_game.id_game = game.id_game''',
+        [('genre_of_game.id_game', id_game),
+         ('genre_of_game.id_genre', id_genre)]
+    )
+    return await _fetch(query, *args)
+
+
+async def add_genre_of_game(id_game, id_genre):
+    await _execute(
+        "INSERT INTO genre_of_game (id_game, id_genre) VALUES (%s, %s)",
+        id_game, id_genre
+    )
+    db_service.touch_entities(f'game:{id_game}', 'game_genres')
+
+
+async def delete_genre_of_game(id_game, id_genre):
+    await _execute(
+        "DELETE FROM genre_of_game WHERE id_game = %s AND id_genre = %s",
+        id_game, id_genre
+    )
+    db_service.touch_entities(f'game:{id_game}', 'game_genres')
+
+
+async def set_genres_of_game(id_game, id_genres):
+    id_genres = sorted({int(id_genre) for id_genre in id_genres})
+
+    async def run():
+        async with _transaction() as connection:
+            await connection.execute(
+                '''DELETE FROM genre_of_game
+                WHERE id_game = $1 AND NOT (id_genre = ANY($2::integer[]))''',
+                id_game, id_genres
+            )
+            await connection.execute(
+                '''INSERT INTO genre_of_game (id_game, id_genre)
+                SELECT $1, new_genre.id_genre
+                FROM unnest($2::integer[]) AS new_genre(id_genre)
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM genre_of_game
+                    WHERE genre_of_game.id_game = $1
+                    AND genre_of_game.id_genre = new_genre.id_genre
+                )''',
+                id_game, id_genres
+            )
+
+    await _on_owner_loop(run())
+    db_service.mark_leaderboards_stale()
+    db_service.touch_entities(f'game:{id_game}', 'game_genres')
+
+
+async def get_list(id_game=None, id_user=None):
+    query, args = _optional_filters(
+        '''SELECT list.id_game, list.id_user, list.list_type,
+        list.rated::integer AS rated, game.game_name, users.username
+        FROM list
+        JOIN users ON list.id_user = users.id_user
+        JOIN game ON list.id_game = game.id_game''',
+        [('list.id_game', id_game), ('list.id_user', id_user)]
+    )
+    return await _fetch(query, *args)
+
+
+async def add_list(id_game, id_user, list_type, rated=None):
+    rated = _to_int(rated)
+
+    async def run():
+        async with _transaction() as connection:
+            await connection.execute(
+                '''INSERT INTO list (id_game, id_user, list_type, rated)
+                VALUES ($1, $2, $3, $4)''',
+                id_game, id_user, list_type, rated
+            )
+            await _apply_game_stats_delta(
+                connection, id_game,
+                db_service._game_stats_delta(list_type, rated)
+            )
+
+    await _on_owner_loop(run())
+    db_service.invalidate_listing_cache()
+    db_service.mark_leaderboards_stale()
+    db_service.touch_entities('games', f'game:{id_game}')
+
+
+async def update_list(id_game, id_user, list_type, rated=None):
+    rated = _to_int(rated)
+
+    async def run():
+        async with _transaction() as connection:
+            old_entry = await connection.fetchrow(
+                '''SELECT list_type, rated FROM list
+                WHERE id_game=$1 AND id_user=$2 FOR UPDATE''',
+                id_game, id_user
+            )
+            await connection.execute(
+                '''UPDATE list SET list_type=$1, rated=$2
+                WHERE id_game=$3 AND id_user=$4''',
+                list_type, rated, id_game, id_user
+            )
+            if old_entry is not None:
+                await _apply_game_stats_delta(
+                    connection, id_game,
+                    db_service._game_stats_delta(
+                        old_entry['list_type'], old_entry['rated'], sign=-1
+                    ),
+                    db_service._game_stats_delta(list_type, rated)
+                )
+
+    await _on_owner_loop(run())
+    db_service.invalidate_listing_cache()
+    db_service.mark_leaderboards_stale()
+    db_service.touch_entities('games', f'game:{id_game}')
+
+
+async def delete_list(id_game, id_user):
+    async def run():
+        async with _transaction() as connection:
+            old_entry = await connection.fetchrow(
+                '''DELETE FROM list WHERE id_game=$1 AND id_user=$2
+                RETURNING list_type, rated''',
+                id_game, id_user
+            )
+            if old_entry is not None:
+                await _apply_game_stats_delta(
+                    connection, id_game,
+                    db_service._game_stats_delta(
+                        old_entry['list_type'], old_entry['rated'], sign=-1
+                    )
+                )
+
+    await _on_owner_loop(run())
+    db_service.invalidate_listing_cache()
+    db_service.mark_leaderboards_stale()
+    db_service.touch_entities('games', f'game:{id_game}')
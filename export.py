@@ -0,0 +1,209 @@
+import csv
+import decimal
+import io
+import json
+import os
+import uuid
+
+import db_service
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_ITERSIZE = int(os.getenv('EXPORT_ITERSIZE', 2000))
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 10000))
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+EXPORTS = {
+    'games': {
+        'query': '''SELECT game.id_game, game.game_name, game.description,
+        game.release_date, game.rating, developer.studio_name,
+        publisher.publisher_name
+        FROM game
+        LEFT JOIN developer ON game.id_developer = developer.id_developer
+        LEFT JOIN publisher ON game.id_publisher = publisher.id_publisher
+        ORDER BY game.id_game''',
+        'columns': [('id_game', 'int'), ('game_name', 'str'),
+                    ('description', 'str'), ('release_date', 'date'),
+                    ('rating', 'float'), ('developer', 'str'),
+                    ('publisher', 'str')],
+    },
+    'comments': {
+        'query': '''SELECT comment.id_game, comment.id_user, comment.text,
+        game.game_name, users.username
+        FROM comment
+        JOIN game ON comment.id_game = game.id_game
+        JOIN users ON comment.id_user = users.id_user
+        ORDER BY comment.id_game, comment.id_user''',
+        'columns': [('id_game', 'int'), ('id_user', 'int'), ('text', 'str'),
+                    ('game_name', 'str'), ('username', 'str')],
+    },
+    'lists': {
+        'query': '''SELECT list.id_game, list.id_user, list.list_type,
+        list.rated, game.game_name, users.username
+        FROM list
+        JOIN users ON list.id_user = users.id_user
+        JOIN game ON list.id_game = game.id_game
+        WHERE list.id_user = %s
+        ORDER BY list.id_game''',
+        'columns': [('id_game', 'int'), ('id_user', 'int'),
+                    ('list_type', 'str'), ('rated', 'int'),
+                    ('game_name', 'str'), ('username', 'str')],
+    },
+}
+
+
+def stream_rows(query, params=None, itersize=EXPORT_ITERSIZE):
+    connection = db_service.get_connection()
+
+    try:
+        cursor = connection.cursor(name=f'export_{uuid.uuid4().hex}')
+        cursor.itersize = itersize
+        try:
+            cursor.execute(query, params)
+            yield from cursor
+        finally:
+            cursor.close()
+    finally:
+        db_service.release_connection(connection)
+
+
+def _plain_value(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def to_csv(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow([name for name, _ in columns])
+    yield buffer.getvalue().encode('utf-8')
+
+    for batch in _batches(rows, EXPORT_ITERSIZE):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+def to_jsonl(rows, columns):
+    names = [name for name, _ in columns]
+
+    for batch in _batches(rows, EXPORT_ITERSIZE):
+        yield b''.join(
+            _dumps(dict(zip(names, map(_plain_value, row)))) + b'\n'
+            for row in batch
+        )
+
+
+class _ChunkSink(io.RawIOBase):
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_schema(columns):
+    types = {
+        'int': pyarrow.int64(),
+        'str': pyarrow.string(),
+        'date': pyarrow.date32(),
+        'float': pyarrow.float64(),
+    }
+    return pyarrow.schema([(name, types[kind]) for name, kind in columns])
+
+
+def to_parquet(rows, columns):
+    if pyarrow is None:
+        raise RuntimeError('Parquet export requires pyarrow')
+
+    schema = _parquet_schema(columns)
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+
+    try:
+        for batch in _batches(rows, EXPORT_BATCH_SIZE):
+            arrays = []
+            for index, (name, kind) in enumerate(columns):
+                values = [row[index] for row in batch]
+                if kind == 'float':
+                    values = [None if value is None else float(value)
+                              for value in values]
+                arrays.append(pyarrow.array(values, type=schema.field(name).type))
+
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+
+    yield sink.drain()
+
+
+WRITERS = {
+    'csv': to_csv,
+    'jsonl': to_jsonl,
+    'parquet': to_parquet,
+}
+
+
+def export(name, file_format, params=None):
+    if file_format not in WRITERS:
+        raise ValueError(f'Unsupported export format: {file_format}')
+    if file_format == 'parquet' and pyarrow is None:
+        raise RuntimeError('Parquet export requires pyarrow')
+
+    definition = EXPORTS[name]
+    rows = stream_rows(definition['query'], params)
+
+    return WRITERS[file_format](rows, definition['columns'])
@@ -0,0 +1,65 @@
+import hashlib
+import os
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from cache import ReadThroughCache, SizedMemoryCache
+
+fragment_cache = ReadThroughCache(SizedMemoryCache(
+    max_bytes=int(os.getenv('FRAGMENT_CACHE_MAX_BYTES', 16 * 1024 * 1024)),
+    ttl=float(os.getenv('FRAGMENT_CACHE_TTL', 600)),
+))
+
+
+class FragmentCacheExtension(Extension):
+    # {% cache 'name', key, ..., depends=['games', 'game:' ~ id], unless=cond %}
+    # The rendered body is keyed by the name, the extra key values and the
+    # current versions of the depends keys, so a write that bumps one of them
+    # makes the old fragment unreachable and it ages out of the LRU.
+    # fragment_versions returns the versions to key on; they must be read
+    # before the data the body shows, or a write landing in between would
+    # store old content under the new version.
+    # With unless true the body is rendered every time.
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=fragment_cache,
+                           fragment_versions=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        options = {'depends': nodes.List([]), 'unless': nodes.Const(False)}
+
+        while parser.stream.skip_if('comma'):
+            if (parser.stream.current.type == 'name'
+                    and parser.stream.look().type == 'assign'):
+                option = next(parser.stream)
+                if option.value not in options:
+                    parser.fail(f'Unknown cache option {option.value}',
+                                option.lineno)
+                next(parser.stream)
+                options[option.value] = parser.parse_expression()
+            else:
+                key_parts.append(parser.parse_expression())
+
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        call = self.call_method('_render', [
+            nodes.List(key_parts), options['depends'], options['unless']
+        ])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, key_parts, depends, unless, caller):
+        versions = self.environment.fragment_versions
+        if unless or versions is None:
+            return caller()
+
+        depends = list(depends)
+        stamp, _ = versions().stamp(depends)
+        key = hashlib.md5(
+            repr((key_parts, depends, stamp)).encode('utf-8')
+        ).hexdigest()
+
+        return self.environment.fragment_cache.get_or_load(key, caller)
@@ -0,0 +1,98 @@
+import functools
+import hashlib
+import os
+import time
+from datetime import datetime, timezone
+
+from flask import request, session, make_response
+
+import db_service
+
+SHARED_MAX_AGE = int(os.getenv('HTTP_CACHE_SHARED_MAX_AGE', 10))
+
+# Pages built from the listing cache can lag writes by up to its TTL.
+LISTING_TURNOVER = db_service.listing_cache.backend.ttl
+
+
+def _viewer(user):
+    if not user:
+        return 'anonymous'
+
+    return f'{user.get("role")}:{user.get("id_user")}:{user.get("username")}'
+
+
+def _validators(dependencies, view_args, turnover):
+    keys = [key.format(**view_args) for key in dependencies]
+    versions, modified_at = db_service.entity_versions.stamp(keys)
+
+    # Pages that also show aggregates refreshed on a timer (cached listings,
+    # game_stats) change without a write, so the validator rolls over with them.
+    if turnover:
+        bucket = int(time.time() // turnover)
+        versions.append(bucket)
+        modified_at = max(modified_at, bucket * turnover)
+
+    parts = [request.endpoint, sorted(view_args.items()),
+             sorted(request.args.items(multi=True)), versions,
+             _viewer(session.get('user'))]
+    etag = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+    last_modified = datetime.fromtimestamp(int(modified_at), timezone.utc)
+    return etag, last_modified
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+
+    if request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+
+    return False
+
+
+def _set_headers(response, etag, last_modified, public):
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+
+    if public:
+        response.cache_control.public = True
+        response.cache_control.max_age = 0
+        response.cache_control.s_maxage = SHARED_MAX_AGE
+    else:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+
+
+def conditional(*dependencies, turnover=None):
+    # dependencies are entity version keys, formatted with the view arguments:
+    # conditional('games', 'game:{id_game}')
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**view_args):
+            if request.method not in ('GET', 'HEAD'):
+                return view(**view_args)
+
+            # A pending flash message is rendered once and must not be
+            # answered from a cache, ours or the browser's.
+            if '_flashes' in session:
+                return view(**view_args)
+
+            etag, last_modified = _validators(dependencies, view_args,
+                                              turnover)
+            public = not session.get('user')
+
+            if _not_modified(etag, last_modified):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(**view_args))
+                if response.status_code != 200:
+                    return response
+
+            _set_headers(response, etag, last_modified, public)
+            return response
+
+        return wrapper
+
+    return decorator
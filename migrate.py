@@ -0,0 +1,301 @@
+import argparse
+import os
+import re
+import sys
+from dataclasses import dataclass
+
+import psycopg2
+
+import db_service
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.(up|down)\.sql$')
+MIGRATION_LOCK_ID = 72150315
+EXPLAIN_MIN_ROWS = int(os.getenv('EXPLAIN_MIN_ROWS', 10000))
+
+SCHEMA_MIGRATIONS = '''CREATE TABLE IF NOT EXISTS schema_migrations (
+    version integer PRIMARY KEY,
+    name text NOT NULL,
+    applied_at timestamptz NOT NULL DEFAULT now()
+)'''
+
+# Listing queries are built at runtime; the shapes checked here come from the
+# same builders with representative arguments.
+HOT_QUERIES = {
+    'games_page': db_service.games_page_query('id_game', 'asc'),
+    'games_page_after': db_service.games_page_query(
+        'id_game', 'asc', after=(1000,)
+    ),
+    'games_page_by_rating': db_service.games_page_query(
+        'rating', 'desc', after=(8, 1000)
+    ),
+    'games_page_by_rating_before': db_service.games_page_query(
+        'rating', 'desc', after=(8, 1000), backwards=True
+    ),
+    'games_page_by_release_date': db_service.games_page_query(
+        'release_date', 'asc', {'min_release_date': '2015-01-01'},
+        after=('2015-01-01', 0)
+    ),
+    'games_page_by_release_date_desc': db_service.games_page_query(
+        'release_date', 'desc'
+    ),
+    'games_page_without_release_date': db_service.games_page_query(
+        'release_date', 'asc', segment='nulls', after=(1000,)
+    ),
+    'games_page_by_avg_rating': db_service.games_page_query(
+        'avg_rating', 'desc'
+    ),
+    'games_page_by_popularity': db_service.games_page_query(
+        'popularity', 'desc', after=(10, 1000)
+    ),
+    'games_of_developer': db_service.games_page_query(
+        'id_game', 'asc', {'id_developer': 1}
+    ),
+    'games_of_publisher': db_service.games_page_query(
+        'id_game', 'asc', {'id_publisher': 1}
+    ),
+    'search_games': db_service.search_games_query('witcher'),
+}
+
+# Registered statements are checked with the exact text the app prepares.
+HOT_STATEMENTS = {
+    'get_game_detail': (1, 1),
+    'get_games_by_ids': ([1, 2, 3],),
+    'get_comments_by_id_game': (1,),
+    'get_comments_by_id_user': (1,),
+    'get_list_by_id_user': (1,),
+    'get_list_by_id_game_id_user': (1, 1),
+    'get_genre_of_game_by_id_game': (1,),
+    'get_genre_of_game_by_id_genre': (1,),
+    'validate_user': ('user',),
+    'validate_admin': ('admin',),
+    'get_leaderboard': ('top_rated', 'all', 0, 10),
+    'lock_list_entry': (1, 1),
+    'remove_user_game_stats': (1, 1),
+}
+for name, params in HOT_STATEMENTS.items():
+    HOT_QUERIES[name] = (db_service.statements.get(name).query, params)
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    up_path: str = None
+    down_path: str = None
+
+    @property
+    def label(self):
+        return f'{self.version:04d}_{self.name}'
+
+
+def discover_migrations(directory=MIGRATIONS_DIR):
+    migrations = {}
+
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if match is None:
+            continue
+
+        version, name, direction = int(match[1]), match[2], match[3]
+        migration = migrations.setdefault(version, Migration(version, name))
+        if migration.name != name:
+            raise ValueError(f'Conflicting names for migration {version}: '
+                             f'{migration.name}, {name}')
+        setattr(migration, f'{direction}_path', os.path.join(directory, filename))
+
+    for migration in migrations.values():
+        if migration.up_path is None:
+            raise ValueError(f'Migration {migration.label} has no up script')
+
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as file:
+        return file.read()
+
+
+def applied_migrations(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(SCHEMA_MIGRATIONS)
+        cursor.execute('''SELECT version, name, applied_at
+        FROM schema_migrations ORDER BY version''')
+        applied = {version: (name, applied_at)
+                   for version, name, applied_at in cursor.fetchall()}
+    connection.commit()
+
+    return applied
+
+
+def _lock(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_ID,))
+    connection.commit()
+
+
+def _unlock(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_ID,))
+    connection.commit()
+
+
+def upgrade(connection, target=None, log=print):
+    _lock(connection)
+    try:
+        applied = applied_migrations(connection)
+        done = []
+
+        for migration in discover_migrations():
+            if migration.version in applied:
+                continue
+            if target is not None and migration.version > target:
+                break
+
+            # Each migration and its bookkeeping row commit together.
+            with connection.cursor() as cursor:
+                cursor.execute(_read(migration.up_path))
+                cursor.execute('''INSERT INTO schema_migrations (version, name)
+                VALUES (%s, %s)''', (migration.version, migration.name))
+            connection.commit()
+
+            log(f'Applied {migration.label}')
+            done.append(migration)
+
+        return done
+    except psycopg2.Error:
+        connection.rollback()
+        raise
+    finally:
+        _unlock(connection)
+
+
+def downgrade(connection, target, log=print):
+    _lock(connection)
+    try:
+        applied = applied_migrations(connection)
+        done = []
+
+        for migration in reversed(discover_migrations()):
+            if migration.version <= target or migration.version not in applied:
+                continue
+            if migration.down_path is None:
+                raise ValueError(f'Migration {migration.label} cannot be reverted')
+
+            with connection.cursor() as cursor:
+                cursor.execute(_read(migration.down_path))
+                cursor.execute('DELETE FROM schema_migrations WHERE version = %s',
+                               (migration.version,))
+            connection.commit()
+
+            log(f'Reverted {migration.label}')
+            done.append(migration)
+
+        return done
+    except psycopg2.Error:
+        connection.rollback()
+        raise
+    finally:
+        _unlock(connection)
+
+
+def status(connection):
+    applied = applied_migrations(connection)
+
+    rows = []
+    for migration in discover_migrations():
+        applied_at = applied.get(migration.version, (None, None))[1]
+        rows.append((migration.label, applied_at))
+
+    return rows
+
+
+def _seq_scans(plan):
+    if plan.get('Node Type') == 'Seq Scan':
+        yield plan['Relation Name']
+    for child in plan.get('Plans', []):
+        yield from _seq_scans(child)
+
+
+def explain_hot_queries(connection, strict=False, min_rows=EXPLAIN_MIN_ROWS):
+    # With enable_seqscan off the planner only falls back to a seq scan when
+    # no index can serve the query, whatever the current table sizes are.
+    failures = {}
+
+    with connection.cursor() as cursor:
+        if strict:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+        cursor.execute('''SELECT relname, reltuples::bigint FROM pg_class
+        WHERE relkind IN ('r', 'm') AND relnamespace = 'public'::regnamespace''')
+        row_estimates = dict(cursor.fetchall())
+
+        for name, (query, params) in HOT_QUERIES.items():
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + query, params)
+            plan = cursor.fetchone()[0][0]['Plan']
+
+            tables = sorted({
+                table for table in _seq_scans(plan)
+                if strict or row_estimates.get(table, 0) >= min_rows
+            })
+            if tables:
+                failures[name] = tables
+
+    connection.rollback()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the database schema')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    upgrade_parser = commands.add_parser('upgrade',
+                                         help='apply pending migrations')
+    upgrade_parser.add_argument('--to', type=int, dest='target')
+
+    downgrade_parser = commands.add_parser('downgrade',
+                                           help='revert applied migrations')
+    downgrade_parser.add_argument('--to', type=int, dest='target', required=True,
+                                  help='version to keep, 0 reverts everything')
+
+    commands.add_parser('status', help='list migrations and when they ran')
+
+    explain_parser = commands.add_parser(
+        'explain', help='fail when a hot query plans a seq scan'
+    )
+    explain_parser.add_argument('--strict', action='store_true',
+                                help='plan with enable_seqscan off')
+    explain_parser.add_argument('--min-rows', type=int, default=EXPLAIN_MIN_ROWS,
+                                help='ignore seq scans on smaller tables')
+
+    args = parser.parse_args()
+    connection = db_service.connect()
+
+    try:
+        if args.command == 'upgrade':
+            if not upgrade(connection, args.target):
+                print('Nothing to apply')
+        elif args.command == 'downgrade':
+            if not downgrade(connection, args.target):
+                print('Nothing to revert')
+        elif args.command == 'status':
+            for label, applied_at in status(connection):
+                state = applied_at.isoformat() if applied_at else 'pending'
+                print(f'{label:40} {state}')
+        elif args.command == 'explain':
+            failures = explain_hot_queries(connection, args.strict,
+                                           args.min_rows)
+            for name in HOT_QUERIES:
+                if name in failures:
+                    print(f'FAIL {name}: seq scan on {", ".join(failures[name])}')
+                else:
+                    print(f'ok   {name}')
+            if failures:
+                sys.exit(1)
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
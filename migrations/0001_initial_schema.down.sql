@@ -0,0 +1,9 @@
+DROP TABLE IF EXISTS list;
+DROP TABLE IF EXISTS comment;
+DROP TABLE IF EXISTS genre_of_game;
+DROP TABLE IF EXISTS genre;
+DROP TABLE IF EXISTS admin;
+DROP TABLE IF EXISTS users;
+DROP TABLE IF EXISTS game;
+DROP TABLE IF EXISTS publisher;
+DROP TABLE IF EXISTS developer;
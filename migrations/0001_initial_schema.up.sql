@@ -0,0 +1,65 @@
+-- Base schema. IF NOT EXISTS lets databases created before migrations
+-- existed adopt this version without changes.
+
+CREATE TABLE IF NOT EXISTS developer (
+    id_developer serial PRIMARY KEY,
+    studio_name varchar(255) NOT NULL,
+    country varchar(100)
+);
+
+CREATE TABLE IF NOT EXISTS publisher (
+    id_publisher serial PRIMARY KEY,
+    publisher_name varchar(255) NOT NULL,
+    country varchar(100)
+);
+
+CREATE TABLE IF NOT EXISTS game (
+    id_game serial PRIMARY KEY,
+    game_name varchar(255) NOT NULL,
+    description text,
+    release_date date,
+    rating numeric(4, 2) NOT NULL DEFAULT 0,
+    id_developer integer NOT NULL REFERENCES developer (id_developer),
+    id_publisher integer REFERENCES publisher (id_publisher)
+        ON DELETE SET NULL
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    id_user serial PRIMARY KEY,
+    username varchar(50) NOT NULL UNIQUE,
+    password varchar(64) NOT NULL,
+    email varchar(255) NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS admin (
+    id serial PRIMARY KEY,
+    login varchar(50) NOT NULL UNIQUE,
+    password varchar(64) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS genre (
+    id_genre serial PRIMARY KEY,
+    genre_name varchar(100) NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS genre_of_game (
+    id_game integer NOT NULL REFERENCES game (id_game) ON DELETE CASCADE,
+    id_genre integer NOT NULL REFERENCES genre (id_genre) ON DELETE CASCADE,
+    PRIMARY KEY (id_game, id_genre)
+);
+
+CREATE TABLE IF NOT EXISTS comment (
+    id_game integer NOT NULL REFERENCES game (id_game) ON DELETE CASCADE,
+    id_user integer NOT NULL REFERENCES users (id_user) ON DELETE CASCADE,
+    text text NOT NULL,
+    PRIMARY KEY (id_game, id_user)
+);
+
+CREATE TABLE IF NOT EXISTS list (
+    id_game integer NOT NULL REFERENCES game (id_game) ON DELETE CASCADE,
+    id_user integer NOT NULL REFERENCES users (id_user) ON DELETE CASCADE,
+    list_type varchar(20) NOT NULL
+        CHECK (list_type IN ('planned', 'playing', 'postponed', 'completed')),
+    rated numeric(3, 1) CHECK (rated BETWEEN 1 AND 10),
+    PRIMARY KEY (id_game, id_user)
+);
@@ -0,0 +1,10 @@
+DROP INDEX IF EXISTS genre_of_game_genre_idx;
+DROP INDEX IF EXISTS list_user_idx;
+DROP INDEX IF EXISTS comment_user_idx;
+DROP INDEX IF EXISTS publisher_publisher_name_idx;
+DROP INDEX IF EXISTS developer_studio_name_idx;
+DROP INDEX IF EXISTS game_name_developer_idx;
+DROP INDEX IF EXISTS game_publisher_idx;
+DROP INDEX IF EXISTS game_developer_idx;
+DROP INDEX IF EXISTS game_release_date_idx;
+DROP INDEX IF EXISTS game_rating_idx;
@@ -0,0 +1,35 @@
+-- Indexes shaped after the db_service queries. The primary keys of comment,
+-- list and genre_of_game already lead with id_game, and the UNIQUE
+-- constraints cover users.username and admin.login; everything else the
+-- read paths filter, join or sort on is listed here.
+
+-- get_games_page / get_all_games: range filters and keyset ordering on
+-- rating and release_date, always tie-broken by id_game.
+CREATE INDEX IF NOT EXISTS game_rating_idx ON game (rating, id_game);
+CREATE INDEX IF NOT EXISTS game_release_date_idx
+    ON game (release_date, id_game);
+
+-- id_developer / id_publisher filters, developer_detail/publisher_detail and
+-- the foreign keys themselves (deleting a developer or publisher).
+CREATE INDEX IF NOT EXISTS game_developer_idx ON game (id_developer, id_game);
+CREATE INDEX IF NOT EXISTS game_publisher_idx ON game (id_publisher, id_game);
+
+-- bulk_import matches existing rows on their natural keys.
+CREATE INDEX IF NOT EXISTS game_name_developer_idx
+    ON game (game_name, id_developer);
+CREATE INDEX IF NOT EXISTS developer_studio_name_idx
+    ON developer (studio_name);
+CREATE INDEX IF NOT EXISTS publisher_publisher_name_idx
+    ON publisher (publisher_name);
+
+-- get_comments(id_user=...) on the user page and delete_user.
+CREATE INDEX IF NOT EXISTS comment_user_idx ON comment (id_user, id_game);
+
+-- get_list(id_user=...) on the user page, the lists export and delete_user;
+-- covering so the list columns come from the index.
+CREATE INDEX IF NOT EXISTS list_user_idx
+    ON list (id_user, id_game) INCLUDE (list_type, rated);
+
+-- get_genre_of_game(id_genre=...) on the genre page.
+CREATE INDEX IF NOT EXISTS genre_of_game_genre_idx
+    ON genre_of_game (id_genre, id_game);
@@ -0,0 +1,2 @@
+DROP INDEX IF EXISTS game_name_trgm_idx;
+DROP INDEX IF EXISTS game_search_vector_idx;
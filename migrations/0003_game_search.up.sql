@@ -0,0 +1,11 @@
+-- Indexes behind db_service.search_games and the search_text filter.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS game_search_vector_idx ON game USING GIN ((
+    setweight(to_tsvector('simple', coalesce(game_name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+));
+
+CREATE INDEX IF NOT EXISTS game_name_trgm_idx
+    ON game USING GIN (game_name gin_trgm_ops);
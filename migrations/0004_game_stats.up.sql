@@ -0,0 +1,48 @@
+-- Per-game aggregates maintained incrementally by db_service
+-- (add_list, update_list, delete_list, add_comment, delete_comment,
+-- add_game, delete_user). db_service.refresh_game_stats() rebuilds them.
+
+CREATE TABLE IF NOT EXISTS game_stats (
+    id_game integer PRIMARY KEY REFERENCES game (id_game) ON DELETE CASCADE,
+    rating_sum numeric NOT NULL DEFAULT 0,
+    rating_count integer NOT NULL DEFAULT 0,
+    avg_rating numeric GENERATED ALWAYS AS (
+        CASE WHEN rating_count > 0
+            THEN round(rating_sum / rating_count, 2)
+            ELSE 0
+        END
+    ) STORED,
+    planned_count integer NOT NULL DEFAULT 0,
+    playing_count integer NOT NULL DEFAULT 0,
+    postponed_count integer NOT NULL DEFAULT 0,
+    completed_count integer NOT NULL DEFAULT 0,
+    list_count integer GENERATED ALWAYS AS (
+        planned_count + playing_count + postponed_count + completed_count
+    ) STORED,
+    comment_count integer NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS game_stats_avg_rating_idx
+    ON game_stats (avg_rating, id_game);
+CREATE INDEX IF NOT EXISTS game_stats_list_count_idx
+    ON game_stats (list_count, id_game);
+
+INSERT INTO game_stats (id_game, rating_sum, rating_count, planned_count,
+    playing_count, postponed_count, completed_count, comment_count)
+SELECT game.id_game, coalesce(lists.rating_sum, 0),
+    coalesce(lists.rating_count, 0), coalesce(lists.planned_count, 0),
+    coalesce(lists.playing_count, 0), coalesce(lists.postponed_count, 0),
+    coalesce(lists.completed_count, 0), coalesce(comments.comment_count, 0)
+FROM game
+LEFT JOIN (
+    SELECT id_game, sum(rated) AS rating_sum, count(rated) AS rating_count,
+    count(*) FILTER (WHERE list_type = 'planned') AS planned_count,
+    count(*) FILTER (WHERE list_type = 'playing') AS playing_count,
+    count(*) FILTER (WHERE list_type = 'postponed') AS postponed_count,
+    count(*) FILTER (WHERE list_type = 'completed') AS completed_count
+    FROM list GROUP BY id_game
+) AS lists ON game.id_game = lists.id_game
+LEFT JOIN (
+    SELECT id_game, count(*) AS comment_count FROM comment GROUP BY id_game
+) AS comments ON game.id_game = comments.id_game
+ON CONFLICT (id_game) DO NOTHING;
@@ -0,0 +1 @@
+DROP MATERIALIZED VIEW IF EXISTS game_leaderboard;
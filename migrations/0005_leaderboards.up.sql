@@ -0,0 +1,46 @@
+-- Precomputed top-N leaderboards read by db_service.get_leaderboard and
+-- refreshed concurrently by db_service.refresh_leaderboards.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS game_leaderboard AS
+WITH scoped AS (
+    SELECT 'all' AS scope, 0 AS scope_id, game_stats.*
+    FROM game_stats
+    UNION ALL
+    SELECT 'genre', genre_of_game.id_genre, game_stats.*
+    FROM game_stats
+    JOIN genre_of_game ON game_stats.id_game = genre_of_game.id_game
+    UNION ALL
+    SELECT 'developer', game.id_developer, game_stats.*
+    FROM game_stats
+    JOIN game ON game_stats.id_game = game.id_game
+    UNION ALL
+    SELECT 'publisher', game.id_publisher, game_stats.*
+    FROM game_stats
+    JOIN game ON game_stats.id_game = game.id_game
+    WHERE game.id_publisher IS NOT NULL
+), boards AS (
+    SELECT 'top_rated' AS board, scope, scope_id, id_game,
+    avg_rating AS score,
+    row_number() OVER (PARTITION BY scope, scope_id
+                       ORDER BY avg_rating DESC, rating_count DESC, id_game)
+        AS rank
+    FROM scoped WHERE rating_count > 0
+    UNION ALL
+    SELECT 'most_planned', scope, scope_id, id_game, planned_count,
+    row_number() OVER (PARTITION BY scope, scope_id
+                       ORDER BY planned_count DESC, id_game)
+    FROM scoped WHERE planned_count > 0
+    UNION ALL
+    SELECT 'most_completed', scope, scope_id, id_game, completed_count,
+    row_number() OVER (PARTITION BY scope, scope_id
+                       ORDER BY completed_count DESC, id_game)
+    FROM scoped WHERE completed_count > 0
+)
+SELECT board, scope, scope_id, rank, id_game, score
+FROM boards
+WHERE rank <= 100;
+
+-- REFRESH ... CONCURRENTLY needs a unique index; it also serves the top-N
+-- range reads.
+CREATE UNIQUE INDEX IF NOT EXISTS game_leaderboard_key
+    ON game_leaderboard (board, scope, scope_id, rank);
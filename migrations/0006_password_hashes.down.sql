@@ -0,0 +1,4 @@
+-- Fails while any KDF hash longer than 64 characters is stored.
+
+ALTER TABLE admin ALTER COLUMN password TYPE varchar(64);
+ALTER TABLE users ALTER COLUMN password TYPE varchar(64);
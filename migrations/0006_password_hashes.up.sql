@@ -0,0 +1,5 @@
+-- Salted KDF hashes ($argon2id$..., $scrypt$...) do not fit the 64 characters
+-- of the old SHA-256 hex digests. Those are rehashed on the next login.
+
+ALTER TABLE users ALTER COLUMN password TYPE varchar(255);
+ALTER TABLE admin ALTER COLUMN password TYPE varchar(255);
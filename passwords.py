@@ -0,0 +1,299 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from cache import MISSING, MemoryCache
+
+try:
+    import argon2
+except ImportError:
+    argon2 = None
+
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 32))
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 5))
+PASSWORD_CACHE_SIZE = int(os.getenv('PASSWORD_CACHE_SIZE', 1024))
+PASSWORD_CACHE_TTL = float(os.getenv('PASSWORD_CACHE_TTL', 300))
+
+
+class HashingBusy(RuntimeError):
+    pass
+
+
+class Hasher:
+    name = None
+
+    def identify(self, encoded):
+        raise NotImplementedError
+
+    def hash(self, password):
+        raise NotImplementedError
+
+    def verify(self, password, encoded):
+        raise NotImplementedError
+
+    def needs_rehash(self, encoded):
+        return False
+
+
+class LegacySha256Hasher(Hasher):
+    # Unsalted SHA-256 hex digests from before the KDFs. add_admin stored them
+    # lowercase and everything else uppercase. Only ever verified.
+    name = 'sha256'
+    pattern = re.compile(r'^[0-9a-fA-F]{64}$')
+
+    def identify(self, encoded):
+        return bool(self.pattern.match(encoded))
+
+    def hash(self, password):
+        raise NotImplementedError('New passwords are never stored as SHA-256')
+
+    def verify(self, password, encoded):
+        digest = hashlib.sha256(password.encode('utf-8')).hexdigest()
+        return hmac.compare_digest(digest, encoded.lower())
+
+
+def _b64encode(value):
+    return base64.b64encode(value).decode('ascii').rstrip('=')
+
+
+def _b64decode(value):
+    return base64.b64decode(value + '=' * (-len(value) % 4))
+
+
+class ScryptHasher(Hasher):
+    # $scrypt$ln=14,r=8,p=1$<salt>$<key>
+    name = 'scrypt'
+    salt_bytes = 16
+    key_bytes = 32
+
+    def __init__(self, log_n=14, r=8, p=1):
+        self.log_n = log_n
+        self.r = r
+        self.p = p
+
+    def identify(self, encoded):
+        return encoded.startswith('$scrypt$')
+
+    def _derive(self, password, salt, log_n, r, p):
+        n = 1 << log_n
+        return hashlib.scrypt(
+            password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+            maxmem=256 * n * r * p, dklen=self.key_bytes
+        )
+
+    def hash(self, password):
+        salt = secrets.token_bytes(self.salt_bytes)
+        key = self._derive(password, salt, self.log_n, self.r, self.p)
+        return (f'$scrypt$ln={self.log_n},r={self.r},p={self.p}'
+                f'${_b64encode(salt)}${_b64encode(key)}')
+
+    def _parse(self, encoded):
+        _, _, params, salt, key = encoded.split('$')
+        params = dict(item.split('=') for item in params.split(','))
+        return (int(params['ln']), int(params['r']), int(params['p']),
+                _b64decode(salt), _b64decode(key))
+
+    def verify(self, password, encoded):
+        try:
+            log_n, r, p, salt, key = self._parse(encoded)
+        except (ValueError, KeyError):
+            return False
+        return hmac.compare_digest(
+            self._derive(password, salt, log_n, r, p), key
+        )
+
+    def needs_rehash(self, encoded):
+        log_n, r, p, _, _ = self._parse(encoded)
+        return (log_n, r, p) != (self.log_n, self.r, self.p)
+
+
+class Argon2Hasher(Hasher):
+    name = 'argon2id'
+
+    def __init__(self, time_cost=3, memory_cost=65536, parallelism=1):
+        if argon2 is None:
+            raise RuntimeError('argon2-cffi is not installed')
+
+        self._hasher = argon2.PasswordHasher(
+            time_cost=time_cost, memory_cost=memory_cost,
+            parallelism=parallelism, type=argon2.Type.ID
+        )
+
+    def identify(self, encoded):
+        return encoded.startswith('$argon2id$')
+
+    def hash(self, password):
+        return self._hasher.hash(password)
+
+    def verify(self, password, encoded):
+        try:
+            return self._hasher.verify(encoded, password)
+        except argon2.exceptions.VerificationError:
+            return False
+        except argon2.exceptions.InvalidHashError:
+            return False
+
+    def needs_rehash(self, encoded):
+        return self._hasher.check_needs_rehash(encoded)
+
+
+def make_hasher(name=None):
+    name = name or os.getenv('PASSWORD_HASHER')
+    if name is None:
+        name = 'argon2id' if argon2 is not None else 'scrypt'
+
+    if name == 'argon2id':
+        return Argon2Hasher(
+            time_cost=int(os.getenv('PASSWORD_ARGON2_TIME_COST', 3)),
+            memory_cost=int(os.getenv('PASSWORD_ARGON2_MEMORY_KIB', 65536)),
+            parallelism=int(os.getenv('PASSWORD_ARGON2_PARALLELISM', 1)),
+        )
+    if name == 'scrypt':
+        return ScryptHasher(
+            log_n=int(os.getenv('PASSWORD_SCRYPT_LOG_N', 14)),
+            r=int(os.getenv('PASSWORD_SCRYPT_R', 8)),
+            p=int(os.getenv('PASSWORD_SCRYPT_P', 1)),
+        )
+    raise ValueError(f'Unknown password hasher: {name}')
+
+
+class PasswordContext:
+    def __init__(self, hasher, workers=PASSWORD_HASH_WORKERS,
+                 queue=PASSWORD_HASH_QUEUE, timeout=PASSWORD_HASH_TIMEOUT,
+                 cache_size=PASSWORD_CACHE_SIZE, cache_ttl=PASSWORD_CACHE_TTL):
+        self.hasher = hasher
+        self.hashers = [hasher, LegacySha256Hasher()]
+        if argon2 is not None and not isinstance(hasher, Argon2Hasher):
+            self.hashers.append(Argon2Hasher())
+        if not isinstance(hasher, ScryptHasher):
+            self.hashers.append(ScryptHasher())
+
+        # KDFs are CPU and memory heavy on purpose. A few workers do all of
+        # it, and callers beyond the queue limit are turned away instead of
+        # piling up behind them.
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='password')
+        self._slots = threading.BoundedSemaphore(workers + queue)
+
+        # Successful checks are remembered under a keyed digest of the
+        # stored hash and the password, so a repeated login within the TTL
+        # skips the KDF. The key never leaves the process.
+        self._cache = (MemoryCache(max_entries=cache_size, ttl=cache_ttl)
+                       if cache_size else None)
+        self._cache_key = secrets.token_bytes(32)
+
+    def _submit(self, function, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HashingBusy('Too many password checks in progress')
+
+        try:
+            future = self._executor.submit(function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    @staticmethod
+    def _done(value):
+        future = Future()
+        future.set_result(value)
+        return future
+
+    def _hasher_for(self, encoded):
+        for hasher in self.hashers:
+            if hasher.identify(encoded):
+                return hasher
+        return None
+
+    def _verified_key(self, password, encoded):
+        return hmac.new(self._cache_key,
+                        f'{encoded}\0{password}'.encode('utf-8'),
+                        hashlib.sha256).digest()
+
+    def _verify(self, password, encoded):
+        hasher = self._hasher_for(encoded)
+        if hasher is None or not hasher.verify(password, encoded):
+            return False, None
+
+        # Legacy and outdated hashes are replaced by the caller while the
+        # plain password is at hand.
+        new_hash = None
+        if hasher is not self.hasher or hasher.needs_rehash(encoded):
+            new_hash = self.hasher.hash(password)
+        return True, new_hash
+
+    def hash_future(self, password):
+        return self._submit(self.hasher.hash, password)
+
+    def verify_future(self, password, encoded):
+        if not encoded:
+            return self._done((False, None))
+
+        cache_key = None
+        if self._cache is not None:
+            cache_key = self._verified_key(password, encoded)
+            if self._cache.get(cache_key) is not MISSING:
+                return self._done((True, None))
+
+        def verify():
+            verified, new_hash = self._verify(password, encoded)
+            if verified and new_hash is None and cache_key is not None:
+                self._cache.set(cache_key, True)
+            return verified, new_hash
+
+        return self._submit(verify)
+
+    def hash(self, password):
+        return self.hash_future(password).result()
+
+    def verify(self, password, encoded):
+        return self.verify_future(password, encoded).result()
+
+    async def hash_async(self, password):
+        return await asyncio.wrap_future(self.hash_future(password))
+
+    async def verify_async(self, password, encoded):
+        return await asyncio.wrap_future(self.verify_future(password, encoded))
+
+    def close(self):
+        self._executor.shutdown()
+
+    def stats(self):
+        return {
+            'hasher': self.hasher.name,
+            'cache': self._cache.stats() if self._cache is not None else None,
+        }
+
+
+_context = None
+_context_lock = threading.Lock()
+
+
+def get_context():
+    global _context
+
+    if _context is None:
+        with _context_lock:
+            if _context is None:
+                _context = PasswordContext(make_hasher())
+
+    return _context
+
+
+def hash_password(password):
+    return get_context().hash(password)
+
+
+def verify_password(password, encoded):
+    # Returns (verified, new_hash); new_hash is set when the stored hash
+    # should be replaced.
+    return get_context().verify(password, encoded)
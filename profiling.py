@@ -0,0 +1,194 @@
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import g, request, session, before_render_template, template_rendered
+
+import query_log
+
+SERVER_TIMING = os.getenv('SERVER_TIMING', '1') == '1'
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'profiles'
+))
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL_MS', 5)) / 1000
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', 30))
+PROFILE_FLAG = '_profile'
+PROFILE_NAME = re.compile(r'^[\w.-]+\.folded$')
+
+
+class Sampler:
+    # Statistical profiler for one thread: every interval the current stack
+    # of that thread is recorded, without tracing each call.
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL,
+                 max_seconds=PROFILE_MAX_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler',
+                                        daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        deadline = time.monotonic() + self.max_seconds
+        while (not self._stopped.wait(self.interval)
+               and time.monotonic() < deadline):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                name = getattr(code, 'co_qualname', code.co_name)
+                filename = os.path.basename(code.co_filename)
+                stack.append(f'{filename}:{name}:{code.co_firstlineno}')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+
+def write_folded(stacks, path):
+    # Collapsed stack format, one "root;...;leaf count" line per stack, as
+    # read by flamegraph.pl, speedscope and inferno.
+    with open(path, 'w') as output:
+        for stack, count in stacks.most_common():
+            output.write(f'{stack} {count}\n')
+
+
+class ProfileRequests:
+    def __init__(self):
+        self._armed = {}
+        self._lock = threading.Lock()
+
+    def arm(self, endpoint, count):
+        with self._lock:
+            if count > 0:
+                self._armed[endpoint] = count
+            else:
+                self._armed.pop(endpoint, None)
+
+    def take(self, endpoint):
+        with self._lock:
+            for key in (endpoint, '*'):
+                remaining = self._armed.get(key)
+                if remaining:
+                    if remaining == 1:
+                        del self._armed[key]
+                    else:
+                        self._armed[key] = remaining - 1
+                    return True
+        return False
+
+    def armed(self):
+        with self._lock:
+            return dict(self._armed)
+
+
+profile_requests = ProfileRequests()
+
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    return sorted((name for name in os.listdir(PROFILE_DIR)
+                   if PROFILE_NAME.match(name)), reverse=True)
+
+
+def profile_path(name):
+    if not PROFILE_NAME.match(name):
+        return None
+    return os.path.join(PROFILE_DIR, name)
+
+
+def _is_admin():
+    user = session.get('user')
+    return bool(user) and user.get('role') == 'admin'
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.render_seconds = 0.0
+    g.render_started = []
+    g.request_queries = query_log.track_request()
+
+    # Armed captures sample real traffic; the query flag is for admins only.
+    wanted = profile_requests.take(request.endpoint)
+    if not wanted and PROFILE_FLAG in request.args:
+        wanted = _is_admin()
+    g.sampler = Sampler(threading.get_ident()).start() if wanted else None
+
+
+def _finish_profile():
+    sampler = g.pop('sampler', None)
+    if sampler is None:
+        return None
+
+    stacks = sampler.stop()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = (f'{time.strftime("%Y%m%d-%H%M%S")}-'
+            f'{request.endpoint or "unknown"}-{uuid.uuid4().hex[:8]}.folded')
+    write_folded(stacks, os.path.join(PROFILE_DIR, name))
+    return name
+
+
+def _finish_request(response):
+    if 'request_started' not in g:
+        return response
+
+    profile = _finish_profile()
+    if profile is not None:
+        response.headers['X-Profile'] = profile
+
+    if SERVER_TIMING:
+        total = time.perf_counter() - g.request_started
+        queries = g.request_queries
+        # db sums the queries of parallel workers, so on pages that use
+        # run_in_parallel it can exceed their share of the wall time.
+        app_seconds = max(total - queries.seconds - g.render_seconds, 0.0)
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={queries.seconds * 1000:.1f};desc="{queries.count} queries", '
+            f'tpl;dur={g.render_seconds * 1000:.1f}, '
+            f'app;dur={app_seconds * 1000:.1f}, '
+            f'total;dur={total * 1000:.1f}'
+        )
+
+    return response
+
+
+def _teardown_request(exception):
+    sampler = g.pop('sampler', None)
+    if sampler is not None:
+        sampler.stop()
+    query_log.untrack_request()
+
+
+def _template_started(sender, template, context, **extra):
+    if 'render_started' in g:
+        g.render_started.append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    if g.get('render_started'):
+        g.render_seconds += time.perf_counter() - g.render_started.pop()
+
+
+def init_app(app):
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
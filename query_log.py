@@ -0,0 +1,235 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from psycopg2 import extensions
+
+SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 200)) / 1000
+SLOW_QUERY_LOG_SIZE = int(os.getenv('SLOW_QUERY_LOG_SIZE', 100))
+SLOW_QUERY_TEXT_LIMIT = 1000
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                    1.0, 2.5, 5.0)
+
+_context = contextvars.ContextVar('query_context', default=None)
+_request = contextvars.ContextVar('request_queries', default=None)
+
+
+class QueryContext:
+    __slots__ = ('function', 'wait')
+
+    def __init__(self, function):
+        self.function = function
+        self.wait = 0.0
+
+
+@contextmanager
+def query_context(function):
+    token = _context.set(QueryContext(function))
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def labelled(function):
+    # Queries run by the function are reported under its name, also when it
+    # is wrapped by caches or called through helpers.
+    name = function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with query_context(name):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def record_wait(seconds):
+    context = _context.get()
+    if context is not None:
+        context.wait += seconds
+
+
+class RequestQueries:
+    # Shared by the request thread and the query workers it hands reads to.
+    __slots__ = ('count', 'seconds', '_lock')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+
+
+def track_request():
+    queries = RequestQueries()
+    _request.set(queries)
+    return queries
+
+
+def untrack_request():
+    _request.set(None)
+
+
+def carry(function):
+    # Worker threads do not see the request's context variables, so the
+    # tracker is handed over explicitly.
+    queries = _request.get()
+    if queries is None:
+        return function
+
+    def run():
+        token = _request.set(queries)
+        try:
+            return function()
+        finally:
+            _request.reset(token)
+
+    return run
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, buckets, value):
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+class QueryLog:
+    def __init__(self, threshold=SLOW_QUERY_THRESHOLD,
+                 size=SLOW_QUERY_LOG_SIZE, buckets=DURATION_BUCKETS):
+        self.threshold = threshold
+        self.buckets = buckets
+        self._slow = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._durations = defaultdict(lambda: Histogram(self.buckets))
+            self._rows = defaultdict(int)
+            self._waits = defaultdict(float)
+            self._errors = defaultdict(int)
+            self._slow_count = defaultdict(int)
+            self._slow.clear()
+
+    def record(self, function, statement, seconds, rows, wait, query,
+               failed=False):
+        slow = seconds >= self.threshold
+
+        with self._lock:
+            self._durations[function].observe(self.buckets, seconds)
+            self._rows[function] += max(rows, 0)
+            self._waits[function] += wait
+            if failed:
+                self._errors[function] += 1
+            if slow:
+                self._slow_count[function] += 1
+                self._slow.append({
+                    'at': time.time(),
+                    'function': function,
+                    'statement': statement,
+                    'query': query[:SLOW_QUERY_TEXT_LIMIT],
+                    'seconds': seconds,
+                    'rows': rows,
+                    'wait_seconds': wait,
+                    'failed': failed,
+                })
+
+    def slow_queries(self):
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def render_metrics(self):
+        lines = []
+
+        with self._lock:
+            lines.append('# HELP db_query_duration_seconds Query time by '
+                         'db_service function.')
+            lines.append('# TYPE db_query_duration_seconds histogram')
+            for function, histogram in sorted(self._durations.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'db_query_duration_seconds_bucket{{'
+                                 f'function="{function}",le="{bound}"}} '
+                                 f'{cumulative}')
+                lines.append(f'db_query_duration_seconds_bucket{{'
+                             f'function="{function}",le="+Inf"}} '
+                             f'{histogram.count}')
+                lines.append(f'db_query_duration_seconds_sum{{'
+                             f'function="{function}"}} {histogram.total}')
+                lines.append(f'db_query_duration_seconds_count{{'
+                             f'function="{function}"}} {histogram.count}')
+
+            counters = [
+                ('db_query_rows_total', 'Rows returned or affected.',
+                 self._rows),
+                ('db_connection_wait_seconds_total',
+                 'Time spent waiting for a pooled connection.', self._waits),
+                ('db_query_errors_total', 'Queries that raised.',
+                 self._errors),
+                ('db_slow_queries_total',
+                 f'Queries slower than {self.threshold}s.', self._slow_count),
+            ]
+            for name, description, values in counters:
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} counter')
+                for function, value in sorted(values.items()):
+                    lines.append(f'{name}{{function="{function}"}} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+query_log = QueryLog()
+
+
+class InstrumentedCursor(extensions.cursor):
+    # Every query of the data layer goes through execute, so this is the one
+    # place where it is timed. statements.execute names the statement.
+    statement = None
+
+    def execute(self, query, vars=None):
+        failed = False
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+
+            context = _context.get()
+            function, wait = 'other', 0.0
+            if context is not None:
+                # The wait is charged to the first query of the scope only.
+                function, wait = context.function, context.wait
+                context.wait = 0.0
+
+            queries = _request.get()
+            if queries is not None:
+                queries.add(seconds)
+
+            if isinstance(query, bytes):
+                query = query.decode('utf-8', 'replace')
+            query_log.record(function, self.statement, seconds, self.rowcount,
+                             wait, str(query), failed)
@@ -0,0 +1,144 @@
+import functools
+from collections import namedtuple
+
+from query_log import InstrumentedCursor
+
+
+def build_rows(row_class, fetched, padding=()):
+    # tuple.__new__ skips the generated namedtuple __new__, which is where
+    # most of the per-row cost would go.
+    if padding:
+        fetched = [row + padding for row in fetched]
+    return list(map(functools.partial(tuple.__new__, row_class), fetched))
+
+
+class RowCursor(InstrumentedCursor):
+    row_class = None
+
+    def _padding(self):
+        missing = len(self.row_class._fields) - len(self.description)
+        if missing < 0:
+            raise ValueError(f'Query returns more columns than '
+                             f'{self.row_class.__name__} has fields')
+        return (None,) * missing
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is None:
+            return None
+        return tuple.__new__(self.row_class, row + self._padding())
+
+    def fetchmany(self, size=None):
+        return build_rows(self.row_class, super().fetchmany(size),
+                          self._padding())
+
+    def fetchall(self):
+        return build_rows(self.row_class, super().fetchall(),
+                          self._padding())
+
+    def __iter__(self):
+        iterator = super().__iter__()
+        try:
+            row = next(iterator)
+        except StopIteration:
+            return
+
+        row_class = self.row_class
+        padding = self._padding()
+        yield tuple.__new__(row_class, row + padding)
+        for row in iterator:
+            yield tuple.__new__(row_class, row + padding)
+
+
+class Row:
+    # Rows are tuples, so they cost no per-instance dict, but they also
+    # answer row['name'] and row.get('name') like the dicts they replace.
+    # Trailing columns a query does not select are None.
+    __slots__ = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.cursor = type(f'{cls.__name__}Cursor', (RowCursor,),
+                          {'row_class': cls})
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if key not in self._fields:
+            return default
+        return getattr(self, key)
+
+    def keys(self):
+        return self._fields
+
+
+def _fields(name, fields):
+    return namedtuple(name, fields, defaults=(None,) * len(fields))
+
+
+GAME_FIELDS = ['id_game', 'game_name', 'description', 'release_date', 'rating',
+               'developer', 'publisher', 'avg_rating', 'popularity']
+
+
+class Game(Row, _fields('Game', GAME_FIELDS)):
+    __slots__ = ()
+
+
+class GameDetail(Row, _fields('GameDetail', GAME_FIELDS + ['rating_count'])):
+    __slots__ = ()
+
+
+class GameSearchResult(Row, _fields('GameSearchResult',
+                                    GAME_FIELDS + ['search_rank'])):
+    __slots__ = ()
+
+
+class User(Row, _fields('User', ['id_user', 'username', 'password', 'email'])):
+    __slots__ = ()
+
+
+class Admin(Row, _fields('Admin', ['id', 'login', 'password'])):
+    __slots__ = ()
+
+
+class Developer(Row, _fields('Developer',
+                             ['id_developer', 'studio_name', 'country'])):
+    __slots__ = ()
+
+
+class Publisher(Row, _fields('Publisher',
+                             ['id_publisher', 'publisher_name', 'country'])):
+    __slots__ = ()
+
+
+class Genre(Row, _fields('Genre', ['id_genre', 'genre_name'])):
+    __slots__ = ()
+
+
+class GameGenre(Row, _fields('GameGenre',
+                             ['id_game', 'id_genre', 'game_name',
+                              'genre_name'])):
+    __slots__ = ()
+
+
+class Comment(Row, _fields('Comment', ['id_game', 'id_user', 'text',
+                                       'game_name', 'username'])):
+    __slots__ = ()
+
+
+class ListEntry(Row, _fields('ListEntry', ['id_game', 'id_user', 'list_type',
+                                           'rated', 'game_name',
+                                           'username'])):
+    __slots__ = ()
+
+
+class LeaderboardEntry(Row, _fields('LeaderboardEntry', [
+    'rank', 'score', 'id_game', 'game_name', 'developer', 'publisher',
+])):
+    __slots__ = ()
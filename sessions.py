@@ -0,0 +1,224 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from cache import MISSING, MemoryCache
+
+SESSION_STORE = os.getenv('SESSION_STORE', 'memory')
+SESSION_MAX_ENTRIES = int(os.getenv('SESSION_MAX_ENTRIES', 10000))
+SESSION_TTL = float(os.getenv('SESSION_TTL', 14 * 24 * 3600))
+SESSION_SQLITE_PATH = os.getenv('SESSION_SQLITE_PATH', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'sessions.sqlite3'
+))
+SESSION_ID_BYTES = 32
+
+
+def session_owner(data):
+    # 'user:5' or 'admin:1'; the ids of both tables overlap.
+    user = data.get('user') or {}
+    if not user.get('id_user'):
+        return None
+    return f'{user.get("role")}:{user["id_user"]}'
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.owner = session_owner(self)
+
+
+class SessionStore:
+    def get(self, sid):
+        raise NotImplementedError
+
+    def set(self, sid, owner, data):
+        raise NotImplementedError
+
+    def delete(self, sid):
+        raise NotImplementedError
+
+    def revoke(self, owner):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+class MemorySessionStore(SessionStore):
+    # LRU with an idle timeout; sessions are lost on restart and are not
+    # shared between worker processes.
+    def __init__(self, max_entries=SESSION_MAX_ENTRIES, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._cache = MemoryCache(max_entries=max_entries, ttl=ttl)
+
+    def get(self, sid):
+        entry = self._cache.get(sid)
+        if entry is MISSING:
+            return None
+        # Refreshing the expiry is as cheap as reading here.
+        self._cache.set(sid, entry)
+        return entry[1]
+
+    def set(self, sid, owner, data):
+        self._cache.set(sid, (owner, data))
+
+    def delete(self, sid):
+        self._cache.delete(sid)
+
+    def revoke(self, owner):
+        return self._cache.delete_matching(lambda entry: entry[0] == owner)
+
+    def stats(self):
+        return dict(self._cache.stats(), store='memory')
+
+
+class SqliteSessionStore(SessionStore):
+    # Survives restarts and is shared by the processes of one host.
+    def __init__(self, path=SESSION_SQLITE_PATH, ttl=SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute('''CREATE TABLE IF NOT EXISTS sessions (
+                sid TEXT PRIMARY KEY,
+                owner TEXT,
+                data BLOB NOT NULL,
+                expires_at REAL NOT NULL
+            )''')
+            connection.execute('CREATE INDEX IF NOT EXISTS sessions_owner '
+                               'ON sessions (owner)')
+            connection.execute('DELETE FROM sessions WHERE expires_at <= ?',
+                               (time.time(),))
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def get(self, sid):
+        row = self._connection().execute(
+            'SELECT data, expires_at FROM sessions WHERE sid = ?', (sid,)
+        ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+
+        # Reads are not written back; the expiry is pushed forward only once
+        # half of the idle timeout has passed.
+        if row[1] - time.time() < self.ttl / 2:
+            self.touch(sid)
+        return row[0]
+
+    def set(self, sid, owner, data):
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO sessions (sid, owner, data, expires_at) '
+                'VALUES (?, ?, ?, ?)', (sid, owner, data, time.time() + self.ttl)
+            )
+
+    def touch(self, sid):
+        with self._connection() as connection:
+            connection.execute(
+                'UPDATE sessions SET expires_at = ? WHERE sid = ?',
+                (time.time() + self.ttl, sid)
+            )
+
+    def delete(self, sid):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def revoke(self, owner):
+        with self._connection() as connection:
+            return connection.execute('DELETE FROM sessions WHERE owner = ?',
+                                      (owner,)).rowcount
+
+    def stats(self):
+        entries, = self._connection().execute(
+            'SELECT count(*) FROM sessions WHERE expires_at > ?', (time.time(),)
+        ).fetchone()
+        return {'store': 'sqlite', 'entries': entries}
+
+
+def make_store(name=SESSION_STORE):
+    if name == 'memory':
+        return MemorySessionStore()
+    if name == 'sqlite':
+        return SqliteSessionStore()
+    raise ValueError(f'Unknown session store: {name}')
+
+
+class ServerSessionInterface(SessionInterface):
+    # The cookie holds only a random id. The session is written back only
+    # when a request changed it, so most responses carry no Set-Cookie.
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.get(sid)
+            if data is not None:
+                return ServerSession(self.serializer.loads(data), sid=sid)
+
+        return ServerSession(new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session.modified:
+            return
+
+        if not session:
+            if session.sid is not None:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        # A new id whenever the logged-in identity changes, so an id known
+        # before the login is worthless after it.
+        owner = session_owner(session)
+        if session.sid is None or owner != session.owner:
+            if session.sid is not None:
+                self.store.delete(session.sid)
+            session.sid = secrets.token_urlsafe(SESSION_ID_BYTES)
+            session.new = True
+        elif self.store.get(session.sid) is None:
+            # Revoked or expired while the request ran.
+            response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        self.store.set(session.sid, owner, self.serializer.dumps(dict(session)))
+        if session.new or session.permanent:
+            response.set_cookie(
+                name, session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain, path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+    def revoke(self, role, id_user):
+        return self.store.revoke(f'{role}:{id_user}')
+
+    def stats(self):
+        return self.store.stats()
@@ -0,0 +1,140 @@
+import itertools
+import re
+import threading
+import time
+
+import psycopg2
+import psycopg2.errors
+from psycopg2 import extensions
+
+STATEMENT_NAME = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+
+def numbered(query):
+    counter = itertools.count(1)
+    query = re.sub(r'(?<!%)%s', lambda _: f'${next(counter)}', query)
+    return query.replace('%%', '%')
+
+
+class PreparingConnection(extensions.connection):
+    # Prepared statements live as long as the server session, so the names
+    # prepared so far are tracked on the connection object itself.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+class Statement:
+    __slots__ = ('name', 'query', 'param_count', 'prepare_query',
+                 'execute_query')
+
+    def __init__(self, name, query):
+        if not STATEMENT_NAME.match(name):
+            raise ValueError(f'Invalid statement name: {name}')
+
+        self.name = name
+        self.query = query
+        self.param_count = len(re.findall(r'(?<!%)%s', query))
+        self.prepare_query = f'PREPARE {name} AS {numbered(query)}'
+        self.execute_query = f'EXECUTE {name}'
+        if self.param_count:
+            placeholders = ', '.join(['%s'] * self.param_count)
+            self.execute_query += f' ({placeholders})'
+
+
+class StatementRegistry:
+    def __init__(self):
+        self._statements = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, query):
+        with self._lock:
+            statement = self._statements.get(name)
+            if statement is not None:
+                if statement.query != query:
+                    raise ValueError(f'Statement {name} is already registered')
+                return statement
+
+            statement = Statement(name, query)
+            self._statements[name] = statement
+            self._stats[name] = {'calls': 0, 'prepares': 0,
+                                 'total_seconds': 0.0, 'max_seconds': 0.0}
+            return statement
+
+    def register_filtered(self, name, query, filters):
+        # One statement per combination of equality filters, named after the
+        # columns it filters on: get_list, get_list_by_id_user, ...
+        for size in range(len(filters) + 1):
+            for keys in itertools.combinations(filters, size):
+                filtered_query = query
+                if keys:
+                    filtered_query += '\nWHERE ' + ' AND '.join(
+                        f'{filters[key]} = %s' for key in keys
+                    )
+                self.register(self.filtered_name(name, keys), filtered_query)
+
+    @staticmethod
+    def filtered_name(name, keys):
+        if not keys:
+            return name
+        return name + '_by_' + '_'.join(keys)
+
+    def filtered(self, name, **filters):
+        keys = [key for key, value in filters.items() if value is not None]
+        return (self.filtered_name(name, keys),
+                tuple(filters[key] for key in keys))
+
+    def get(self, name):
+        return self._statements[name]
+
+    def execute(self, cursor, name, params=()):
+        statement = self._statements[name]
+        connection = cursor.connection
+        prepared = getattr(connection, 'prepared', None)
+        prepares = 0
+        if hasattr(cursor, 'statement'):
+            cursor.statement = name
+        started = time.perf_counter()
+
+        if prepared is None:
+            cursor.execute(statement.query, params)
+        else:
+            if name not in prepared:
+                cursor.execute(statement.prepare_query)
+                prepared.add(name)
+                prepares = 1
+
+            try:
+                cursor.execute(statement.execute_query, params)
+            except psycopg2.errors.InvalidSqlStatementName:
+                # Something deallocated it server-side; prepare again next time.
+                prepared.discard(name)
+                raise
+
+        elapsed = time.perf_counter() - started
+        if hasattr(cursor, 'statement'):
+            cursor.statement = None
+        with self._lock:
+            stats = self._stats[name]
+            stats['calls'] += 1
+            stats['prepares'] += prepares
+            stats['total_seconds'] += elapsed
+            stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+
+    def stats(self):
+        with self._lock:
+            stats = {}
+            for name, values in self._stats.items():
+                if not values['calls']:
+                    continue
+                stats[name] = dict(
+                    values, mean_seconds=values['total_seconds'] / values['calls']
+                )
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            for values in self._stats.values():
+                values.update(calls=0, prepares=0, total_seconds=0.0,
+                              max_seconds=0.0)
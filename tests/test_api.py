@@ -0,0 +1,44 @@
+import datetime
+
+import pytest
+
+import app as app_module
+import db_service
+
+
+@pytest.fixture
+def client(monkeypatch):
+    calls = []
+
+    def get_games_page(*args, **kwargs):
+        calls.append(kwargs)
+        return db_service.GamesPage(games=[])
+
+    monkeypatch.setattr(db_service, 'get_games_page', get_games_page)
+    monkeypatch.setattr(db_service, 'begin_unit_of_work', lambda: None)
+    monkeypatch.setattr(db_service, 'commit_unit_of_work',
+                        lambda success: None)
+    monkeypatch.setattr(db_service, 'end_unit_of_work', lambda: None)
+
+    client = app_module.app.test_client()
+    client.calls = calls
+    return client
+
+
+def test_release_dates_are_parsed(client):
+    response = client.get('/api/v1/games?min_release_date=2020-01-01'
+                          '&max_release_date=2021-12-31')
+
+    assert response.status_code == 200
+    assert client.calls[0]['min_release_date'] == datetime.date(2020, 1, 1)
+    assert client.calls[0]['max_release_date'] == datetime.date(2021, 12, 31)
+
+
+@pytest.mark.parametrize('value', ['yesterday', '2020-13-01', '2020-02-30'])
+def test_invalid_release_date_is_a_bad_request(client, value):
+    response = client.get(f'/api/v1/games?min_release_date={value}')
+
+    assert response.status_code == 400
+    assert response.get_json()['error']['message'] == \
+        'Invalid value for min_release_date'
+    assert client.calls == []
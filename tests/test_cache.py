@@ -0,0 +1,33 @@
+import threading
+
+from cache import MemoryCache, ReadThroughCache
+
+
+def test_load_overlapping_an_invalidation_is_not_stored():
+    cache = ReadThroughCache(MemoryCache())
+    loading = threading.Event()
+    invalidated = threading.Event()
+
+    def stale_loader():
+        loading.set()
+        invalidated.wait(5)
+        return 'old'
+
+    reader = threading.Thread(
+        target=lambda: cache.get_or_load('genres', stale_loader)
+    )
+    reader.start()
+    loading.wait(5)
+    cache.invalidate('genres')
+    invalidated.set()
+    reader.join(5)
+
+    assert cache.get_or_load('genres', lambda: 'new') == 'new'
+
+
+def test_loaded_value_is_stored():
+    cache = ReadThroughCache(MemoryCache())
+    cache.invalidate('genres')
+
+    assert cache.get_or_load('genres', lambda: 'first') == 'first'
+    assert cache.get_or_load('genres', lambda: 'second') == 'first'
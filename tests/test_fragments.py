@@ -0,0 +1,42 @@
+import jinja2
+
+import fragments
+from cache import MemoryCache, ReadThroughCache
+from versions import EntityVersions, MemoryVersionStore
+
+TEMPLATE = "{% cache 'genres', depends=['genres'] %}{{ load() }}{% endcache %}"
+
+
+def make_environment(versions):
+    environment = jinja2.Environment(
+        extensions=[fragments.FragmentCacheExtension]
+    )
+    environment.fragment_cache = ReadThroughCache(MemoryCache())
+    environment.fragment_versions = versions
+    return environment.from_string(TEMPLATE)
+
+
+def test_snapshot_ignores_later_bumps():
+    versions = EntityVersions(MemoryVersionStore())
+    snapshot = versions.snapshot()
+    versions.bump('genres')
+
+    assert snapshot.stamp(['genres'])[0] == [versions.store.token, 0]
+    assert versions.stamp(['genres'])[0] == [versions.store.token, 1]
+
+
+def test_write_during_a_render_does_not_file_old_content_as_new():
+    versions = EntityVersions(MemoryVersionStore())
+    request_versions = versions.snapshot()
+    template = make_environment(lambda: request_versions)
+
+    def load_then_write():
+        # The view read the rows, then another request wrote and bumped.
+        versions.bump('genres')
+        return 'old'
+
+    assert template.render(load=load_then_write) == 'old'
+
+    request_versions = versions.snapshot()
+    assert template.render(load=lambda: 'new') == 'new'
+    assert template.render(load=lambda: 'unused') == 'new'
@@ -0,0 +1,172 @@
+import sqlite3
+from contextlib import contextmanager
+
+import pytest
+
+import db_service
+
+# (id_game, release_date, list_count); None is a game without a date or stats.
+GAMES = [
+    (1, '2020-01-01', 5),
+    (2, None, None),
+    (3, '2019-06-01', 1),
+    (4, None, 2),
+    (5, '2020-01-01', None),
+    (6, '2021-03-15', 7),
+    (7, None, None),
+]
+
+
+class Cursor:
+    # Runs the generated PostgreSQL on SQLite, which understands the same
+    # row comparisons and NULLS FIRST/LAST.
+    def __init__(self, connection, cursor_factory):
+        self._cursor = connection.cursor()
+        self._row_class = getattr(cursor_factory, 'row_class', None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._cursor.close()
+
+    def execute(self, query, args=()):
+        self._cursor.execute(query.replace('%s', '?'), args)
+
+    def fetchall(self):
+        found = self._cursor.fetchall()
+        if self._row_class is None:
+            return found
+        return [self._row_class(*row) for row in found]
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+
+class Connection:
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, cursor_factory=None):
+        return Cursor(self._connection, cursor_factory)
+
+
+@pytest.fixture
+def games_db(monkeypatch):
+    connection = sqlite3.connect(':memory:')
+    connection.executescript('''
+        CREATE TABLE developer (id_developer INTEGER, studio_name TEXT);
+        CREATE TABLE publisher (id_publisher INTEGER, publisher_name TEXT);
+        CREATE TABLE game (id_game INTEGER, game_name TEXT, description TEXT,
+                           release_date TEXT, rating NUMERIC,
+                           id_developer INTEGER, id_publisher INTEGER);
+        CREATE TABLE game_stats (id_game INTEGER, avg_rating NUMERIC,
+                                 list_count INTEGER);
+    ''')
+    for id_game, release_date, list_count in GAMES:
+        connection.execute(
+            'INSERT INTO game VALUES (?, ?, NULL, ?, NULL, NULL, NULL)',
+            (id_game, f'Game {id_game}', release_date)
+        )
+        if list_count is not None:
+            connection.execute('INSERT INTO game_stats VALUES (?, NULL, ?)',
+                               (id_game, list_count))
+
+    @contextmanager
+    def connection_scope():
+        yield Connection(connection)
+
+    monkeypatch.setattr(db_service, 'connection_scope', connection_scope)
+    yield connection
+    connection.close()
+
+
+def walk(order_by, order_direction, page_size=2):
+    pages = []
+    cursor = None
+    while True:
+        page = db_service._get_games_page(order_by, order_direction, cursor,
+                                          None, page_size, False)
+        pages.append(page)
+        if page.next_cursor is None:
+            return pages
+        cursor = page.next_cursor
+
+
+def ids(page):
+    return [game.id_game for game in page.games]
+
+
+@pytest.mark.parametrize('order_by, order_direction, expected', [
+    ('release_date', 'asc', [3, 1, 5, 6, 2, 4, 7]),
+    ('release_date', 'desc', [6, 5, 1, 3, 7, 4, 2]),
+    ('popularity', 'asc', [3, 4, 1, 6, 2, 5, 7]),
+    ('popularity', 'desc', [6, 1, 4, 3, 7, 5, 2]),
+])
+def test_cursor_pages_include_games_without_a_sort_key(
+        games_db, order_by, order_direction, expected):
+    for page_size in (1, 2, 3):
+        pages = walk(order_by, order_direction, page_size)
+        assert [id_game for page in pages for id_game in ids(page)] == expected
+
+
+@pytest.mark.parametrize('order_by, order_direction', [
+    ('release_date', 'asc'),
+    ('release_date', 'desc'),
+    ('popularity', 'asc'),
+])
+def test_prev_cursor_walks_back_across_null_keys(games_db, order_by,
+                                                 order_direction):
+    pages = walk(order_by, order_direction)
+
+    for index in range(len(pages) - 1, 0, -1):
+        previous = db_service._get_games_page(
+            order_by, order_direction, pages[index].prev_cursor, None, 2,
+            False
+        )
+        assert ids(previous) == ids(pages[index - 1])
+
+
+@pytest.mark.parametrize('order_by, order_direction', [
+    ('foo', 'asc'),
+    ('rating', 'sideways'),
+    ('rating', 'DESC'),
+])
+def test_unknown_ordering_is_rejected(order_by, order_direction):
+    with pytest.raises(ValueError):
+        db_service.get_games_page(order_by=order_by,
+                                  order_direction=order_direction)
+
+
+@pytest.mark.parametrize('order_by, order_direction, expected', [
+    ('release_date', 'asc', [3, 1, 5, 6, 2, 4, 7]),
+    ('popularity', 'desc', [6, 1, 4, 3, 7, 5, 2]),
+])
+def test_numbered_pages_continue_into_games_without_a_sort_key(
+        games_db, order_by, order_direction, expected):
+    for page_size in (1, 2, 3):
+        found = []
+        for page in range(1, len(GAMES) // page_size + 3):
+            found += ids(db_service._get_games_page(
+                order_by, order_direction, None, page, page_size, False
+            ))
+        assert found == expected
+
+
+@pytest.mark.parametrize('order_by', ['rating', 'release_date', 'avg_rating',
+                                      'popularity'])
+@pytest.mark.parametrize('order_direction', ['asc', 'desc'])
+@pytest.mark.parametrize('backwards', [False, True])
+def test_keyset_page_is_a_plain_index_range(order_by, order_direction,
+                                            backwards):
+    query, _ = db_service.games_page_query(
+        order_by, order_direction, after=(1, 1), backwards=backwards
+    )
+    column = db_service.GAMES_ORDER_BY[order_by]
+    table = column.split('.')[0]
+    direction = 'DESC' if (order_direction == 'desc') != backwards else 'ASC'
+
+    assert ' OR ' not in query
+    assert 'NULLS' not in query
+    assert f'ORDER BY {column} {direction}, {table}.id_game {direction}' \
+        in query
@@ -0,0 +1,52 @@
+import pytest
+
+import app as app_module
+import db_service
+import profiling
+
+real_get_games_page = db_service.get_games_page
+
+
+@pytest.fixture
+def client(monkeypatch):
+    calls = []
+
+    def get_games_page(**kwargs):
+        calls.append(kwargs)
+        return db_service.GamesPage(games=[])
+
+    monkeypatch.setattr(db_service, 'get_games_page', get_games_page)
+    monkeypatch.setattr(db_service, 'get_all_developers', lambda: [])
+    monkeypatch.setattr(db_service, 'get_all_publishers', lambda: [])
+    monkeypatch.setattr(db_service, 'begin_unit_of_work', lambda: None)
+    monkeypatch.setattr(db_service, 'commit_unit_of_work',
+                        lambda success: None)
+    monkeypatch.setattr(db_service, 'end_unit_of_work', lambda: None)
+
+    client = app_module.app.test_client()
+    client.calls = calls
+    return client
+
+
+def test_profile_flag_is_not_passed_as_a_filter(client):
+    response = client.get(f'/?{profiling.PROFILE_FLAG}=1')
+
+    assert response.status_code == 200
+    assert profiling.PROFILE_FLAG not in client.calls[0]
+
+
+def test_only_known_filters_reach_the_data_layer(client):
+    response = client.get('/?order_by=rating&order_direction=desc'
+                          '&id_developer=none&search_text=&utm_source=x')
+
+    assert response.status_code == 200
+    assert client.calls[0] == {'cursor': None, 'page': None,
+                               'order_by': 'rating', 'order_direction': 'desc'}
+
+
+
+def test_unknown_ordering_is_a_bad_request(client, monkeypatch):
+    monkeypatch.setattr(db_service, 'get_games_page', real_get_games_page)
+
+    assert client.get('/?order_by=foo').status_code == 400
+    assert client.get('/?order_direction=sideways').status_code == 400
@@ -0,0 +1,90 @@
+import threading
+import time
+import uuid
+
+
+class VersionStore:
+    def get_many(self, keys):
+        raise NotImplementedError
+
+    def bump(self, *keys):
+        raise NotImplementedError
+
+    def snapshot(self):
+        raise NotImplementedError
+
+    @property
+    def token(self):
+        # Part of every validator, so validators from another store (or from
+        # this process before a restart) never match.
+        raise NotImplementedError
+
+
+class MemoryVersionStore(VersionStore):
+    # Bumps replace the dict instead of changing it, so a snapshot is just
+    # the dict of the moment.
+    def __init__(self):
+        self._versions = {}
+        self._started_at = time.time()
+        self._token = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+
+    @property
+    def token(self):
+        return self._token
+
+    def get_many(self, keys):
+        versions = self._versions
+        return [versions.get(key, (0, self._started_at)) for key in keys]
+
+    def bump(self, *keys):
+        now = time.time()
+        with self._lock:
+            versions = dict(self._versions)
+            for key in keys:
+                version, _ = versions.get(key, (0, self._started_at))
+                versions[key] = (version + 1, now)
+            self._versions = versions
+
+    def snapshot(self):
+        return SnapshotVersionStore(self._versions, self._started_at,
+                                    self._token)
+
+
+class SnapshotVersionStore(VersionStore):
+    def __init__(self, versions, started_at, token):
+        self._versions = versions
+        self._started_at = started_at
+        self._token = token
+
+    @property
+    def token(self):
+        return self._token
+
+    def get_many(self, keys):
+        return [self._versions.get(key, (0, self._started_at))
+                for key in keys]
+
+    def bump(self, *keys):
+        raise TypeError('A version snapshot is read-only')
+
+    def snapshot(self):
+        return self
+
+
+class EntityVersions:
+    def __init__(self, store):
+        self.store = store
+
+    def stamp(self, keys):
+        versions = self.store.get_many(keys)
+        modified_at = max((modified for _, modified in versions), default=None)
+        return ([self.store.token] + [version for version, _ in versions],
+                modified_at)
+
+    def bump(self, *keys):
+        if keys:
+            self.store.bump(*keys)
+
+    def snapshot(self):
+        return EntityVersions(self.store.snapshot())